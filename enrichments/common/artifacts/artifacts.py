@@ -4,7 +4,29 @@ import gzip
 import argparse
 import re
 import hashlib
-from typing import Iterable, Dict, Any, Tuple
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Dict, Any, Optional, Tuple
+
+# DOI -> Product resolution index and buffered writers (skgif/parsers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "skgif", "parsers"))
+from engine import Sink
+from index import DoiResolver, normalize_doi, space_dir
+from utils import external_sort, hash64
+
+# Trailing " (xx.x%)" or "(xx%)" of each line of the 'URLs' field
+PERCENTAGE_PATTERN = re.compile(r"\s*\(\s*\d+(\.\d+)?%\s*\)\s*$")
+
+# Output file suffixes: usages with embedded artifact nodes, or (--split-nodes)
+# usages referencing the separate node file of their space
+USAGES_SUFFIX = "_research_artifacts"
+SPLIT_USAGES_SUFFIX = "_research_artifact_usages"
+NODES_SUFFIX = "_research_artifact_nodes"
+
+# Same output as json.dump(..., ensure_ascii=False)
+encode_record = json.JSONEncoder(ensure_ascii=False).encode
 
 
 def iter_jsonl_gz(path: str) -> Iterable[Dict[str, Any]]:
@@ -55,15 +77,12 @@ def parse_urls(raw: Any) -> list:
     lines = raw.splitlines()
     urls: list = []
 
-    # Pattern to strip trailing " (xx.x%)" or "(xx%)" from each line
-    perc_pattern = re.compile(r"\s*\(\s*\d+(\.\d+)?%\s*\)\s*$")
-
     for line in lines:
         line = line.strip()
         if not line:
             continue
         # Remove trailing percentage in parentheses
-        line = perc_pattern.sub("", line).strip()
+        line = PERCENTAGE_PATTERN.sub("", line).strip()
         if line:
             urls.append(line)
 
@@ -99,6 +118,12 @@ def prune_empty_fields(data: Dict[str, Any]) -> Dict[str, Any]:
     return cleaned
 
 
+@lru_cache(maxsize=65536)
+def label_hash(hash_input: str) -> str:
+    """Short hash of "<label>|<type>"; the same artifacts recur across many papers."""
+    return hashlib.md5(hash_input.encode("utf-8")).hexdigest()[:8]
+
+
 def split_artifact_and_relation_fields(
     artifact: Dict[str, Any],
     paper_id: Any,
@@ -137,9 +162,7 @@ def split_artifact_and_relation_fields(
     # paper_id is required and assumed non-null.
     type_part = (str(art_type).strip().lower() if art_type is not None else "")
     # Use a short hash of the original label (and type) to distinguish similar labels
-    hash_input = f"{label}|{art_type}"
-    label_hash = hashlib.md5(hash_input.encode("utf-8")).hexdigest()[:8]
-    local_identifier = f"{paper_id}:{type_part}:{label_hash}"
+    local_identifier = f"{paper_id}:{type_part}:{label_hash(f'{label}|{art_type}')}"
 
     artifact_node_props = {
         "local_identifier": local_identifier,
@@ -180,175 +203,342 @@ def safe_space_name(space: str) -> str:
     return space.strip("_")
 
 
-def process_research_artifacts_file(
-    input_path: str,
-    output_dir: str,
-) -> Dict[str, int]:
+def resolve_product_ids(doi: str, space: str, resolver: Optional[DoiResolver]) -> list:
+    """
+    Return the Product local_identifiers of a paper DOI as a list of product_id
+    values, [] when the DOI is unresolved, or [None] (keep the DOI-only record)
+    when there is no DOI index for the space.
     """
-    Parse a JSONL.GZ file where each record has at least:
+    if resolver is None or not resolver.covers(space):
+        return [None]
+    return list(resolver.resolve(space, doi))
+
+
+def list_input_files(input_path: str) -> list:
+    """
+    Return the input files: `input_path` itself, or the `.json.gz` files of a
+    directory in name order.
+    """
+    if os.path.isdir(input_path):
+        return [
+            os.path.join(input_path, filename)
+            for filename in sorted(os.listdir(input_path))
+            if filename.endswith(".json.gz") and os.path.isfile(os.path.join(input_path, filename))
+        ]
+    if not os.path.isfile(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+    return [input_path]
+
+
+def iter_paper_artifacts(
+    path: str,
+    resolver: Optional[DoiResolver] = None,
+) -> Iterable[Tuple[str, str, list, list]]:
+    """
+    Stream the usable records of one input file, where each record has at least:
 
       - doi                   : DOI of the paper (source id)
       - spaces                : a single space string (e.g. "cancer")
       - research_artifacts    : list of artifact dicts (as in the user sample)
       - mentions              : (ignored)
 
-    and write **per-space** gzipped JSONL files, one line per
-    (paper, research artifact) pair.
-
-    Each output line has the shape:
+    Yields:
+        (space, doi, product_ids, artifacts): the normalised DOI, the Product ids
+        of the paper (see resolve_product_ids) and the (node, relation) property
+        pairs of its research artifacts
+    """
+    for rec in iter_jsonl_gz(path):
+        doi = normalize_doi(rec.get("doi") or "")
+        paper_id = rec.get("paper_id")
+        space = rec.get("spaces")
+        artifacts = rec.get("research_artifacts") or []
+
+        if not doi or not space or paper_id is None or not isinstance(artifacts, list) or not artifacts:
+            # Nothing useful in this record
+            continue
 
-      {
-        "doi": "<paper DOI>",
-        "space": "<space string>",
-        "paper_id": <paper_id>,
-        "input_path": "<input_path from record>",
-        "artifact": { ... ResearchArtifact node properties ... },
-        "relation": { ... relation (per-paper) properties ... }
-      }
+        product_ids = resolve_product_ids(doi, space, resolver)
+        if not product_ids:
+            continue
 
-    The `artifact` object corresponds to a `:ResearchArtifact` node:
-      - `local_identifier` (slug of "Research Artifact")
-      - `label`
-      - `cluster`
-      - `type`
-      - `licenses`
-      - `versions`
-      - `urls`
+        yield space, doi, product_ids, [
+            split_artifact_and_relation_fields(art, paper_id=paper_id)
+            for art in artifacts
+            if isinstance(art, dict)
+        ]
 
-    The `relation` object corresponds to properties on the relationship
-    from the Product (identified by DOI) to the ResearchArtifact.
 
-    Returns:
-        dict: mapping space -> number of artifact usages written
-    """
-    if not os.path.isfile(input_path):
-        raise FileNotFoundError(f"Input file not found: {input_path}")
+def merge_node(node: Dict[str, Any], props: Dict[str, Any]) -> None:
+    """Merge the properties of a repeated node: later non-null values win, like the loader's ON MATCH SET coalesce."""
+    node.update((name, value) for name, value in props.items() if value is not None)
 
-    os.makedirs(output_dir, exist_ok=True)
 
-    space_files: Dict[str, gzip.GzipFile] = {}
-    counts: Dict[str, int] = {}
+def dedup_nodes(path: str) -> int:
+    """
+    Merge the repeated ids of a node file in place, in bounded memory: the id hashes
+    are sorted on disk (utils.external_sort) and only the nodes of repeated ids are
+    held in memory. Nodes keep their order; merged nodes are written last, in the
+    order of their first record.
 
+    Returns:
+        int: number of nodes in the file
+    """
+    repeated, previous = set(), None
+    for (key,) in external_sort(((hash64(node["local_identifier"]),) for node in iter_jsonl_gz(path)), "<Q"):
+        if key == previous:
+            repeated.add(key)
+        previous = key
+    if not repeated:
+        return sum(1 for _ in iter_jsonl_gz(path))
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    count = 0
+    tmp_path = path + ".tmp"
+    sink = Sink(tmp_path, compress=True, dumps=encode_record)
     try:
-        for rec in iter_jsonl_gz(input_path):
-            doi = (rec.get("doi") or "").strip().lower()
-            paper_id = rec.get("paper_id")
-            space = rec.get("spaces")
-            artifacts = rec.get("research_artifacts") or []
-
-            if not doi or not space or paper_id is None or not isinstance(artifacts, list) or not artifacts:
-                # Nothing useful in this record
-                continue
+        for node in iter_jsonl_gz(path):
+            if hash64(node["local_identifier"]) not in repeated:
+                sink.write(node)
+                count += 1
+            elif node["local_identifier"] in merged:
+                merge_node(merged[node["local_identifier"]], node)
+            else:
+                merged[node["local_identifier"]] = node
+        for node in merged.values():
+            sink.write(node)
+    finally:
+        sink.close()
+    os.replace(tmp_path, path)
+    return count + len(merged)
 
-            space_key = safe_space_name(space)
-            if space_key not in space_files:
-                out_name = f"{space_key}_research_artifacts.jsonl.gz"
-                out_path = os.path.join(output_dir, out_name)
-                space_files[space_key] = gzip.open(out_path, mode="wt", encoding="utf-8")
-                counts[space_key] = 0
-                print(f"Opened output file for space '{space}': {out_path}")
 
-            out_f = space_files[space_key]
+class ArtifactWriter:
+    """
+    Per-space buffered writers for the artifact usages of a run, or of one worker
+    shard (`shard` is then added to the file names).
 
-            for art in artifacts:
-                if not isinstance(art, dict):
-                    continue
+    Without `split_nodes`, each line is one (paper, research artifact) usage:
 
-                artifact_node_props, relation_props = split_artifact_and_relation_fields(
-                    art, paper_id=paper_id
-                )
+      {
+        "doi": "<paper DOI>",
+        "space": "<space string>",
+        "artifact": { ... ResearchArtifact node properties ... },
+        "relation": { ... relation (per-paper) properties ... },
+        "product_id": "<Product id, with a DOI index>"
+      }
 
-                out_record = {
-                    "doi": doi.lower(),  # Ensure DOI is lowercase
-                    "space": space,
-                    "artifact": artifact_node_props,
-                    "relation": relation_props,
-                }
+    With `split_nodes`, usage lines carry "artifact_id" instead of "artifact" and
+    the nodes are streamed to per-space <space>_research_artifact_nodes files, the
+    nodes of a paper merged with merge_node. A paper repeated by several records has
+    its nodes written for each; dedup_nodes merges them once the run is written.
+    """
 
-                json.dump(out_record, out_f, ensure_ascii=False)
-                out_f.write("\n")
-                counts[space_key] = counts.get(space_key, 0) + 1
+    def __init__(self, output_dir: str, split_nodes: bool = False, shard: Optional[str] = None):
+        self.output_dir = output_dir
+        self.suffix = SPLIT_USAGES_SUFFIX if split_nodes else USAGES_SUFFIX
+        self.split_nodes = split_nodes
+        self.shard = shard
+        self.sinks: Dict[str, Sink] = {}
+        self.counts: Dict[str, int] = {}
+        self.node_sinks: Dict[str, Sink] = {}
+        self.node_counts: Dict[str, int] = {}
+
+    def filename(self, space_key: str, shard: Optional[str] = None, suffix: Optional[str] = None) -> str:
+        suffix = self.suffix if suffix is None else suffix
+        if shard is None:
+            return f"{space_key}{suffix}.jsonl.gz"
+        return f"{space_key}{suffix}.{shard}.jsonl.gz"
+
+    def write(self, space: str, doi: str, product_ids: list, artifacts: list) -> None:
+        """Write the usages of one paper (and with split_nodes, its nodes)."""
+        space_key = safe_space_name(space)
+        sink = self.sinks.get(space_key)
+        if sink is None:
+            out_path = os.path.join(self.output_dir, self.filename(space_key, self.shard))
+            sink = self.sinks[space_key] = Sink(out_path, compress=True, dumps=encode_record)
+            self.counts[space_key] = 0
+            print(f"Opened output file for space '{space}': {out_path}")
+
+        paper_nodes: Optional[Dict[str, Dict[str, Any]]] = {} if self.split_nodes else None
+        for artifact_node_props, relation_props in artifacts:
+            if paper_nodes is None:
+                out_record = {"doi": doi, "space": space, "artifact": artifact_node_props, "relation": relation_props}
+            else:
+                artifact_id = artifact_node_props["local_identifier"]
+                node = paper_nodes.get(artifact_id)
+                if node is None:
+                    paper_nodes[artifact_id] = dict(artifact_node_props)
+                else:
+                    merge_node(node, artifact_node_props)
+                out_record = {"doi": doi, "space": space, "artifact_id": artifact_id, "relation": relation_props}
+
+            for product_id in product_ids:
+                if product_id is not None:
+                    sink.write(dict(out_record, product_id=product_id))
+                else:
+                    sink.write(out_record)
+                self.counts[space_key] += 1
+
+        if paper_nodes:
+            self.write_nodes(space_key, paper_nodes)
+
+    def write_nodes(self, space_key: str, paper_nodes: Dict[str, Dict[str, Any]]) -> None:
+        node_sink = self.node_sinks.get(space_key)
+        if node_sink is None:
+            out_path = os.path.join(self.output_dir, self.filename(space_key, self.shard, NODES_SUFFIX))
+            node_sink = self.node_sinks[space_key] = Sink(out_path, compress=True, dumps=encode_record)
+            self.node_counts[space_key] = 0
+        for node in paper_nodes.values():
+            node_sink.write(node)
+            self.node_counts[space_key] += 1
+
+    def close(self) -> Dict[str, int]:
+        for space_key, sink in self.sinks.items():
+            sink.close()
+            print(f"Closed output file for space '{space_key}' with {self.counts[space_key]} records")
+        for space_key, sink in self.node_sinks.items():
+            sink.close()
+            # Shards are deduplicated once merged (merge_shards)
+            if self.shard is None:
+                self.node_counts[space_key] = dedup_nodes(str(sink.path))
+            print(f"Closed node file for space '{space_key}' with {self.node_counts[space_key]} ResearchArtifact nodes")
+        return self.counts
+
+
+def process_artifacts_shard(task: tuple) -> tuple:
+    """
+    Worker entry point: process one input file into its own per-space shard files.
 
+    Returns:
+        (shards, node_shards, resolved, unresolved): space -> (shard path, usage count),
+        space -> (node shard path, node count) (empty without split_nodes) and the DOI
+        resolution counts of its resolver (empty without DOI indexes)
+    """
+    path, shard, shard_dir, doi_indexes, split_nodes = task
+    resolver = DoiResolver(doi_indexes) if doi_indexes else None
+    writer = ArtifactWriter(shard_dir, split_nodes, shard)
+    try:
+        print(f"Processing file: {path}")
+        for paper in iter_paper_artifacts(path, resolver):
+            writer.write(*paper)
     finally:
-        for space_key, f in space_files.items():
-            f.close()
-            print(f"Closed output file for space '{space_key}' with {counts.get(space_key, 0)} records")
-
-    return counts
+        counts = writer.close()
+        if resolver is not None:
+            resolver.close()
+    shards = {space_key: (str(sink.path), counts[space_key]) for space_key, sink in writer.sinks.items()}
+    node_shards = {space_key: (str(sink.path), writer.node_counts[space_key]) for space_key, sink in writer.node_sinks.items()}
+    if resolver is None:
+        return shards, node_shards, {}, {}
+    return shards, node_shards, resolver.resolved, resolver.unresolved
 
 
-def process_research_artifacts_dir(
-    input_dir: str,
-    output_dir: str,
-) -> Dict[str, int]:
+def concat_shards(shards: list, out_path: str) -> int:
     """
-    Process all `.json.gz` files in a directory, aggregating results into
-    per-space gzipped JSONL files.
-
-    This keeps one set of writers open for all files so that per-space
-    outputs are contiguous and not overwritten.
+    Concatenate (path, count) shards, in input file order, into out_path (a
+    multi-member gzip file reads back as one stream); returns the total count.
     """
-    if not os.path.isdir(input_dir):
-        raise NotADirectoryError(f"Input directory not found: {input_dir}")
-
-    os.makedirs(output_dir, exist_ok=True)
+    with open(out_path, "wb") as out:
+        for path, _ in shards:
+            with open(path, "rb") as shard_file:
+                shutil.copyfileobj(shard_file, out, 16 * 1024 * 1024)
+            os.remove(path)
+    return sum(count for _, count in shards)
+
+
+def merge_shards(results: list, writer: ArtifactWriter, shard_dir: str) -> Dict[str, int]:
+    """Concatenate the usage (and node) shards of the workers into the per-space files."""
+    space_shards: Dict[str, list] = {}
+    space_node_shards: Dict[str, list] = {}
+    for shards, node_shards, _, _ in results:
+        for space_key, shard in shards.items():
+            space_shards.setdefault(space_key, []).append(shard)
+        for space_key, shard in node_shards.items():
+            space_node_shards.setdefault(space_key, []).append(shard)
 
-    space_files: Dict[str, gzip.GzipFile] = {}
     counts: Dict[str, int] = {}
+    for space_key, shards in space_shards.items():
+        counts[space_key] = concat_shards(shards, os.path.join(writer.output_dir, writer.filename(space_key)))
+        print(f"Closed output file for space '{space_key}' with {counts[space_key]} records "
+              f"(merged from {len(shards)} shards)")
+    for space_key, shards in space_node_shards.items():
+        out_path = os.path.join(writer.output_dir, writer.filename(space_key, suffix=NODES_SUFFIX))
+        concat_shards(shards, out_path)
+        count = dedup_nodes(out_path)
+        print(f"Closed node file for space '{space_key}' with {count} ResearchArtifact nodes "
+              f"(merged from {len(shards)} shards)")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    return counts
 
-    try:
-        for filename in sorted(os.listdir(input_dir)):
-            if not filename.endswith(".json.gz"):
-                continue
-            path = os.path.join(input_dir, filename)
-            if not os.path.isfile(path):
-                continue
-
-            print(f"Processing file: {path}")
-
-            for rec in iter_jsonl_gz(path):
-                doi = (rec.get("doi") or "").strip().lower()
-                paper_id = rec.get("paper_id")
-                space = rec.get("spaces")
-                artifacts = rec.get("research_artifacts") or []
-
-                if not doi or not space or paper_id is None or not isinstance(artifacts, list) or not artifacts:
-                    # Nothing useful in this record
-                    continue
 
-                space_key = safe_space_name(space)
-                if space_key not in space_files:
-                    out_name = f"{space_key}_research_artifacts.jsonl.gz"
-                    out_path = os.path.join(output_dir, out_name)
-                    space_files[space_key] = gzip.open(out_path, mode="wt", encoding="utf-8")
-                    counts[space_key] = 0
-                    print(f"Opened output file for space '{space}': {out_path}")
+def process_research_artifacts(
+    input_path: str,
+    output_dir: str,
+    doi_indexes: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    split_nodes: bool = False,
+) -> Dict[str, int]:
+    """
+    Parse one JSONL.GZ file, or all `.json.gz` files of a directory, and write
+    **per-space** gzipped JSONL files, one line per (paper, research artifact)
+    pair (see ArtifactWriter for the line shapes).
 
-                out_f = space_files[space_key]
+    The `artifact` object corresponds to a `:ResearchArtifact` node:
+      - `local_identifier` (paper_id, type and hash of the label)
+      - `label`
+      - `type`
+      - `licenses`
+      - `versions`
+      - `urls`
 
-                for art in artifacts:
-                    if not isinstance(art, dict):
-                        continue
+    The `relation` object corresponds to properties on the relationship
+    from the Product (identified by DOI) to the ResearchArtifact.
 
-                    artifact_node_props, relation_props = split_artifact_and_relation_fields(
-                        art, paper_id=paper_id
-                    )
+    With a DOI index for a space (`doi_indexes` maps space -> pilot graph
+    base_dir), the paper DOI is resolved to its Product(s): each output line
+    gains a "product_id" (one line per Product) and records whose DOI cannot be
+    resolved are dropped and listed in <space>_unresolved_dois.tsv.
 
-                    out_record = {
-                        "doi": doi,
-                        "space": space,
-                        "artifact": artifact_node_props,
-                        "relation": relation_props,
-                    }
+    With `workers` > 1 the input files are processed in parallel, each into
+    per-space shards that are concatenated in input file order, so the output
+    does not depend on the number of workers. With `split_nodes` the nodes are
+    written once per space to <space>_research_artifact_nodes.jsonl.gz, repeated
+    ids merged over the whole run (see dedup_nodes), and the usage files reference
+    them by id.
 
-                    json.dump(out_record, out_f, ensure_ascii=False)
-                    out_f.write("\n")
-                    counts[space_key] = counts.get(space_key, 0) + 1
+    Returns:
+        dict: mapping space -> number of artifact usages written
+    """
+    input_files = list_input_files(input_path)
+    os.makedirs(output_dir, exist_ok=True)
 
+    resolver = DoiResolver(doi_indexes) if doi_indexes else None
+    writer = ArtifactWriter(output_dir, split_nodes)
+    try:
+        if workers > 1:
+            shard_dir = os.path.join(output_dir, "_shards")
+            os.makedirs(shard_dir, exist_ok=True)
+            tasks = [(path, f"{i:05d}", shard_dir, doi_indexes, split_nodes) for i, path in enumerate(input_files)]
+            results = []
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(process_artifacts_shard, tasks))
+                counts = merge_shards(results, writer, shard_dir)
+            finally:
+                if resolver is not None:
+                    for _, _, resolved, unresolved in results:
+                        resolver.merge(resolved, unresolved)
+        else:
+            try:
+                for path in input_files:
+                    print(f"Processing file: {path}")
+                    for paper in iter_paper_artifacts(path, resolver):
+                        writer.write(*paper)
+            finally:
+                counts = writer.close()
     finally:
-        for space_key, f in space_files.items():
-            f.close()
-            print(f"Closed output file for space '{space_key}' with {counts.get(space_key, 0)} records")
+        if resolver is not None:
+            resolver.write_report(output_dir)
+            resolver.close()
 
     return counts
 
@@ -379,6 +569,33 @@ def build_arg_parser() -> argparse.ArgumentParser:
             "(default: /data2/tmp/raa_reevaluate_071025/artifacts_parsed)"
         ),
     )
+    parser.add_argument(
+        "--doi-index",
+        dest="doi_indexes",
+        action="append",
+        type=space_dir,
+        metavar="SPACE=BASE_DIR",
+        help=(
+            "Resolve the paper DOIs of SPACE to Product ids with the DOI index of the pilot graph "
+            "in BASE_DIR (built with skgif/parsers/index.py build-doi). May be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of input files processed in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--split-nodes",
+        action="store_true",
+        help=(
+            f"Write the ResearchArtifact nodes once per space to <space>{NODES_SUFFIX}.jsonl.gz "
+            f"and <space>{SPLIT_USAGES_SUFFIX}.jsonl.gz usage files referencing them by id "
+            "(load with load-artifacts-split.cypher)"
+        ),
+    )
     return parser
 
 
@@ -388,16 +605,13 @@ def main() -> None:
 
     # If --input points to a directory, process all *.json.gz files inside;
     # otherwise treat it as a single input file.
-    if os.path.isdir(args.input_path):
-        counts = process_research_artifacts_dir(
-            input_dir=args.input_path,
-            output_dir=args.output_dir,
-        )
-    else:
-        counts = process_research_artifacts_file(
-            input_path=args.input_path,
-            output_dir=args.output_dir,
-        )
+    counts = process_research_artifacts(
+        input_path=args.input_path,
+        output_dir=args.output_dir,
+        doi_indexes=dict(args.doi_indexes or []),
+        workers=args.workers,
+        split_nodes=args.split_nodes,
+    )
 
     print("\nResearchArtifact extraction completed.")
     for space, cnt in sorted(counts.items()):
@@ -0,0 +1,381 @@
+"""
+Cross-paper canonicalization of the ResearchArtifact nodes written by
+`artifacts.py --split-nodes`.
+
+artifacts.py identifies an artifact per paper (paper_id:type:hash(label|type)), so
+the same dataset or software gets one node for every paper that uses it. This stage
+clusters those nodes across papers and writes one node per cluster:
+
+  - nodes of the same type are linked when their normalized labels are equal
+    (case, accents-compatible forms, punctuation and whitespace ignored) or when
+    they share a normalized URL (scheme, "www.", trailing "/" and ".git" ignored;
+    bare hosting sites such as https://github.com/ are ignored);
+  - the clusters are the connected components of a union-find over these keys;
+    URLs seen with many distinct labels (portals, landing pages) are not used;
+  - every cluster gets a canonical id that is kept in a persistent TSV mapping
+    (key -> canonical id), so that re-running on new data keeps the ids of the
+    artifacts already seen.
+
+The clusters are computed over the nodes of all the spaces, so a canonical node has
+the same id and properties in every space; it is written to the node file of each
+space where one of its members is used.
+
+Outputs:
+  - <space>_canonical_research_artifact_nodes.jsonl.gz: one node per cluster used
+    in the space
+  - <space>_canonical_research_artifact_usages.jsonl.gz: the usage lines with
+    artifact_id replaced by the canonical id
+  - canonical_id_aliases.tsv: ids of earlier runs whose clusters were joined by
+    new data, with the id they were merged into
+All are loaded with load-canonical-artifacts.cypher.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+# artifacts.py puts skgif/parsers on sys.path (engine, index, utils)
+from artifacts import NODES_SUFFIX, SPLIT_USAGES_SUFFIX, encode_record, iter_jsonl_gz
+from engine import Sink
+from utils import UnionFind
+
+CANONICAL_NODES_SUFFIX = "_canonical_research_artifact_nodes"
+CANONICAL_USAGES_SUFFIX = "_canonical_research_artifact_usages"
+# Canonical ids of earlier runs merged into another id (old id, new id)
+ALIASES_FILENAME = "canonical_id_aliases.tsv"
+
+NON_ALNUM = re.compile(r"[\W_]+", re.UNICODE)
+# Hosting sites whose bare host (no path) says nothing about the artifact
+GENERIC_HOSTS = {
+    "github.com", "gitlab.com", "bitbucket.org", "sourceforge.net", "zenodo.org",
+    "figshare.com", "doi.org", "dx.doi.org", "pypi.org", "cran.r-project.org",
+    "bioconductor.org", "ncbi.nlm.nih.gov", "huggingface.co", "kaggle.com",
+}
+# URLs seen with more distinct labels than this do not link nodes
+MAX_URL_LABELS = 3
+# Hosts whose paths are case-insensitive
+CASE_INSENSITIVE_HOSTS = {"github.com", "gitlab.com", "bitbucket.org"}
+
+
+def normalize_label(label: Any) -> str:
+    """Label key: NFKC, casefolded, punctuation and whitespace collapsed to single spaces."""
+    if not isinstance(label, str):
+        return ""
+    label = unicodedata.normalize("NFKC", label).casefold()
+    return NON_ALNUM.sub(" ", label).strip()
+
+
+def normalize_url(url: Any) -> str:
+    """URL key: host (without "www.") and path, without scheme, query-less trailing "/" or ".git"."""
+    if not isinstance(url, str):
+        return ""
+    url = url.strip()
+    if "://" not in url:
+        url = "//" + url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return ""
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[len("www."):]
+    if not host:
+        return ""
+    path = parts.path.rstrip("/")
+    if path.endswith(".git"):
+        path = path[:-len(".git")]
+    if host in CASE_INSENSITIVE_HOSTS:
+        path = path.lower()
+    if not path and not parts.query and host in GENERIC_HOSTS:
+        return ""
+    key = host + path
+    if parts.query:
+        key += "?" + parts.query
+    # Keys are stored in a TSV file
+    return key.replace("\t", " ").replace("\n", " ")
+
+
+def node_keys(node: Dict[str, Any]) -> List[str]:
+    """Clustering keys of a node: its type-scoped label and URL keys."""
+    type_part = str(node.get("type") or "").strip().lower()
+    keys = []
+    label = normalize_label(node.get("label"))
+    if label:
+        keys.append(f"label:{type_part}:{label}")
+    for url in node.get("urls") or []:
+        url_key = normalize_url(url)
+        if url_key:
+            keys.append(f"url:{type_part}:{url_key}")
+    return keys
+
+
+def load_mapping(path: Optional[str]) -> Dict[str, str]:
+    """Read the persistent key -> canonical id mapping (empty if it does not exist yet)."""
+    mapping: Dict[str, str] = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                key, _, canonical_id = line.rstrip("\n").partition("\t")
+                if key and canonical_id:
+                    mapping[key] = canonical_id
+    return mapping
+
+
+def save_mapping(mapping: Dict[str, str], path: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for key in sorted(mapping):
+            f.write(f"{key}\t{mapping[key]}\n")
+    os.replace(tmp_path, path)
+
+
+def new_canonical_id(node: Dict[str, Any], keys: List[str]) -> str:
+    """Deterministic id of a new cluster, from its type and its smallest key."""
+    type_part = str(node.get("type") or "").strip().lower()
+    # Nodes without label or URL stay on their own
+    seed = min(keys) if keys else node["local_identifier"]
+    return f"ra:{type_part}:{hashlib.md5(seed.encode('utf-8')).hexdigest()[:16]}"
+
+
+def merge_values(values: Iterable[Any]) -> list:
+    """Union of list properties, in first-seen order."""
+    merged = {}
+    for value in values:
+        merged.setdefault(json.dumps(value, sort_keys=True, ensure_ascii=False), value)
+    return list(merged.values())
+
+
+def canonical_node(canonical_id: str, members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One node for a cluster: most frequent label (ties: smallest), unions of the list properties."""
+    labels = Counter(member.get("label") for member in members if member.get("label"))
+    node = {"local_identifier": canonical_id}
+    if labels:
+        node["label"] = min(labels, key=lambda label: (-labels[label], label))
+    if members[0].get("type") is not None:
+        node["type"] = members[0]["type"]
+    for name in ("licenses", "versions", "urls"):
+        values = merge_values(value for member in members for value in member.get(name) or [])
+        if values:
+            node[name] = values
+    node["member_count"] = len(members)
+    return node
+
+
+def canonicalize(
+    input_dir: str,
+    output_dir: str,
+    mapping_path: Optional[str] = None,
+    max_url_labels: int = MAX_URL_LABELS,
+) -> Dict[str, int]:
+    """
+    Cluster the nodes of an `artifacts.py --split-nodes` output directory and write the
+    canonical nodes and usages to output_dir (see the module docstring).
+
+    Args:
+        input_dir: Directory with the <space>_research_artifact_nodes.jsonl.gz and
+            <space>_research_artifact_usages.jsonl.gz files
+        output_dir: Output directory
+        mapping_path: Persistent key -> canonical id TSV, read if it exists and
+            rewritten (default: <output_dir>/canonical_ids.tsv)
+        max_url_labels: URLs seen with more distinct normalized labels are not used
+            to link nodes
+
+    Returns:
+        dict: mapping space -> number of usages written
+    """
+    nodes_suffix = f"{NODES_SUFFIX}.jsonl.gz"
+    nodes_paths = sorted(glob.glob(os.path.join(input_dir, f"*{nodes_suffix}")))
+    if not nodes_paths:
+        raise FileNotFoundError(f"No *{nodes_suffix} file in {input_dir} (run artifacts.py with --split-nodes)")
+    os.makedirs(output_dir, exist_ok=True)
+    mapping_path = mapping_path or os.path.join(output_dir, "canonical_ids.tsv")
+    mapping = load_mapping(mapping_path)
+
+    # A paper listed in several spaces has its nodes in each of their files
+    nodes: List[Dict[str, Any]] = []
+    spaces_of: List[set] = []
+    index_of: Dict[str, int] = {}
+    for nodes_path in nodes_paths:
+        space_key = os.path.basename(nodes_path)[:-len(nodes_suffix)]
+        for node in iter_jsonl_gz(nodes_path):
+            index = index_of.get(node["local_identifier"])
+            if index is None:
+                index_of[node["local_identifier"]] = len(nodes)
+                nodes.append(node)
+                spaces_of.append({space_key})
+            else:
+                nodes[index].update(node)
+                spaces_of[index].add(space_key)
+
+    keys_of: List[List[str]] = []
+    url_labels: Dict[str, set] = {}
+    for node in nodes:
+        keys = node_keys(node)
+        keys_of.append(keys)
+        label_keys = [key for key in keys if key.startswith("label:")]
+        for key in keys:
+            if key.startswith("url:"):
+                labels = url_labels.setdefault(key, set())
+                if len(labels) <= max_url_labels:
+                    labels.update(label_keys)
+
+    # URLs shared by many different artifacts (e.g. a portal or a landing page)
+    # would chain unrelated clusters together
+    ambiguous = {key for key, labels in url_labels.items() if len(labels) > max_url_labels}
+    if ambiguous:
+        keys_of = [[key for key in keys if key not in ambiguous] for keys in keys_of]
+
+    # 1. Union-find over the nodes: nodes sharing a key end up in one set
+    first_with_key: Dict[str, int] = {}
+    sets = UnionFind(len(nodes))
+    for index, keys in enumerate(keys_of):
+        for key in keys:
+            other = first_with_key.setdefault(key, index)
+            if other != index:
+                sets.union(other, index)
+
+    clusters: Dict[int, List[int]] = {}
+    for index in range(len(nodes)):
+        clusters.setdefault(sets.find(index), []).append(index)
+
+    # 2. Canonical ids: reuse the ids already mapped to a key of the cluster
+    canonical_of: Dict[str, str] = {}
+    aliases: Dict[str, str] = {}
+    reused = 0
+    canonical_nodes = []
+    canonical_spaces: Dict[str, set] = {}
+    for members in clusters.values():
+        keys = sorted({key for index in members for key in keys_of[index]})
+        known = sorted({mapping[key] for key in keys if key in mapping})
+        if known:
+            canonical_id = known[0]
+            reused += 1
+            # Clusters joined by new data keep the smallest of their ids
+            for old_id in known[1:]:
+                aliases[old_id] = canonical_id
+        else:
+            canonical_id = new_canonical_id(nodes[members[0]], keys)
+        for key in keys:
+            mapping[key] = canonical_id
+        for index in members:
+            canonical_of[nodes[index]["local_identifier"]] = canonical_id
+        canonical_nodes.append(canonical_node(canonical_id, [nodes[index] for index in members]))
+        spaces = canonical_spaces.setdefault(canonical_id, set())
+        for index in members:
+            spaces.update(spaces_of[index])
+
+    # Separate clusters can only share an id through the mapping of an earlier run
+    # (e.g. a label that moved to another cluster); merge their nodes
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for node in canonical_nodes:
+        existing = by_id.get(node["local_identifier"])
+        if existing is None:
+            by_id[node["local_identifier"]] = node
+        else:
+            for name in ("licenses", "versions", "urls"):
+                values = merge_values((existing.get(name) or []) + (node.get(name) or []))
+                if values:
+                    existing[name] = values
+            existing["member_count"] += node["member_count"]
+
+    node_sinks: Dict[str, Sink] = {}
+    try:
+        for node in by_id.values():
+            for space_key in sorted(canonical_spaces[node["local_identifier"]]):
+                sink = node_sinks.get(space_key)
+                if sink is None:
+                    out_path = os.path.join(output_dir, f"{space_key}{CANONICAL_NODES_SUFFIX}.jsonl.gz")
+                    sink = node_sinks[space_key] = Sink(out_path, compress=True, dumps=encode_record)
+                sink.write(node)
+    finally:
+        for sink in node_sinks.values():
+            sink.close()
+    save_mapping(mapping, mapping_path)
+    aliases_out = os.path.join(output_dir, ALIASES_FILENAME)
+    with open(aliases_out, "w", encoding="utf-8") as f:
+        for old_id in sorted(aliases):
+            f.write(f"{old_id}\t{aliases[old_id]}\n")
+    print(f"Clustered {len(nodes)} ResearchArtifact nodes into {len(by_id)} canonical nodes: "
+          f"{reused} clusters kept their id, {len(aliases)} ids merged into another, "
+          f"{len(ambiguous)} ambiguous URLs ignored (<space>{CANONICAL_NODES_SUFFIX}.jsonl.gz "
+          f"for {len(node_sinks)} spaces)")
+
+    # 3. Usages pointing to the canonical nodes
+    counts: Dict[str, int] = {}
+    suffix = f"{SPLIT_USAGES_SUFFIX}.jsonl.gz"
+    for path in sorted(glob.glob(os.path.join(input_dir, f"*{suffix}"))):
+        space_key = os.path.basename(path)[:-len(suffix)]
+        out_path = os.path.join(output_dir, f"{space_key}{CANONICAL_USAGES_SUFFIX}.jsonl.gz")
+        sink = Sink(out_path, compress=True, dumps=encode_record)
+        count = 0
+        try:
+            for usage in iter_jsonl_gz(path):
+                usage["artifact_id"] = canonical_of.get(usage.get("artifact_id"), usage.get("artifact_id"))
+                sink.write(usage)
+                count += 1
+        finally:
+            sink.close()
+        counts[space_key] = count
+        print(f"Wrote {count} usages to {out_path}")
+    return counts
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Cluster the per-paper ResearchArtifact nodes written by artifacts.py --split-nodes "
+            "into canonical nodes and rewrite the usages to point to them."
+        )
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        dest="input_dir",
+        required=True,
+        help="Output directory of artifacts.py --split-nodes",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        dest="output_dir",
+        required=True,
+        help="Directory where the canonical nodes and usages are written",
+    )
+    parser.add_argument(
+        "--mapping",
+        default=None,
+        help=(
+            "Persistent key -> canonical id TSV keeping the ids stable across runs "
+            "(default: <output dir>/canonical_ids.tsv)"
+        ),
+    )
+    parser.add_argument(
+        "--max-url-labels",
+        type=int,
+        default=MAX_URL_LABELS,
+        help=(
+            "Do not link nodes through URLs seen with more distinct labels than this "
+            f"(default: {MAX_URL_LABELS})"
+        ),
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    counts = canonicalize(args.input_dir, args.output_dir, args.mapping, args.max_url_labels)
+
+    print("\nResearchArtifact canonicalization completed.")
+    for space, cnt in sorted(counts.items()):
+        print(f"  {space}: {cnt} artifact usages")
+
+
+if __name__ == "__main__":
+    main()
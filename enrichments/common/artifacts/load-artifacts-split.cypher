@@ -0,0 +1,72 @@
+// Loads the output of artifacts.py --split-nodes for one space:
+// <space>_research_artifact_nodes.jsonl.gz holds every ResearchArtifact node of the
+// space once (artifacts.py merges the nodes of papers repeated across input files), so
+// the nodes are created without a MERGE per usage, and <space>_research_artifact_usages.jsonl.gz
+// links them to Products by id. Load the two files of the same space.
+// Intended for a first load; use load-artifacts.cypher to update existing artifacts.
+
+CREATE INDEX researchartifact_local_identifier_index IF NOT EXISTS
+FOR (ra:ResearchArtifact)
+ON (ra.local_identifier);
+
+CALL apoc.periodic.iterate(
+  '
+  // Replace the filename with the space-specific nodes file you want to load,
+  // e.g. cancer_research_artifact_nodes.jsonl.gz
+  CALL apoc.load.json("file:///import/artifact_nodes.jsonl") YIELD value
+  RETURN value
+  ',
+  '
+  CREATE (ra:ResearchArtifact)
+    SET ra = value
+  ',
+  {batchSize: 10000, parallel: true}
+);
+
+CALL apoc.periodic.iterate(
+  '
+  // Replace the filename with the space-specific usages file you want to load,
+  // e.g. cancer_research_artifact_usages.jsonl.gz
+  CALL apoc.load.json("file:///import/artifact_usages.jsonl") YIELD value
+  RETURN value
+  ',
+  '
+  // Match the Product node by the id resolved by artifacts.py --doi-index,
+  // or by DOI (source paper) for files produced without --doi-index
+  CALL {
+    WITH value
+    WITH value WHERE value.product_id IS NOT NULL
+    MATCH (p:Product {local_identifier: value.product_id})
+    RETURN p
+    UNION
+    WITH value
+    WITH value WHERE value.product_id IS NULL
+    MATCH (:Pid {normalized_scheme: "doi", normalized_value: value.doi})<-[:HAS_PID]-(p:Product)
+    RETURN p
+  }
+  MATCH (ra:ResearchArtifact {local_identifier: value.artifact_id})
+
+  MERGE (p)-[r:USES_RESEARCH_ARTIFACT]->(ra)
+    ON CREATE SET
+      r.research_artifact_score = value.relation.research_artifact_score,
+      r.owned                   = value.relation.owned,
+      r.owned_percentage        = value.relation.owned_percentage,
+      r.owned_score             = value.relation.owned_score,
+      r.reused                  = value.relation.reused,
+      r.reused_percentage       = value.relation.reused_percentage,
+      r.reused_score            = value.relation.reused_score,
+      r.mentions_count          = value.relation.mentions_count
+    ON MATCH SET
+      r.research_artifact_score = coalesce(value.relation.research_artifact_score, r.research_artifact_score),
+      r.owned                   = coalesce(value.relation.owned, r.owned),
+      r.owned_percentage        = coalesce(value.relation.owned_percentage, r.owned_percentage),
+      r.owned_score             = coalesce(value.relation.owned_score, r.owned_score),
+      r.reused                  = coalesce(value.relation.reused, r.reused),
+      r.reused_percentage       = coalesce(value.relation.reused_percentage, r.reused_percentage),
+      r.reused_score            = coalesce(value.relation.reused_score, r.reused_score),
+      r.mentions_count          = coalesce(value.relation.mentions_count, r.mentions_count)
+
+  RETURN count(*) AS rows
+  ',
+  {batchSize: 10000}
+);
@@ -10,8 +10,19 @@ CALL apoc.periodic.iterate(
   RETURN value
   ',
   '
-  // 1. Match the Product node by DOI (source paper)
-  MATCH (pPid:Pid {scheme: "doi", value: value.doi})<-[:HAS_PID]-(p:Product)
+  // 1. Match the Product node by the id resolved by artifacts.py --doi-index,
+  //    or by DOI (source paper) for files produced without --doi-index
+  CALL {
+    WITH value
+    WITH value WHERE value.product_id IS NOT NULL
+    MATCH (p:Product {local_identifier: value.product_id})
+    RETURN p
+    UNION
+    WITH value
+    WITH value WHERE value.product_id IS NULL
+    MATCH (:Pid {normalized_scheme: "doi", normalized_value: value.doi})<-[:HAS_PID]-(p:Product)
+    RETURN p
+  }
 
   // 2. Create / update the ResearchArtifact node
   MERGE (ra:ResearchArtifact {local_identifier: value.artifact.local_identifier})
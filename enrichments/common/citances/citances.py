@@ -1,178 +1,503 @@
+import argparse
 import os
-import pandas as pd
 import numpy as np
 import json
+import re
 import glob
 import gzip
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+try:
+    # Optional: compact seen-set for billions of citation ids
+    from pyroaring import BitMap64
+except ImportError:
+    BitMap64 = None
 
-# Set pandas display options to show full output without truncation
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
-pd.set_option('display.width', None)
-pd.set_option('display.max_colwidth', None)
+# DOI -> Product resolution index (skgif/parsers/index.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "skgif", "parsers"))
+from index import DoiResolver, space_dir
+from utils import PID_PREFIXES
+from indicators import CounterStore, IndicatorCounters, write_indicator_files
+from scores import ENCODINGS, encode_score_column
 
-def extract_citation_data(results_array, citation_mentions_array):
+# Rows per Arrow record batch; memory use is bounded by the batch, not the file size
+BATCH_SIZE = 65536
+# Only the columns used to build the relations are read
+COLUMNS = ["citationid", "source_doi", "dest_doi", "spaces", "results"]
+# Columns of the deduplication pass (prescan, --spaces)
+DEDUP_COLUMNS = ["citationid", "spaces"]
+# Resolver prefixes of DOIs, removed as in Pid.normalized_value
+DOI_PREFIX = re.compile("^(?:" + "|".join(re.escape(prefix) for prefix in PID_PREFIXES["doi"]) + ")")
+CITATION_FIELDS = ["semantics", "intent", "polarity"]
+SCORE_FIELDS = ["semantics_scores", "intent_scores", "polarity_scores"]
+# Same output as json.dump(..., ensure_ascii=False), without rebuilding the encoder per record
+encode_relation = json.JSONEncoder(ensure_ascii=False).encode
+
+def spaces_filter(spaces):
+    """Dataset filter keeping the rows of the given spaces ("None" selects rows without spaces)."""
+    if not spaces:
+        return None
+    expression = ds.field("spaces").isin(pa.array([space for space in spaces if space != "None"], type=pa.string()))
+    if "None" in spaces:
+        expression = expression | ds.field("spaces").is_null()
+    return expression
+
+def space_mask(batch, spaces):
+    """NumPy mask of the batch rows whose spaces are selected, as spaces_filter() keeps them."""
+    selected = pc.is_in(batch.column("spaces").cast(pa.string()), value_set=pa.array(
+        [space for space in spaces if space != "None"], type=pa.string()))
+    if "None" in spaces:
+        selected = pc.or_kleene(selected, batch.column("spaces").is_null())
+    return pc.fill_null(selected, False).to_numpy(zero_copy_only=False)
+
+def scan_batches(file_path, columns, spaces=None):
     """
-    Extract structured data from the numpy arrays in results and citation_mentions columns.
-    
+    Record batches of a parquet file, reading only `columns` and, with `spaces`, only the
+    matching rows; row groups whose statistics exclude the spaces are not read.
+    """
+    dataset = ds.dataset(file_path, format="parquet")
+    return dataset.to_batches(columns=columns, filter=spaces_filter(spaces), batch_size=BATCH_SIZE)
+
+def report_read_bytes(parquet_files, spaces=None):
+    """
+    Print the parquet bytes the scan reads versus the file sizes, estimated from the
+    row group metadata: compressed size of the COLUMNS chunks of the row groups kept by
+    the spaces filter, and with spaces, of the citationid and spaces chunks of the other
+    row groups (read for the deduplication, see scan_keep_masks).
+    """
+    expression = spaces_filter(spaces)
+    read_bytes = file_bytes = 0
+    row_groups = kept_row_groups = 0
+    for file_path in parquet_files:
+        file_bytes += os.path.getsize(file_path)
+        for fragment in ds.dataset(file_path, format="parquet").get_fragments():
+            metadata = fragment.metadata
+            row_groups += metadata.num_row_groups
+            kept = fragment.subset(expression) if expression is not None else fragment
+            kept_ids = {row_group.id for row_group in kept.row_groups}
+            kept_row_groups += len(kept_ids)
+            for row_group in range(metadata.num_row_groups):
+                columns = COLUMNS if row_group in kept_ids else DEDUP_COLUMNS
+                group = metadata.row_group(row_group)
+                for i in range(group.num_columns):
+                    column = group.column(i)
+                    if column.path_in_schema.split(".")[0] in columns:
+                        read_bytes += column.total_compressed_size
+    share = 100.0 * read_bytes / file_bytes if file_bytes else 0.0
+    print(
+        f"Parquet bytes read: {read_bytes} of {file_bytes} ({share:.1f}%), "
+        f"{kept_row_groups} of {row_groups} row groups"
+    )
+
+def struct_field_list(array, name, default):
+    """Return a struct field as a Python list, or `default` for every row when the field does not exist."""
+    if array.type.get_field_index(name) < 0:
+        return [default] * len(array)
+    return pc.struct_field(array, name).to_pylist()
+
+def score_list(values):
+    """Scores as JSON lists: null/empty lists become [] and null scores NaN, as with the NumPy conversion."""
+    if not values:
+        return []
+    if None in values:
+        return [float("nan") if v is None else v for v in values]
+    return values
+
+def extract_citation_columns(results, num_rows):
+    """
+    Flatten the `results` column (list<map<position, metadata>>) of a batch into citations.
+
+    Only the first map of each row is used. Entries with null metadata are skipped; an
+    entry whose `scores` is null ends the row with an "Unknown" citation, and rows without
+    any citation get a single "Unknown" citation.
+
     Args:
-        results_array: Numpy array containing results data
-        citation_mentions_array: Numpy array containing citation mentions
-    
+        results: Arrow list<map> array of the batch
+        num_rows: Number of rows in the batch
+
     Returns:
-        List of dictionaries with extracted citation data
+        (rows, positions, columns): the batch row and the position i of every citation,
+        ordered by row then position, and a dict of the citation fields as Python lists
     """
-    citations = []
-    
-    try:
-        # Extract the list from the numpy array
-        if isinstance(results_array, np.ndarray) and len(results_array) > 0:
-            results_list = results_array[0]  # Get the first (and usually only) element
+    maps = pc.list_flatten(results)
+    map_rows = pc.list_parent_indices(results).to_numpy()
+    # First map of each row (null lists and empty lists have none)
+    first = np.flatnonzero(np.r_[True, map_rows[1:] != map_rows[:-1]]) if len(map_rows) else np.empty(0, dtype=np.int64)
+    first_maps = maps.take(pa.array(first, type=pa.int64()))
+    offsets = first_maps.offsets.to_numpy()
+    entry_rows = np.repeat(map_rows[first], np.diff(offsets))
+    metadata = first_maps.items
+
+    has_metadata = metadata.is_valid().to_numpy(zero_copy_only=False)
+    if metadata.type.get_field_index("scores") >= 0:
+        has_scores = pc.struct_field(metadata, "scores").is_valid().to_numpy(zero_copy_only=False)
+    else:
+        has_scores = np.ones(len(metadata), dtype=bool)
+    broken = has_metadata & ~has_scores
+
+    # Entries after the first broken entry of a row are dropped
+    index = np.arange(len(metadata))
+    row_start = np.maximum.accumulate(np.where(np.r_[True, entry_rows[1:] != entry_rows[:-1]], index, 0)) if len(index) else index
+    broken_before = np.cumsum(broken) - broken
+    broken_before -= broken_before[row_start] if len(index) else 0
+    kept = np.flatnonzero(has_metadata & (broken_before == 0))
+
+    kept_rows = entry_rows[kept]
+    run_start = np.r_[True, kept_rows[1:] != kept_rows[:-1]] if len(kept) else np.empty(0, dtype=bool)
+    kept_positions = np.arange(len(kept)) - np.maximum.accumulate(np.where(run_start, np.arange(len(kept)), 0))
+
+    kept_metadata = metadata.take(pa.array(kept, type=pa.int64()))
+    kept_broken = broken[kept].tolist()
+    columns = {}
+    for name in CITATION_FIELDS:
+        values = struct_field_list(kept_metadata, name, "Unknown")
+        columns[name] = ["Unknown" if b else v for v, b in zip(values, kept_broken)]
+    if kept_metadata.type.get_field_index("scores") >= 0:
+        scores = pc.struct_field(kept_metadata, "scores")
+        for name, field in zip(SCORE_FIELDS, CITATION_FIELDS):
+            columns[name] = [score_list(v) for v in struct_field_list(scores, field, None)]
+    else:
+        for name in SCORE_FIELDS:
+            columns[name] = [[] for _ in kept]
+
+    # Rows without citations get a single fallback citation
+    fallback_rows = np.setdiff1d(np.arange(num_rows), kept_rows)
+    rows = np.concatenate([kept_rows, fallback_rows])
+    positions = np.concatenate([kept_positions, np.zeros(len(fallback_rows), dtype=kept_positions.dtype)])
+    for name in CITATION_FIELDS:
+        columns[name].extend(["Unknown"] * len(fallback_rows))
+    for name in SCORE_FIELDS:
+        columns[name].extend([] for _ in fallback_rows)
+
+    order = np.argsort(rows, kind="stable")
+    columns = {name: [values[i] for i in order] for name, values in columns.items()}
+    return rows[order], positions[order], columns
+
+def normalize_doi_column(column):
+    """
+    Pid.normalized_value of a whole column of DOIs (lowercased, trimmed, doi.org and
+    doi: prefixes removed, see utils.normalize_pid): null DOIs become "none".
+    """
+    column = pc.fill_null(column.cast(pa.string()), "None")
+    if pc.all(pc.string_is_ascii(column)).as_py() is not False:
+        column = pc.ascii_lower(pc.ascii_trim_whitespace(column))
+        return pc.replace_substring_regex(column, DOI_PREFIX.pattern, "").to_pylist()
+    return [DOI_PREFIX.sub("", value.strip().lower()) for value in column.to_pylist()]
+
+class SeenIds:
+    """
+    Set of the citation ids kept so far.
+
+    Uses a 64-bit roaring bitmap when pyroaring is installed (a few bits per id for the
+    mostly consecutive citation ids), otherwise sorted int64 NumPy runs (8 bytes per id)
+    that are merged as they grow.
+    """
+
+    def __init__(self):
+        self._bitmap = BitMap64() if BitMap64 is not None else None
+        self._runs = []
+
+    @classmethod
+    def load(cls, store_dir):
+        """Load the ids saved by save() in store_dir (an empty set if there are none)."""
+        seen = cls()
+        roaring_path = os.path.join(store_dir, "seen_ids.roaring")
+        numpy_path = os.path.join(store_dir, "seen_ids.npy")
+        if os.path.exists(roaring_path):
+            if seen._bitmap is None:
+                raise RuntimeError(f"{roaring_path} was written with pyroaring, which is not installed")
+            with open(roaring_path, "rb") as f:
+                seen._bitmap = BitMap64.deserialize(f.read())
+        elif os.path.exists(numpy_path):
+            ids = np.load(numpy_path)
+            if seen._bitmap is not None:
+                seen._bitmap = BitMap64(ids.view(np.uint64))
+            elif len(ids):
+                seen._runs = [ids]
+        return seen
+
+    def save(self, store_dir):
+        """Save the ids to store_dir/seen_ids.roaring (pyroaring) or seen_ids.npy."""
+        os.makedirs(store_dir, exist_ok=True)
+        if self._bitmap is not None:
+            path, stale = os.path.join(store_dir, "seen_ids.roaring"), os.path.join(store_dir, "seen_ids.npy")
+            with open(path + ".tmp", "wb") as f:
+                f.write(self._bitmap.serialize())
         else:
-            results_list = results_array
-        
-        # Process the results list
-        if isinstance(results_list, list):
-            for citation_tuple in results_list:
-                if isinstance(citation_tuple, tuple) and len(citation_tuple) >= 2:
-                    position, metadata = citation_tuple
-                    
-                    # Extract metadata
-                    if isinstance(metadata, dict):
-                        semantics = metadata.get('semantics', 'Unknown')
-                        intent = metadata.get('intent', 'Unknown')
-                        polarity = metadata.get('polarity', 'Unknown')
-                        
-                        # Extract scores if available
-                        scores = metadata.get('scores', {})
-                        semantics_scores = scores.get('semantics', [])
-                        intent_scores = scores.get('intent', [])
-                        polarity_scores = scores.get('polarity', [])
-                        
-                        # Convert numpy arrays to lists for JSON serialization
-                        if isinstance(semantics_scores, np.ndarray):
-                            semantics_scores = semantics_scores.tolist()
-                        if isinstance(intent_scores, np.ndarray):
-                            intent_scores = intent_scores.tolist()
-                        if isinstance(polarity_scores, np.ndarray):
-                            polarity_scores = polarity_scores.tolist()
-                        
-                        citation = {
-                            'semantics': semantics,
-                            'intent': intent,
-                            'polarity': polarity,
-                            'semantics_scores': semantics_scores if semantics_scores else [],
-                            'intent_scores': intent_scores if intent_scores else [],
-                            'polarity_scores': polarity_scores if polarity_scores else []
-                        }
-                        citations.append(citation)
-        # print(citations)
-    except Exception as e:
-        print(f"Warning: Error processing citation data: {e}")
-        # Create a fallback citation
-        citations.append({
-            'semantics': "Unknown",
-            'intent': "Unknown",
-            'polarity': "Unknown",
-            'semantics_scores': [],
-            'intent_scores': [],
-            'polarity_scores': []
-        })
-    
-    return citations
+            path, stale = os.path.join(store_dir, "seen_ids.npy"), os.path.join(store_dir, "seen_ids.roaring")
+            ids = np.sort(np.concatenate(self._runs)) if self._runs else np.zeros(0, dtype=np.int64)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, ids)
+        os.replace(path + ".tmp", path)
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def add_new(self, ids):
+        """Add distinct ids to the set; return the mask of those that were not in it yet."""
+        if self._bitmap is not None:
+            batch = BitMap64(ids.view(np.uint64))
+            seen = self._bitmap & batch
+            self._bitmap |= batch
+            if not seen:
+                return np.ones(len(ids), dtype=bool)
+            return ~np.isin(ids, np.fromiter(seen, dtype=np.uint64, count=len(seen)).view(np.int64))
+
+        new = np.ones(len(ids), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, ids), len(run) - 1)
+            new &= run[positions] != ids
+        run = np.sort(ids[new])
+        # Keep O(log n) runs: merge while the previous run is not larger than the new one
+        while self._runs and len(self._runs[-1]) <= len(run):
+            # Runs are disjoint: only new ids are added
+            run = np.sort(np.concatenate([self._runs.pop(), run]), kind="stable")
+        if len(run):
+            self._runs.append(run)
+        return new
+
+class CitationDedup:
+    """
+    Keeps the first occurrence of every citationid across all the files it is used for
+    (in processing order) and counts the removed duplicate rows per space.
+    """
+
+    def __init__(self, seen=None):
+        self.seen = seen if seen is not None else SeenIds()
+        self.duplicates = {}
+
+    def fresh_rows(self, batch):
+        """Return the indices of the batch rows to keep (rows without citationid are skipped)."""
+        ids_column = batch.column("citationid")
+        rows = np.arange(batch.num_rows)
+        if ids_column.null_count:
+            print(f"  Warning: skipping {ids_column.null_count} rows without citationid")
+            rows = np.flatnonzero(ids_column.is_valid().to_numpy(zero_copy_only=False))
+        ids = ids_column.fill_null(0).to_numpy(zero_copy_only=False).astype(np.int64)[rows]
+
+        _, first = np.unique(ids, return_index=True)
+        first.sort()
+        fresh = rows[first[self.seen.add_new(ids[first])]]
+
+        if len(fresh) < len(rows):
+            removed = pa.array(np.setdiff1d(rows, fresh), type=pa.int64())
+            spaces = pc.fill_null(batch.column("spaces").cast(pa.string()), "None").take(removed)
+            for item in pc.value_counts(spaces).to_pylist():
+                self.duplicates[item["values"]] = self.duplicates.get(item["values"], 0) + item["counts"]
+        return fresh
+
+    def report(self, spaces=None):
+        """Print the removed duplicates per space (only those of `spaces` when given)."""
+        duplicates = {space: count for space, count in self.duplicates.items() if not spaces or space in spaces}
+        total = sum(duplicates.values())
+        print(f"Removed {total} duplicate citation rows")
+        for space, count in sorted(duplicates.items()):
+            print(f"  {space}: {count}")
+
+class PrecomputedDedup:
+    """Applies the keep mask computed for a file by prescan_duplicates() (parallel mode)."""
 
-def process_single_file(file_path, space_files, output_dir):
+    def __init__(self, keep_mask):
+        self.keep_mask = keep_mask
+        self.offset = 0
+
+    def fresh_rows(self, batch):
+        mask = self.keep_mask[self.offset:self.offset + batch.num_rows]
+        self.offset += batch.num_rows
+        return np.flatnonzero(mask)
+
+def scan_keep_masks(parquet_files, dedup, spaces=None):
+    """
+    Yield, for each parquet file in order, the mask of the rows that keep their citationid,
+    reading only the citationid and spaces columns.
+
+    The ids of all the rows are deduplicated, whatever `spaces`: a row is dropped when its
+    id occurred earlier in any space, so that the rows kept for the selected spaces are
+    those a run without `spaces` keeps. With `spaces`, the mask is then restricted to the
+    rows of these spaces, in the order of the filtered scan.
+    """
+    for file_path in parquet_files:
+        masks = []
+        for batch in scan_batches(file_path, DEDUP_COLUMNS):
+            mask = np.zeros(batch.num_rows, dtype=bool)
+            mask[dedup.fresh_rows(batch)] = True
+            if spaces:
+                mask = mask[space_mask(batch, spaces)]
+            masks.append(mask)
+        yield np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+
+def prescan_duplicates(parquet_files, shard_dir, seen=None, spaces=None):
+    """
+    Compute, in file order, which rows of each parquet file keep their citationid (see
+    scan_keep_masks). The masks are saved as packed bits to <shard_dir>/<shard>.keep.npy
+    so that workers can deduplicate independently.
+
+    Args:
+        seen: Optional SeenIds of previous runs (incremental mode)
+        spaces: Optional spaces the rows are restricted to
+
+    Returns:
+        The CitationDedup holding the duplicate counts per space
+    """
+    dedup = CitationDedup(seen)
+    for i, keep in enumerate(scan_keep_masks(parquet_files, dedup, spaces)):
+        np.save(os.path.join(shard_dir, f"{i:05d}.keep.npy"), np.packbits(keep))
+    return dedup
+
+def load_keep_mask(path):
+    # Padding bits after the last row are never read
+    return np.unpackbits(np.load(path)).astype(bool)
+
+def resolve_relation(relation, spaces, resolver):
+    """
+    Attach the source and destination Product ids to a relation.
+
+    Returns one relation per (source, destination) Product pair, matching what the
+    DOI-based loader would create, or no relation when either DOI is unresolved.
+    Relations of spaces without a DOI index are returned unchanged.
+    """
+    if resolver is None or not resolver.covers(spaces):
+        return [relation]
+    source_ids = resolver.resolve(spaces, relation['source_doi'])
+    dest_ids = resolver.resolve(spaces, relation['dest_doi'])
+    return [
+        dict(relation, source_id=source_id, dest_id=dest_id)
+        for source_id in source_ids
+        for dest_id in dest_ids
+    ]
+
+def space_filename(spaces, shard=None, suffix=""):
+    """Output file of a space; worker shards carry the shard name before the extension."""
+    safe_space_name = spaces.replace('/', '_').replace('\\', '_').replace(' ', '_') + suffix
+    if shard is None:
+        return f"{safe_space_name}.jsonl.gz"
+    return f"{safe_space_name}.{shard}.jsonl.gz"
+
+def write_indicators(counters, output_dir, resolver, store=None, incremental=False, written_spaces=()):
+    """
+    Write <space>_indicators.jsonl.gz files, keyed by Product id, for the spaces with a DOI index.
+
+    Only citances whose source and destination DOIs both resolve to Products are counted,
+    as in compute-indicators.cypher. Without a DOI index, citances whose source is not a
+    Product cannot be told apart offline, so no indicators are written for those spaces
+    (written_spaces lists the spaces of the run, to report them).
+
+    With a CounterStore, a full run replaces the stored counters; an incremental run adds
+    its counters to them and only writes the indicators of the destinations it counted.
+    """
+    table = counters.result()
+    if store is not None:
+        if incremental:
+            table = store.update(table)
+        else:
+            store.replace(table)
+    write_indicator_files(table, output_dir, lambda space: space_filename(space, suffix="_indicators"))
+    uncovered = sorted(space for space in written_spaces if resolver is None or not resolver.covers(space))
+    if uncovered:
+        print(
+            f"No indicators written for the spaces without --doi-index ({', '.join(uncovered)}): "
+            "run compute-indicators.cypher after loading their citances"
+        )
+
+def process_single_file(
+    file_path,
+    space_files,
+    output_dir,
+    resolver=None,
+    shard=None,
+    dedup=None,
+    counters=None,
+    score_encoding="json",
+    spaces=None,
+):
     """
     Process a single parquet file and write relations to appropriate gzipped JSONL files.
+
+    The file is read in record batches of BATCH_SIZE rows; relation fields are built
+    as whole columns and each space's relations are written once per batch.
     
     Args:
         file_path: Path to the parquet file
         space_files: Dictionary to track open file handles for each space
         output_dir: Output directory for JSONL files
+        resolver: Optional DoiResolver adding source_id/dest_id Product ids
+        shard: Optional shard name added to the space file names (see space_filename)
+        dedup: CitationDedup shared across files (or PrecomputedDedup); by default
+            duplicate citation ids are only removed within this file
+        counters: Optional IndicatorCounters accumulating the replication-degree counters
+        score_encoding: "json" writes the score lists as JSON arrays, "float16" or "uint8"
+            as base64 strings of quantized arrays (see scores.py)
+        spaces: Optional list of spaces to extract; other rows are filtered in the scan
     """
     try:
         print(f"Processing: {os.path.basename(file_path)}")
-        df = pd.read_parquet(file_path, engine="pyarrow")
 
-        # Get unique rows by citation_id
-        df = df.drop_duplicates(subset=["citationid"], keep="first")
-        # print(df.size)
+        if dedup is None:
+            dedup = CitationDedup()  # Unique rows by citation_id within this file
+        file_rows = 0
         file_relations = 0
-        
-        for idx, row in df.iterrows():
-            citation_id = row['citationid']
-            source_doi = str(row['source_doi']).lower()
-            dest_doi = str(row['dest_doi']).lower()
-            spaces = str(row['spaces'])
-            space_doi = str(row['space_doi']).lower()
-            
-            # Extract citation data
-            citations = extract_citation_data(row['results'], row['citation_mentions'])
-
-            # print(citation_id)
-            # print(row['results'])
-            # print(row['citation_mentions'])
-            # print(citations)
-            # print()
-
-            # Create relation records - handle both cases in one block
-            if citations:
-                # If citations found, create one relation per citation
-                for i, citation in enumerate(citations):
-                    relation = {
-                        'citation_id': f"{int(citation_id)}:{i}",
-                        'source_doi': source_doi.lower(),
-                        'dest_doi': dest_doi.lower(),
-                        # 'spaces': spaces,
-                        # 'space_doi': space_doi,
-                        'semantics': citation['semantics'],
-                        'intent': citation['intent'],
-                        'polarity': citation['polarity'],
-                        'semantics_scores': citation['semantics_scores'],
-                        'intent_scores': citation['intent_scores'],
-                        'polarity_scores': citation['polarity_scores']
-                    }
-                    
-                    # Write to appropriate space file
-                    if spaces not in space_files:
-                        # Create new gzipped file for this space
-                        safe_space_name = spaces.replace('/', '_').replace('\\', '_').replace(' ', '_')
-                        filename = f"{safe_space_name}.jsonl.gz"
-                        filepath = os.path.join(output_dir, filename)
-                        space_files[spaces] = {
-                            'file': gzip.open(filepath, 'wt', encoding='utf-8'),
-                            'filename': filename,
-                            'filepath': filepath,
-                            'count': 0
-                        }
-                        print(f"  Created new file: {filename}")
-                    
-                    # Write relation to file
-                    json.dump(relation, space_files[spaces]['file'], ensure_ascii=False)
-                    space_files[spaces]['file'].write('\n')
-                    space_files[spaces]['count'] += 1
-                    file_relations += 1
-            else:
-                # If no citations extracted, create a single basic relation
+
+        for batch in scan_batches(file_path, COLUMNS, spaces):
+            batch = batch.take(pa.array(dedup.fresh_rows(batch), type=pa.int64()))
+            file_rows += batch.num_rows
+
+            rows, positions, columns = extract_citation_columns(batch.column("results"), batch.num_rows)
+            if score_encoding != "json":
+                for name in SCORE_FIELDS:
+                    columns[name] = encode_score_column(columns[name], score_encoding)
+            row_index = pa.array(rows, type=pa.int64())
+            citation_ids = pc.binary_join_element_wise(
+                pc.cast(batch.column("citationid").take(row_index), pa.string()),
+                pc.cast(pa.array(positions), pa.string()),
+                ":",
+            ).to_pylist()
+            source_dois = normalize_doi_column(batch.column("source_doi").take(row_index))
+            dest_dois = normalize_doi_column(batch.column("dest_doi").take(row_index))
+            spaces_column = pc.fill_null(batch.column("spaces").cast(pa.string()), "None").take(row_index).to_pylist()
+
+            batch_lines = {}
+            counted = ([], [], [], [])  # space, destination, polarity, intent of every resolved relation
+            for citation_id, source_doi, dest_doi, spaces, semantics, intent, polarity, semantics_scores, intent_scores, polarity_scores in zip(
+                citation_ids, source_dois, dest_dois, spaces_column,
+                columns["semantics"], columns["intent"], columns["polarity"],
+                columns["semantics_scores"], columns["intent_scores"], columns["polarity_scores"],
+            ):
                 relation = {
-                    'citation_id': f"{int(citation_id)}:0",
-                    'source_doi': source_doi.lower(),
-                    'dest_doi': dest_doi.lower(),
-                    # 'spaces': spaces,
-                    # 'space_doi': space_doi,
-                    'semantics': "Unknown",
-                    'intent': "Unknown",
-                    'polarity': "Unknown",
-                    'semantics_scores': [],
-                    'intent_scores': [],
-                    'polarity_scores': []
+                    'citation_id': citation_id,
+                    'source_doi': source_doi,
+                    'dest_doi': dest_doi,
+                    'semantics': semantics,
+                    'intent': intent,
+                    'polarity': polarity,
+                    'semantics_scores': semantics_scores,
+                    'intent_scores': intent_scores,
+                    'polarity_scores': polarity_scores
                 }
-                
-                # Write to appropriate space file
+                if score_encoding != "json":
+                    relation['score_encoding'] = score_encoding
+                lines = batch_lines.get(spaces)
+                if lines is None:
+                    lines = batch_lines[spaces] = []
+                for resolved in resolve_relation(relation, spaces, resolver):
+                    lines.append(encode_relation(resolved))
+                    # Indicators are only counted between resolved Products (see write_indicators)
+                    if 'dest_id' in resolved:
+                        counted[0].append(spaces)
+                        counted[1].append(resolved['dest_id'])
+                        counted[2].append(polarity)
+                        counted[3].append(intent)
+            if counters is not None:
+                counters.add(*counted)
+
+            # Write each space's relations of this batch at once
+            for spaces, lines in batch_lines.items():
                 if spaces not in space_files:
-                    safe_space_name = spaces.replace('/', '_').replace('\\', '_').replace(' ', '_')
-                    filename = f"{safe_space_name}.jsonl.gz"
+                    # Create new gzipped file for this space
+                    filename = space_filename(spaces, shard)
                     filepath = os.path.join(output_dir, filename)
                     space_files[spaces] = {
                         'file': gzip.open(filepath, 'wt', encoding='utf-8'),
@@ -181,13 +506,12 @@ def process_single_file(file_path, space_files, output_dir):
                         'count': 0
                     }
                     print(f"  Created new file: {filename}")
-                
-                json.dump(relation, space_files[spaces]['file'], ensure_ascii=False)
-                space_files[spaces]['file'].write('\n')
-                space_files[spaces]['count'] += 1
-                file_relations += 1
+                if lines:
+                    space_files[spaces]['file'].write('\n'.join(lines) + '\n')
+                space_files[spaces]['count'] += len(lines)
+                file_relations += len(lines)
         
-        print(f"  Processed {file_relations} relations from {len(df)} rows")
+        print(f"  Processed {file_relations} relations from {file_rows} rows")
         
     except Exception as e:
         print(f"Error processing file {file_path}: {e}")
@@ -198,7 +522,68 @@ def close_space_files(space_files):
         file_info['file'].close()
         print(f"Closed {file_info['filename']} with {file_info['count']} relations")
 
-def process_parquet_files(directory, max_files=None, output_dir="jsonl_output"):
+def process_file_shard(task):
+    """
+    Worker entry point: process one parquet file into its own per-space shard files.
+
+    Returns:
+        (shards, resolved, unresolved, counters): space -> (shard path, relation count),
+        the DOI resolution counts of the worker's resolver (empty without DOI indexes)
+        and the worker's indicator counters table
+    """
+    file_path, shard, shard_dir, doi_indexes, score_encoding, spaces = task
+    space_files = {}
+    keep_path = os.path.join(shard_dir, f"{shard}.keep.npy")
+    dedup = PrecomputedDedup(load_keep_mask(keep_path))
+    resolver = DoiResolver(doi_indexes) if doi_indexes else None
+    counters = IndicatorCounters()
+    try:
+        process_single_file(
+            file_path, space_files, shard_dir, resolver,
+            shard=shard, dedup=dedup, counters=counters, score_encoding=score_encoding, spaces=spaces,
+        )
+    finally:
+        for file_info in space_files.values():
+            file_info['file'].close()
+        if resolver is not None:
+            resolver.close()
+    shards = {space: (file_info['filepath'], file_info['count']) for space, file_info in space_files.items()}
+    if resolver is None:
+        return shards, {}, {}, counters.result()
+    return shards, resolver.resolved, resolver.unresolved, counters.result()
+
+def merge_shards(results, output_dir, shard_dir):
+    """
+    Concatenate the worker shards of each space, in input file order, into the space's
+    JSONL.GZ file (a multi-member gzip file reads back as one stream) and merge the counts.
+    """
+    space_shards = {}
+    for shards, _, _, _ in results:
+        for space, (path, count) in shards.items():
+            space_shards.setdefault(space, []).append((path, count))
+
+    for space, shards in space_shards.items():
+        filename = space_filename(space)
+        with open(os.path.join(output_dir, filename), 'wb') as out:
+            for path, _ in shards:
+                with open(path, 'rb') as shard_file:
+                    shutil.copyfileobj(shard_file, out, 16 * 1024 * 1024)
+                os.remove(path)
+        count = sum(count for _, count in shards)
+        print(f"Closed {filename} with {count} relations (merged from {len(shards)} shards)")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+
+def process_parquet_files(
+    directory,
+    max_files=None,
+    output_dir="jsonl_output",
+    doi_indexes=None,
+    workers=1,
+    counter_store=None,
+    incremental=False,
+    score_encoding="json",
+    spaces=None,
+):
     """
     Process parquet files individually and write relations to gzipped JSONL files by space.
     
@@ -206,6 +591,26 @@ def process_parquet_files(directory, max_files=None, output_dir="jsonl_output"):
         directory: Directory containing parquet files
         max_files: Maximum number of files to process (None for all)
         output_dir: Output directory for JSONL files
+        doi_indexes: Optional mapping of space -> pilot graph base_dir with a DOI index
+            (skgif/parsers/index.py build-doi); relations of these spaces get Product ids
+        workers: Number of worker processes; with more than one, each parquet file is
+            processed into per-space shards that are merged at the end
+        counter_store: Optional directory persisting the indicator counters and the
+            citation ids seen so far
+        incremental: The input is a delta of new citances: ids already in counter_store
+            are skipped, its counters are updated and only the indicators of the
+            destinations cited by the delta are written
+        score_encoding: Encoding of the score lists (see process_single_file)
+        spaces: Optional list of spaces to extract (pushed down to the parquet scan)
+
+    Replication-degree indicators (see indicators.py) are written per space to
+    <space>_indicators.jsonl.gz, for the spaces in doi_indexes.
+
+    Duplicate citation ids are removed across all files, keeping the first occurrence
+    in file order; with workers, a first pass over the citationid column decides which
+    rows are kept, so the output does not depend on the number of workers. With spaces,
+    that pass reads the ids of every row (not only those of the selected spaces), so the
+    output is the subset of the selected spaces of a run without spaces.
     """
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
@@ -219,23 +624,156 @@ def process_parquet_files(directory, max_files=None, output_dir="jsonl_output"):
     if max_files:
         parquet_files = parquet_files[:max_files]
         print(f"Processing first {max_files} files")
+    report_read_bytes(parquet_files, spaces)
+    
+    resolver = DoiResolver(doi_indexes) if doi_indexes else None
+    store = CounterStore(counter_store) if counter_store else None
+    seen = SeenIds.load(counter_store) if incremental else SeenIds()
+
+    if workers > 1:
+        shard_dir = os.path.join(output_dir, "_shards")
+        os.makedirs(shard_dir, exist_ok=True)
+        tasks = [(file_path, f"{i:05d}", shard_dir, doi_indexes, score_encoding, spaces) for i, file_path in enumerate(parquet_files)]
+        results = []
+        try:
+            dedup = prescan_duplicates(parquet_files, shard_dir, seen, spaces)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(process_file_shard, tasks))
+            merge_shards(results, output_dir, shard_dir)
+            dedup.report(spaces)
+            counters = IndicatorCounters()
+            for _, _, _, table in results:
+                if table is not None:
+                    counters.add_table(table)
+            written_spaces = {space for shards, _, _, _ in results for space in shards}
+            write_indicators(counters, output_dir, resolver, store, incremental, written_spaces)
+            if store is not None:
+                seen.save(counter_store)
+        finally:
+            if resolver is not None:
+                for _, resolved, unresolved, _ in results:
+                    resolver.merge(resolved, unresolved)
+                resolver.write_report(output_dir)
+                resolver.close()
+        return
     
     space_files = {}  # Track open files for each space
+    dedup = CitationDedup(seen)  # Shared by all files
+    # With spaces, the ids of the other spaces are deduplicated too (see scan_keep_masks)
+    keep_masks = scan_keep_masks(parquet_files, dedup, spaces) if spaces else None
+    counters = IndicatorCounters()
     
     try:
         # Process each file individually
         for i, file_path in enumerate(parquet_files):
             print(f"\nFile {i+1}/{len(parquet_files)}")
-            process_single_file(file_path, space_files, output_dir)
+            process_single_file(
+                file_path, space_files, output_dir, resolver,
+                dedup=PrecomputedDedup(next(keep_masks)) if keep_masks is not None else dedup,
+                counters=counters, score_encoding=score_encoding, spaces=spaces,
+            )
+        dedup.report(spaces)
+        write_indicators(counters, output_dir, resolver, store, incremental, space_files)
+        if store is not None:
+            seen.save(counter_store)
     
     finally:
         # Close all open files
         close_space_files(space_files)
+        if resolver is not None:
+            resolver.write_report(output_dir)
+            resolver.close()
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Extract citances from parquet files into per-space gzipped JSONL files."
+    )
+    parser.add_argument(
+        "--input", "-i",
+        dest="directory",
+        required=True,
+        help="Directory containing the *.snappy.parquet files",
+    )
+    parser.add_argument(
+        "--output-dir", "-o",
+        dest="output_dir",
+        required=True,
+        help="Directory where the per-space JSONL.GZ files are written",
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=1,
+        help="Number of parquet files processed in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--max-files",
+        type=int,
+        default=None,
+        help="Process only the first N parquet files",
+    )
+    parser.add_argument(
+        "--doi-index",
+        dest="doi_indexes",
+        action="append",
+        type=space_dir,
+        metavar="SPACE=BASE_DIR",
+        help=(
+            "Resolve the DOIs of SPACE to Product ids with the DOI index of the pilot graph "
+            "in BASE_DIR (built with skgif/parsers/index.py build-doi). May be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--counter-store",
+        default=None,
+        metavar="DIR",
+        help=(
+            "Persist the indicator counters and the processed citation ids in DIR, "
+            "so that later deltas can be processed with --incremental"
+        ),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "The input only holds new citances: update the --counter-store and write the "
+            "indicators of the affected destinations only"
+        ),
+    )
+    parser.add_argument(
+        "--score-encoding",
+        choices=ENCODINGS,
+        default="json",
+        help=(
+            "Encoding of semantics_scores, intent_scores and polarity_scores: JSON lists (default) "
+            "or base64 float16/uint8 arrays, see scores.py"
+        ),
+    )
+    parser.add_argument(
+        "--spaces",
+        nargs="+",
+        default=None,
+        metavar="SPACE",
+        help="Only extract the citances of these spaces (filter pushed down to the parquet row groups)",
+    )
+    return parser
 
-# Example usage
 if __name__ == "__main__":
-    directory = "/data/ser-data/citance_evaluate_030925/"
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.incremental and not args.counter_store:
+        parser.error("--incremental requires --counter-store")
     
     # Process files and create gzipped JSONL output by space
     print("Processing files with relation extraction...")
-    process_parquet_files(directory, max_files=None, output_dir="/data/ser-data/citances_parsed/")
+    process_parquet_files(
+        args.directory,
+        max_files=args.max_files,
+        output_dir=args.output_dir,
+        doi_indexes=dict(args.doi_indexes or []),
+        workers=args.workers,
+        counter_store=args.counter_store,
+        incremental=args.incremental,
+        score_encoding=args.score_encoding,
+        spaces=args.spaces,
+    )
@@ -0,0 +1,176 @@
+"""
+Replication-degree indicators computed offline from the extracted citances.
+
+Equivalent to replication-degree-indicators/compute-indicators.cypher, evaluated on
+the CITANCE relationships that the written citance files create, per destination.
+These are only known offline for the spaces whose DOIs are resolved to Product ids
+(citances.py --doi-index), so the counters only cover those spaces:
+  - repro_positive_mentions_count: citances with 'Supporting' polarity
+  - repro_rci: (positive + 0.5 * neutral - negative) / total
+  - repro_focused_rci: the same over the citances with 'Comparison' intent only; it is
+    only set for destinations that have such citances
+
+Counters are aggregated per batch with Arrow group-bys and the partial tables are
+combined as they accumulate, so memory grows with the number of destinations only.
+
+A CounterStore persists the counters (Parquet) so that a later run over a delta of
+new citances only updates them and emits the indicators of the affected destinations.
+"""
+
+import gzip
+import json
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+KEYS = ["space", "dest"]
+COUNTERS = ["pos", "neu", "neg", "total", "cmp_pos", "cmp_neu", "cmp_neg", "cmp_total"]
+# Partial group-by tables kept before they are combined
+COMPACT_EVERY = 64
+
+def replication_confidence(pos, neu, neg, total):
+    """(pos + 0.5 * neu - neg) * 1.0 / total, evaluated in the same order as the Cypher formula."""
+    return (pos + 0.5 * neu - neg) * 1.0 / total
+
+def aggregate(table):
+    """Sum the counters of a table per (space, dest)."""
+    grouped = table.group_by(KEYS).aggregate([(name, "sum") for name in COUNTERS])
+    grouped = grouped.rename_columns([name[:-len("_sum")] if name.endswith("_sum") else name for name in grouped.column_names])
+    return grouped.select(KEYS + COUNTERS)
+
+def sort_counters(table):
+    return table.sort_by([("space", "ascending"), ("dest", "ascending")])
+
+class IndicatorCounters:
+    """Polarity and intent counters per (space, destination) of the written citances."""
+
+    def __init__(self):
+        self._tables = []
+
+    def add(self, spaces, dests, polarities, intents):
+        """Count one batch of citances, given as parallel lists (one entry per written relation)."""
+        if not dests:
+            return
+        polarity = pa.array(polarities, type=pa.string())
+        comparison = pc.fill_null(pc.equal(pa.array(intents, type=pa.string()), "Comparison"), False)
+        columns = {"space": pa.array(spaces, type=pa.string()), "dest": pa.array(dests, type=pa.string())}
+        for name, value in (("pos", "Supporting"), ("neu", "Neutral"), ("neg", "Refuting")):
+            flag = pc.fill_null(pc.equal(polarity, value), False)
+            columns[name] = pc.cast(flag, pa.int64())
+            columns[f"cmp_{name}"] = pc.cast(pc.and_(flag, comparison), pa.int64())
+        columns["total"] = pa.array(np.ones(len(dests), dtype=np.int64))
+        columns["cmp_total"] = pc.cast(comparison, pa.int64())
+        self.add_table(aggregate(pa.table(columns)))
+
+    def add_table(self, table):
+        """Add counters already aggregated per (space, dest), e.g. the result() of a worker."""
+        self._tables.append(table)
+        if len(self._tables) >= COMPACT_EVERY:
+            self._tables = [self.result()]
+
+    def result(self):
+        """Return the counters per (space, dest) as one Arrow table sorted by space and destination."""
+        if not self._tables:
+            return None
+        table = aggregate(pa.concat_tables(self._tables)) if len(self._tables) > 1 else self._tables[0]
+        return sort_counters(table)
+
+class CounterStore:
+    """
+    Local store of the counters per (space, dest) of all the citances processed so far,
+    kept as <store_dir>/counters.parquet.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.path = os.path.join(store_dir, "counters.parquet")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        return pq.read_table(self.path)
+
+    def save(self, table):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def replace(self, table):
+        """Replace the stored counters with those of a full run."""
+        if table is not None:
+            self.save(table)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def update(self, delta):
+        """
+        Add the counters of a delta of new citances to the store.
+
+        Returns:
+            The updated counters of the destinations present in the delta, i.e. the
+            indicator updates to load
+        """
+        if delta is None:
+            return None
+        previous = self.load()
+        if previous is None:
+            self.save(delta)
+            return delta
+        combined = sort_counters(aggregate(pa.concat_tables([previous, delta.cast(previous.schema)])))
+        self.save(combined)
+        affected = combined.join(delta.select(KEYS), keys=KEYS, join_type="inner")
+        return sort_counters(affected.select(KEYS + COUNTERS))
+
+def write_indicator_files(table, output_dir, filename):
+    """
+    Write one indicators JSONL.GZ file per space from a counters table, keyed on the
+    local_identifier of the destination Products.
+
+    Args:
+        table: Counters per (space, dest), sorted by space (or None)
+        output_dir: Output directory
+        filename: Function giving the file name of a space
+
+    Returns:
+        dict: mapping space -> number of destinations written
+    """
+    counts = {}
+    if table is None:
+        return counts
+    counters = {name: table.column(name).to_numpy() for name in COUNTERS}
+    rci = replication_confidence(counters["pos"], counters["neu"], counters["neg"], counters["total"])
+    has_comparison = counters["cmp_total"] > 0
+    focused_rci = np.zeros(len(table))
+    focused_rci[has_comparison] = replication_confidence(
+        counters["cmp_pos"][has_comparison],
+        counters["cmp_neu"][has_comparison],
+        counters["cmp_neg"][has_comparison],
+        counters["cmp_total"][has_comparison],
+    )
+
+    spaces = table.column("space").to_pylist()
+    dests = table.column("dest").to_pylist()
+    start = 0
+    while start < len(spaces):
+        space = spaces[start]
+        end = start
+        while end < len(spaces) and spaces[end] == space:
+            end += 1
+        path = os.path.join(output_dir, filename(space))
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for i in range(start, end):
+                record = {
+                    "local_identifier": dests[i],
+                    "repro_positive_mentions_count": int(counters["pos"][i]),
+                    "repro_rci": float(rci[i]),
+                }
+                if has_comparison[i]:
+                    record["repro_focused_rci"] = float(focused_rci[i])
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        counts[space] = end - start
+        print(f"Wrote indicators for {end - start} destinations to {path}")
+        start = end
+    return counts
@@ -4,10 +4,30 @@ CALL apoc.periodic.iterate(
   RETURN value
   ',
   '
-  // Match source Product by DOI
-  MATCH (srcPid:Pid {scheme: "doi", value: value.source_doi})<-[:HAS_PID]-(src:Product)
-  // Match destination Product by DOI
-  MATCH (dstPid:Pid {scheme: "doi", value: value.dest_doi})<-[:HAS_PID]-(dst:Product)
+  // Match source and destination Products by the ids resolved by citances.py --doi-index,
+  // or by DOI (normalised Pid value) for files produced without --doi-index
+  CALL {
+    WITH value
+    WITH value WHERE value.source_id IS NOT NULL
+    MATCH (src:Product {local_identifier: value.source_id})
+    RETURN src
+    UNION
+    WITH value
+    WITH value WHERE value.source_id IS NULL
+    MATCH (:Pid {normalized_scheme: "doi", normalized_value: value.source_doi})<-[:HAS_PID]-(src:Product)
+    RETURN src
+  }
+  CALL {
+    WITH value
+    WITH value WHERE value.dest_id IS NOT NULL
+    MATCH (dst:Product {local_identifier: value.dest_id})
+    RETURN dst
+    UNION
+    WITH value
+    WITH value WHERE value.dest_id IS NULL
+    MATCH (:Pid {normalized_scheme: "doi", normalized_value: value.dest_doi})<-[:HAS_PID]-(dst:Product)
+    RETURN dst
+  }
 
   // Create direct relationship with metadata
   CREATE (src)-[r:CITANCE {local_identifier: value.citation_id}]->(dst)
@@ -16,7 +36,9 @@ CALL apoc.periodic.iterate(
         r.polarity = value.polarity,
         r.semantics_scores = value.semantics_scores,
         r.intent_scores = value.intent_scores,
-        r.polarity_scores = value.polarity_scores
+        r.polarity_scores = value.polarity_scores,
+        // Set when the scores are packed (citances.py --score-encoding, decode with scores.py)
+        r.score_encoding = value.score_encoding
 
   RETURN r
   ',
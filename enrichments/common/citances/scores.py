@@ -0,0 +1,66 @@
+"""
+Compact encodings of the citance score vectors.
+
+With `citances.py --score-encoding`, semantics_scores, intent_scores and polarity_scores
+are written as base64 strings of fixed-width little-endian arrays instead of JSON lists,
+and the relation gets a `score_encoding` property naming the encoding:
+  - float16: IEEE half precision (about 3 significant digits, NaN kept)
+  - uint8: q = round(score * 254) for scores clipped to [0, 1], decoded as q / 254;
+    q = 255 marks a missing (NaN) score
+
+decode_scores() and decode_relation() turn them back into lists of floats.
+"""
+
+import base64
+import numpy as np
+
+ENCODINGS = ["json", "float16", "uint8"]
+UINT8_SCALE = 254
+UINT8_MISSING = 255
+
+def quantize(values, encoding):
+    """Encode a float64 array as the fixed-width array of an encoding."""
+    if encoding == "float16":
+        return values.astype("<f2")
+    missing = np.isnan(values)
+    quantized = np.rint(np.clip(np.where(missing, 0.0, values), 0.0, 1.0) * UINT8_SCALE).astype(np.uint8)
+    quantized[missing] = UINT8_MISSING
+    return quantized
+
+def encode_score_column(column, encoding):
+    """
+    Encode a column of score lists (one list per relation) at once.
+
+    Returns:
+        list: base64 string of every list ("" for empty lists)
+    """
+    lengths = np.fromiter((len(scores) for scores in column), dtype=np.int64, count=len(column))
+    flat = np.fromiter((score for scores in column for score in scores), dtype=np.float64, count=int(lengths.sum()))
+    quantized = quantize(flat, encoding)
+    data = quantized.tobytes()
+    ends = (np.cumsum(lengths) * quantized.itemsize).tolist()
+    starts = [0] + ends[:-1]
+    b64encode = base64.b64encode
+    return [b64encode(data[start:end]).decode("ascii") for start, end in zip(starts, ends)]
+
+def decode_scores(value, encoding):
+    """Decode one score property written with an encoding back to a list of floats."""
+    if encoding in (None, "json"):
+        return value
+    data = base64.b64decode(value)
+    if encoding == "float16":
+        return np.frombuffer(data, dtype="<f2").astype(np.float64).tolist()
+    if encoding == "uint8":
+        quantized = np.frombuffer(data, dtype=np.uint8)
+        scores = quantized / UINT8_SCALE
+        scores[quantized == UINT8_MISSING] = np.nan
+        return scores.tolist()
+    raise ValueError(f"Unknown score encoding: {encoding}")
+
+def decode_relation(relation):
+    """Decode the score properties of a relation (a parsed citances JSONL line) in place."""
+    encoding = relation.pop("score_encoding", None)
+    for name in ("semantics_scores", "intent_scores", "polarity_scores"):
+        if name in relation:
+            relation[name] = decode_scores(relation[name], encoding)
+    return relation
@@ -0,0 +1,345 @@
+"""
+Pilot-scoped filtering of enrichment inputs.
+
+The enrichment files cover far more products than any single pilot graph holds,
+and the loaders parse every row only to fail the `MATCH (p:Product ...)` of most
+of them. This script drops those rows offline.
+
+`build` reads the pilot's products output (<base_dir>/to_load/products) and writes
+<base_dir>/to_load/_index/pilot_filter.npz, the membership structure of the pilot:
+
+  - the hash64 of every Product local_identifier and of every product DOI
+    ("doi:<normalised DOI>", from the HAS_PID relationships), sorted: exact
+    membership by binary search (up to 64-bit hash collisions);
+  - a Bloom filter over the same hashes (BITS_PER_KEY bits per key, BLOOM_HASHES
+    probes), which rejects most foreign rows before the binary search.
+
+`filter` streams enrichment files in batches and writes, under the same file
+names, only the rows whose Products all belong to the pilot; which fields hold the
+Products depends on the input format (see FORMATS). Rows are copied unchanged; a
+techs.json holding one JSON array is streamed item by item (technologies.py) and
+written as a JSON array of the kept items. A file without any JSON object row is an
+error rather than a file whose rows are all dropped.
+
+Usage:
+  python3 pilot_filter.py build /data/skgif_dumps/cancer
+  python3 pilot_filter.py filter /data/skgif_dumps/cancer --format mentions \\
+      --input cancer.jsonl --output-dir filtered/
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Shared helpers of the SKG-IF parsers (index layout, DOI Pids, hash64)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "skgif", "parsers"))
+from index import PRODUCTS_DIR, RELATIONSHIP_FILE, doi_pid_value, index_dir, normalize_doi
+from utils import hash64
+
+# Streaming of techs.json arrays
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "technologies"))
+from technologies import encode_record, iter_json_values
+
+FILTER_FILENAME = "pilot_filter.npz"
+BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+BATCH_SIZE = 10000
+OPENAIRE_RESULT_URL = "https://explore.openaire.eu/search/result?id="
+
+# Input format -> (field, kind) pairs naming the Products of a row; a row is kept when
+# every field is present and its Product is in the pilot. Kinds:
+#   - openaire: "50|<id>" OpenAIRE id, turned into the Product local_identifier
+#   - product: Product local_identifier
+#   - doi: product DOI
+FORMATS = {
+    # graph-specific entity mentions (cancer, neuro, energy, maritime, ccam)
+    "mentions": [("remapped_id", "openaire")],
+    # geoareas.jsonl
+    "geo": [("oaireid", "openaire")],
+    # techs.json
+    "techs": [("id", "product")],
+    # artifacts.py input
+    "artifacts": [("doi", "doi")],
+    # artifacts.py output with --doi-index
+    "artifact-usages": [("product_id", "product")],
+    # citances.py output, with and without --doi-index
+    "citances": [("source_id", "product"), ("dest_id", "product")],
+    "citances-doi": [("source_doi", "doi"), ("dest_doi", "doi")],
+}
+# Formats whose files may hold one JSON array instead of JSON lines
+ARRAY_FORMATS = {"techs"}
+
+
+def filter_path(base_dir) -> str:
+    return str(index_dir(base_dir) / FILTER_FILENAME)
+
+
+def product_key(value, kind: str) -> Optional[str]:
+    """Membership key of a Product reference, or None when the value cannot name a Product."""
+    if not isinstance(value, str) or not value:
+        return None
+    if kind == "openaire":
+        parts = value.split("|")
+        return OPENAIRE_RESULT_URL + parts[1] if len(parts) >= 2 else None
+    if kind == "doi":
+        return "doi:" + normalize_doi(value)
+    return value
+
+
+def find_output(directory: str, stem: str) -> Optional[str]:
+    """Return <stem>.jsonl.gz or <stem>.jsonl in directory, whichever exists (compressed first)."""
+    for name in (f"{stem}.jsonl.gz", f"{stem}.jsonl"):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def iter_json_lines(path: str) -> Iterator[Tuple[bytes, Optional[dict]]]:
+    """Yield (raw line, decoded object or None) for every non-empty line of a (gzipped) JSONL file."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            yield line, record if isinstance(record, dict) else None
+
+
+def is_json_array(path: str) -> bool:
+    """Whether the first non-blank character of a (gzipped) file opens a JSON array."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(4096), ""):
+            chunk = chunk.lstrip()
+            if chunk:
+                return chunk[0] == "["
+    return False
+
+
+def iter_array_items(path: str) -> Iterator[Tuple[bytes, Optional[dict]]]:
+    """Yield (encoded item, item or None) for the items of a file holding one JSON array."""
+    for value in iter_json_values(path):
+        yield (encode_record(value) + "\n").encode("utf-8"), value if isinstance(value, dict) else None
+
+
+def iter_pilot_keys(base_dir) -> Iterator[str]:
+    """Product local_identifiers and "doi:" keys of the pilot's products output."""
+    products_dir = os.path.join(base_dir, "to_load", PRODUCTS_DIR)
+    products = find_output(products_dir, "products")
+    if products is None:
+        raise FileNotFoundError(f"No products.jsonl(.gz) in {products_dir}")
+    for _, record in iter_json_lines(products):
+        if record is not None and record.get("local_identifier") is not None:
+            yield str(record["local_identifier"])
+
+    relationships = find_output(products_dir, RELATIONSHIP_FILE)
+    if relationships is None:
+        print(f"Warning: no {RELATIONSHIP_FILE}.jsonl(.gz) in {products_dir}, DOIs are not indexed")
+        return
+    for _, record in iter_json_lines(relationships):
+        value = doi_pid_value(record) if record is not None else None
+        if value is not None:
+            yield "doi:" + normalize_doi(value)
+
+
+def bloom_positions(hashes: np.ndarray, mask: int) -> np.ndarray:
+    """Bit positions of the keys (one row of BLOOM_HASHES probes per key), by double hashing."""
+    h1 = hashes & np.uint64(0xFFFFFFFF)
+    h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+    probes = np.arange(BLOOM_HASHES, dtype=np.uint64)
+    return (h1[:, None] + probes[None, :] * h2[:, None]) & np.uint64(mask)
+
+
+class PilotFilter:
+    """Membership of Product keys in a pilot: Bloom filter in front of a sorted hash array."""
+
+    def __init__(self, hashes: np.ndarray, bloom: np.ndarray):
+        self.hashes = hashes
+        self.bloom = bloom
+        self.mask = len(bloom) * 8 - 1
+
+    @classmethod
+    def build(cls, keys) -> "PilotFilter":
+        hashes = np.unique(np.fromiter((hash64(key) for key in keys), dtype=np.uint64))
+        # Power-of-two size, so that probes are masked instead of reduced modulo
+        bits = 1 << max(6, int(max(len(hashes), 1) * BITS_PER_KEY - 1).bit_length())
+        bloom = np.zeros(bits // 8, dtype=np.uint8)
+        positions = bloom_positions(hashes, bits - 1).ravel()
+        np.bitwise_or.at(bloom, (positions >> np.uint64(3)).astype(np.int64),
+                         np.left_shift(1, (positions & np.uint64(7)).astype(np.uint8)).astype(np.uint8))
+        return cls(hashes, bloom)
+
+    @classmethod
+    def load(cls, path: str) -> "PilotFilter":
+        with np.load(path) as data:
+            return cls(data["hashes"], data["bloom"])
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, hashes=self.hashes, bloom=self.bloom)
+        os.replace(tmp_path, path)
+
+    def contains(self, keys: List[str]) -> Tuple[np.ndarray, int]:
+        """
+        Returns:
+            (members, bloom_rejected): a boolean array over the keys and the number
+            of keys rejected by the Bloom filter alone
+        """
+        hashes = np.fromiter((hash64(key) for key in keys), dtype=np.uint64, count=len(keys))
+        positions = bloom_positions(hashes, self.mask)
+        bits = self.bloom[(positions >> np.uint64(3)).astype(np.int64)] >> (positions & np.uint64(7)).astype(np.uint8)
+        maybe = (bits & 1).all(axis=1)
+
+        members = np.zeros(len(keys), dtype=bool)
+        candidates = hashes[maybe]
+        if len(candidates) and len(self.hashes):
+            found = np.searchsorted(self.hashes, candidates)
+            found[found == len(self.hashes)] = 0
+            members[maybe] = self.hashes[found] == candidates
+        return members, int(len(keys) - maybe.sum())
+
+
+def build_filter(base_dir) -> None:
+    out_dir = index_dir(base_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pilot = PilotFilter.build(iter_pilot_keys(base_dir))
+    path = filter_path(base_dir)
+    pilot.save(path)
+    print(f"Indexed {len(pilot.hashes)} Product ids and DOIs "
+          f"({pilot.hashes.nbytes + pilot.bloom.nbytes} bytes, Bloom filter of {len(pilot.bloom) * 8} bits)")
+    print("✅ Done. Filter saved in:", path)
+
+
+def filter_file(pilot: PilotFilter, fields: List[Tuple[str, str]], input_path: str, output_path: str,
+                array: bool = False) -> Dict[str, int]:
+    """
+    Copy the rows of input_path whose Products all belong to the pilot to output_path
+    (with `array`, the items of a JSON array file, written as a JSON array).
+
+    Returns:
+        dict: counts of kept rows, dropped rows (foreign Products, missing Product
+        fields or invalid JSON), invalid rows (not JSON objects) and Product keys
+        rejected by the Bloom filter
+    """
+    counts = {"kept": 0, "dropped": 0, "invalid": 0, "bloom_rejected": 0}
+    opener = gzip.open if output_path.endswith(".gz") else open
+
+    def write(line: bytes, out) -> None:
+        if array:
+            out.write((b",\n" if counts["kept"] else b"[\n") + line.rstrip(b"\n"))
+        else:
+            out.write(line if line.endswith(b"\n") else line + b"\n")
+
+    def flush(lines: List[bytes], keys: List[List[str]], out) -> None:
+        flat = [key for row_keys in keys for key in row_keys]
+        members, bloom_rejected = pilot.contains(flat)
+        counts["bloom_rejected"] += bloom_rejected
+        start = 0
+        for line, row_keys in zip(lines, keys):
+            end = start + len(row_keys)
+            if members[start:end].all():
+                write(line, out)
+                counts["kept"] += 1
+            else:
+                counts["dropped"] += 1
+            start = end
+
+    with opener(output_path, "wb") as out:
+        lines: List[bytes] = []
+        keys: List[List[str]] = []
+        for line, record in (iter_array_items if array else iter_json_lines)(input_path):
+            row_keys = []
+            if record is None:
+                counts["invalid"] += 1
+            else:
+                for field, kind in fields:
+                    key = product_key(record.get(field), kind)
+                    if key is None:
+                        break
+                    row_keys.append(key)
+            if len(row_keys) != len(fields):
+                counts["dropped"] += 1
+                continue
+            lines.append(line)
+            keys.append(row_keys)
+            if len(lines) >= BATCH_SIZE:
+                flush(lines, keys, out)
+                lines, keys = [], []
+        if lines:
+            flush(lines, keys, out)
+        if array:
+            out.write(b"\n]\n" if counts["kept"] else b"[]\n")
+    return counts
+
+
+def filter_files(base_dir, input_format: str, input_paths: List[str], output_dir: str) -> Dict[str, Dict[str, int]]:
+    """
+    Filter each input file into output_dir (same file name) and print the kept/dropped
+    ratio per file.
+
+    Returns:
+        dict: mapping input path -> counts (see filter_file)
+    """
+    pilot = PilotFilter.load(filter_path(base_dir))
+    fields = FORMATS[input_format]
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    for input_path in input_paths:
+        output_path = os.path.join(output_dir, os.path.basename(input_path))
+        if os.path.abspath(output_path) == os.path.abspath(input_path):
+            raise ValueError(f"Output would overwrite the input: {input_path}")
+        array = input_format in ARRAY_FORMATS and is_json_array(input_path)
+        counts = filter_file(pilot, fields, input_path, output_path, array)
+        total = counts["kept"] + counts["dropped"]
+        if counts["invalid"] and counts["invalid"] == total:
+            os.remove(output_path)
+            raise ValueError(
+                f"{input_path}: none of the {total} rows is a JSON object "
+                f"(expected JSON lines{' or one JSON array' if input_format in ARRAY_FORMATS else ''})"
+            )
+        kept_pct = 100.0 * counts["kept"] / total if total else 0.0
+        print(f"{input_path}: kept {counts['kept']} of {total} rows ({kept_pct:.1f}%), "
+              f"dropped {counts['dropped']} ({counts['invalid']} not JSON objects, "
+              f"{counts['bloom_rejected']} keys rejected by the Bloom filter) "
+              f"-> {output_path}")
+        results[input_path] = counts
+    return results
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Filter enrichment inputs down to the Products of a pilot graph.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the pilot filter from <base_dir>/to_load/products")
+    build.add_argument("base_dir")
+
+    filter_cmd = subparsers.add_parser("filter", help="Keep the rows of enrichment files whose Products are in the pilot")
+    filter_cmd.add_argument("base_dir", help="Pilot graph base_dir, with a filter built by `build`")
+    filter_cmd.add_argument("--format", "-f", dest="input_format", required=True, choices=sorted(FORMATS),
+                            help="Input format, naming the Product fields of the rows")
+    filter_cmd.add_argument("--input", "-i", dest="input_paths", required=True, nargs="+",
+                            help="Enrichment JSONL (or JSONL.GZ) file(s); techs.json may also hold one JSON array")
+    filter_cmd.add_argument("--output-dir", "-o", required=True, help="Directory of the filtered files")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    if args.command == "build":
+        build_filter(args.base_dir)
+    elif args.command == "filter":
+        filter_files(args.base_dir, args.input_format, args.input_paths, args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Projection of enrichment JSONL files to a field whitelist.
+
+Some inputs carry very large fields that their loaders never store (e.g. the
+{lang}_lawHtml and {lang}_lawText fields of the Fedlex dataset read by
+load_legal_documents.cypher), yet apoc.load.json parses them for every row. This
+script rewrites a file to the top-level fields a loader uses, so the database only
+parses light rows.
+
+Rows are not decoded: a byte-level scanner walks the top-level object, copies the
+raw bytes of whitelisted fields and skips the other values. Escaped backslashes and
+quotes are first masked (same offsets), so a string, where the bulk of the bytes
+is, is skipped with one find of its closing quote, and objects and arrays by
+counting the brackets outside strings. Only the
+small projected row is parsed, to check that it is valid JSON; rows the scanner
+cannot handle are decoded and re-encoded instead.
+
+Usage:
+  python3 project_jsonl.py --projection legal --input fedlex-dataset-090425.jsonl --output-dir projected/
+  python3 project_jsonl.py --fields id name --input input.jsonl.gz --output-dir projected/
+"""
+
+import argparse
+import fnmatch
+import gzip
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, List
+
+# Projection name -> whitelisted top-level fields (fnmatch patterns), per loader
+PROJECTIONS = {
+    # graph-specific/energy/load_legal_documents.cypher (fields per language: de, en, fr, it, rm)
+    "legal": ["rsNr", "*_abbreviation", "*_lawTitle", "*_url", "*_dateApplicability"],
+    # graph-specific/energy/load_irena_entities.cypher
+    "irena": ["id", "parent-id", "concept", "type", "description", "wikidata_id", "wikidata_aliases"],
+    # graph-specific/energy/load_geo_entities.cypher and mentions.py --domain geo
+    "geo": ["oaireid", "section_title", "section_label", "entities"],
+}
+
+WHITESPACE = re.compile(rb"[ \t\r\n]*")
+SCALAR = re.compile(rb"[^,}\]\s]+")
+# Strings and brackets of a nested value in a masked row; brackets inside strings go with the string
+TOKEN = re.compile(rb'"[^"]*"|[\[\]{}]')
+OPEN_BRACKETS = (ord("{"), ord("["))
+QUOTE = ord('"')
+
+
+def mask_escapes(line: bytes) -> bytes:
+    """
+    Blank out the escaped backslashes and quotes of a row, keeping the offsets: every
+    quote left is a string delimiter, so strings are skipped with one find.
+    """
+    if b"\\" not in line:
+        return line
+    return line.replace(b"\\\\", b"  ").replace(b'\\"', b"  ")
+
+
+def skip_string(masked: bytes, pos: int) -> int:
+    """Return the offset just past the JSON string whose opening quote is at pos."""
+    quote = masked.find(b'"', pos + 1)
+    if quote < 0:
+        raise ValueError(f"unterminated string at byte {pos}")
+    return quote + 1
+
+
+def skip_value(masked: bytes, pos: int) -> int:
+    """Return the offset just past the JSON value starting at pos, without decoding it."""
+    first = masked[pos:pos + 1]
+    if first == b'"':
+        return skip_string(masked, pos)
+    if first in (b"{", b"["):
+        depth = 0
+        for match in TOKEN.finditer(masked, pos):
+            char = masked[match.start()]
+            if char == QUOTE:
+                continue
+            depth += 1 if char in OPEN_BRACKETS else -1
+            if depth == 0:
+                return match.end()
+        raise ValueError(f"unterminated value at byte {pos}")
+    match = SCALAR.match(masked, pos)
+    if match is None:
+        raise ValueError(f"missing value at byte {pos}")
+    return match.end()
+
+
+def project_line(line: bytes, keep: Callable[[str], bool]) -> bytes:
+    """Return the top-level object of a JSONL row reduced to the fields accepted by `keep`."""
+    masked = mask_escapes(line)
+    pos = WHITESPACE.match(masked, 0).end()
+    if masked[pos:pos + 1] != b"{":
+        raise ValueError("row is not a JSON object")
+    pos = WHITESPACE.match(masked, pos + 1).end()
+    parts = []
+    if masked[pos:pos + 1] == b"}":
+        return b"{}"
+    while True:
+        if masked[pos:pos + 1] != b'"':
+            raise ValueError(f"expected a key at byte {pos}")
+        key_end = skip_string(masked, pos)
+        raw_key = line[pos:key_end]
+        name = json.loads(raw_key) if b"\\" in raw_key else raw_key[1:-1].decode("utf-8")
+        pos = WHITESPACE.match(masked, key_end).end()
+        if masked[pos:pos + 1] != b":":
+            raise ValueError(f"expected ':' at byte {pos}")
+        pos = WHITESPACE.match(masked, pos + 1).end()
+        end = skip_value(masked, pos)
+        if keep(name):
+            parts.append(raw_key + b":" + line[pos:end])
+        pos = WHITESPACE.match(masked, end).end()
+        separator = masked[pos:pos + 1]
+        if separator == b"}":
+            return b"{" + b",".join(parts) + b"}"
+        if separator != b",":
+            raise ValueError(f"expected ',' or '}}' at byte {pos}")
+        pos = WHITESPACE.match(masked, pos + 1).end()
+
+
+def field_matcher(patterns: List[str]) -> Callable[[str], bool]:
+    """Whitelist test for field names (fnmatch patterns), cached per name."""
+    regex = re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+    cache: Dict[str, bool] = {}
+
+    def keep(name: str) -> bool:
+        kept = cache.get(name)
+        if kept is None:
+            kept = cache[name] = regex.match(name) is not None
+        return kept
+
+    return keep
+
+
+def project_file(input_path: str, output_path: str, keep: Callable[[str], bool]) -> Dict[str, float]:
+    """
+    Write the projected rows of input_path to output_path (gzipped when it ends in .gz).
+
+    Returns:
+        dict: rows, fallback rows (decoded and re-encoded), skipped rows (invalid JSON),
+        uncompressed input/output bytes and elapsed seconds
+    """
+    stats = {"rows": 0, "fallback": 0, "skipped": 0, "bytes_in": 0, "bytes_out": 0}
+    in_opener = gzip.open if input_path.endswith(".gz") else open
+    out_opener = gzip.open if output_path.endswith(".gz") else open
+    started = time.perf_counter()
+    with in_opener(input_path, "rb") as src, out_opener(output_path, "wb") as out:
+        for line_no, line in enumerate(src, start=1):
+            stats["bytes_in"] += len(line)
+            if not line.strip():
+                continue
+            try:
+                projected = project_line(line, keep)
+                json.loads(projected)
+            except ValueError:
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    print(f"Warning: failed to parse JSON on line {line_no} of {input_path}: {e}")
+                    stats["skipped"] += 1
+                    continue
+                if not isinstance(record, dict):
+                    print(f"Warning: line {line_no} of {input_path} is not a JSON object")
+                    stats["skipped"] += 1
+                    continue
+                projected = json.dumps(
+                    {name: value for name, value in record.items() if keep(name)}, ensure_ascii=False
+                ).encode("utf-8")
+                stats["fallback"] += 1
+            out.write(projected + b"\n")
+            stats["rows"] += 1
+            stats["bytes_out"] += len(projected) + 1
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def project_files(input_paths: List[str], output_dir: str, patterns: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Project each input file into output_dir (same file name) and print its sizes and throughput.
+
+    Returns:
+        dict: mapping input path -> stats (see project_file)
+    """
+    keep = field_matcher(patterns)
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    for input_path in input_paths:
+        output_path = os.path.join(output_dir, os.path.basename(input_path))
+        if os.path.abspath(output_path) == os.path.abspath(input_path):
+            raise ValueError(f"Output would overwrite the input: {input_path}")
+        stats = project_file(input_path, output_path, keep)
+        mb_in = stats["bytes_in"] / 1e6
+        ratio = 100.0 * stats["bytes_out"] / stats["bytes_in"] if stats["bytes_in"] else 0.0
+        throughput = mb_in / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"{input_path}: {stats['rows']} rows, {mb_in:.1f} MB -> {stats['bytes_out'] / 1e6:.1f} MB "
+              f"({ratio:.1f}%) in {stats['seconds']:.1f}s ({throughput:.1f} MB/s) -> {output_path}")
+        if stats["fallback"] or stats["skipped"]:
+            print(f"  {stats['fallback']} rows re-encoded after a full parse, {stats['skipped']} invalid rows skipped")
+        results[input_path] = stats
+    return results
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Project enrichment JSONL files to a whitelist of top-level fields.")
+    fields = parser.add_mutually_exclusive_group(required=True)
+    fields.add_argument("--projection", "-p", choices=sorted(PROJECTIONS), help="Field whitelist of a loader")
+    fields.add_argument("--fields", nargs="+", help="Field names to keep (fnmatch patterns, e.g. '*_url')")
+    parser.add_argument("--input", "-i", dest="input_paths", required=True, nargs="+",
+                        help="JSONL (or JSONL.GZ) file(s) to project")
+    parser.add_argument("--output-dir", "-o", required=True, help="Directory of the projected files")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    patterns = PROJECTIONS[args.projection] if args.projection else args.fields
+    project_files(args.input_paths, args.output_dir, patterns)
+
+
+if __name__ == "__main__":
+    main()
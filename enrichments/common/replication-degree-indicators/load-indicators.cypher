@@ -0,0 +1,19 @@
+// Load the replication-degree indicators computed offline by citances.py
+// (<space>_indicators.jsonl.gz), instead of the three CITANCE scans of compute-indicators.cypher.
+// Files are only written for the spaces that citances.py resolved with --doi-index, and
+// lines carry the Product local_identifier; for the other spaces run compute-indicators.cypher.
+// repro_focused_rci is only present for products cited with 'Comparison' intent,
+// so existing values are kept for the others, as with the Cypher computation.
+CALL apoc.periodic.iterate(
+  '
+  CALL apoc.load.json("file:///import/indicators.jsonl") YIELD value
+  RETURN value
+  ',
+  '
+  MATCH (p:Product {local_identifier: value.local_identifier})
+  SET p.repro_positive_mentions_count = value.repro_positive_mentions_count,
+      p.repro_rci = value.repro_rci,
+      p.repro_focused_rci = coalesce(value.repro_focused_rci, p.repro_focused_rci)
+  ',
+  {batchSize: 10000}
+);
@@ -0,0 +1,25 @@
+// Loads the output of technologies.py: has_technology.jsonl.gz holds every distinct
+// (Product, Technology) pair and technology_nodes.jsonl.gz every Technology node once
+// (slug and canonical name). Like load-technologies.cypher, a Technology is only
+// created for a matched Product (a pilot graph gets no orphan Technology nodes), and
+// each pair is created without a MERGE; the names are then set on the created nodes.
+// Intended for a first load; use load-technologies.cypher to add to existing technologies.
+
+CREATE INDEX technology_local_identifier_index IF NOT EXISTS
+FOR (t:Technology)
+ON (t.local_identifier);
+
+CALL apoc.periodic.iterate(
+  "CALL apoc.load.json('file:///import/has_technology.jsonl.gz') YIELD value RETURN value",
+  "MATCH (p:Product {local_identifier: value.product_id})
+   MERGE (t:Technology {local_identifier: value.technology_id})
+   CREATE (p)-[:HAS_TECHNOLOGY]->(t)",
+  {batchSize: 10000, parallel: false}
+);
+
+CALL apoc.periodic.iterate(
+  "CALL apoc.load.json('file:///import/technology_nodes.jsonl.gz') YIELD value RETURN value",
+  "MATCH (t:Technology {local_identifier: value.local_identifier})
+   SET t.name = value.name",
+  {batchSize: 10000, parallel: true}
+);
@@ -0,0 +1,168 @@
+"""
+Offline generation of the Technology nodes and HAS_TECHNOLOGY edges of techs.json.
+
+load-technologies.cypher computes the slug of every (product, technology) pair and
+runs two MERGEs per pair. This script streams techs.json instead ({"id": <Product
+local_identifier>, "techs": [<technology name>, ...]} objects, as JSON lines or one
+JSON array), computes each slug once and writes, for load-technologies-bulk.cypher:
+
+  - technology_nodes.jsonl.gz: one {local_identifier: <slug>, name} line per slug;
+    when several spellings map to one slug, the name is the most frequent spelling
+    (ties broken by the smallest string), so it does not depend on the input order;
+  - has_technology.jsonl.gz: one {product_id, technology_id} line per distinct pair.
+
+Usage:
+  python3 technologies.py --input techs.json --output-dir technologies/
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, Iterator
+
+# Shared helpers of the SKG-IF parsers (Sink, hash64)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "skgif", "parsers"))
+from engine import Sink
+from utils import hash64
+
+NODES_FILENAME = "technology_nodes.jsonl.gz"
+EDGES_FILENAME = "has_technology.jsonl.gz"
+READ_SIZE = 1 << 20
+# Whitespace and commas between the items of a JSON array
+SEPARATORS = re.compile(r"[\s,]*")
+# Same output as json.dumps(..., ensure_ascii=False), without rebuilding the encoder per record
+encode_record = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def technology_slug(name: str) -> str:
+    """Technology local_identifier, as computed by load-technologies.cypher."""
+    return name.replace(" ", "_").replace("/", "_").lower()
+
+
+def iter_json_values(path: str) -> Iterator[Any]:
+    """
+    Stream the values of a JSON lines file, or the items of a file holding one JSON
+    array, without loading the whole file.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    decoder = json.JSONDecoder()
+    with opener(path, "rt", encoding="utf-8") as f:
+        buffer = f.read(READ_SIZE)
+        pos = SEPARATORS.match(buffer).end()
+        if buffer[pos:pos + 1] != "[":
+            # JSON lines: finish the line cut by the first read, then stream the rest
+            lines = itertools.chain((buffer + f.readline()).splitlines(), f)
+            for line_no, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Warning: failed to parse JSON on line {line_no} of {path}: {e}")
+            return
+
+        # JSON array: decode one item at a time, refilling the buffer as needed
+        pos += 1
+        while True:
+            pos = SEPARATORS.match(buffer, pos).end()
+            if pos == len(buffer):
+                buffer, pos = f.read(READ_SIZE), 0
+                if not buffer:
+                    raise ValueError(f"Unterminated JSON array in {path}")
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                cut = end == len(buffer)
+            except json.JSONDecodeError:
+                value, cut = None, True
+            if cut:
+                # The item may be cut by the end of the buffer
+                more = f.read(READ_SIZE)
+                if more:
+                    buffer, pos = buffer[pos:] + more, 0
+                    continue
+                if value is None:
+                    raise ValueError(f"Invalid JSON array item at offset {pos} of the buffer in {path}")
+            yield value
+            pos = end
+
+
+def process_technologies(input_path: str, output_dir: str) -> Dict[str, int]:
+    """
+    Write the deduplicated Technology nodes and HAS_TECHNOLOGY edges of techs.json.
+
+    Returns:
+        dict: counts of rows, (product, technology) pairs, distinct edges, nodes and
+        slugs with several spellings
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # slug -> spelling -> number of pairs using it
+    spellings: Dict[str, Dict[str, int]] = {}
+    seen_edges = set()
+    counts = {"rows": 0, "pairs": 0, "edges": 0}
+
+    edges = Sink(os.path.join(output_dir, EDGES_FILENAME), compress=True, dumps=encode_record)
+    try:
+        for row in iter_json_values(input_path):
+            if not isinstance(row, dict) or row.get("id") is None:
+                continue
+            counts["rows"] += 1
+            product_id = row["id"]
+            techs = row.get("techs")
+            if techs is None:
+                continue
+            for tech in techs if isinstance(techs, list) else [techs]:
+                if not isinstance(tech, str):
+                    continue
+                counts["pairs"] += 1
+                slug = technology_slug(tech)
+                names = spellings.setdefault(slug, {})
+                names[tech] = names.get(tech, 0) + 1
+
+                edge_key = hash64(f"{product_id}\t{slug}")
+                if edge_key in seen_edges:
+                    continue
+                seen_edges.add(edge_key)
+                edges.write({"product_id": product_id, "technology_id": slug})
+                counts["edges"] += 1
+    finally:
+        edges.close()
+
+    nodes = Sink(os.path.join(output_dir, NODES_FILENAME), compress=True, dumps=encode_record)
+    try:
+        for slug in sorted(spellings):
+            names = spellings[slug]
+            name = min(names, key=lambda spelling: (-names[spelling], spelling))
+            nodes.write({"local_identifier": slug, "name": name})
+    finally:
+        nodes.close()
+    counts["nodes"] = len(spellings)
+    counts["multi_spelling"] = sum(1 for names in spellings.values() if len(names) > 1)
+
+    print(f"Read {counts['rows']} rows with {counts['pairs']} (product, technology) pairs")
+    print(f"Wrote {counts['nodes']} Technology nodes ({counts['multi_spelling']} with several spellings) "
+          f"and {counts['edges']} HAS_TECHNOLOGY edges ({counts['pairs'] - counts['edges']} duplicates removed) "
+          f"to {output_dir}")
+    return counts
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate deduplicated Technology nodes and edges from techs.json.")
+    parser.add_argument("--input", "-i", required=True, help="techs.json (JSON lines or a JSON array, optionally .gz)")
+    parser.add_argument("--output-dir", "-o", required=True, help="Directory of the node and edge files")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    process_technologies(args.input, args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
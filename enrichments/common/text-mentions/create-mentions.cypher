@@ -1,3 +1,9 @@
+// Counts the HAS_IN_TEXT_MENTION relationships per (a, b) pair in the database.
+// graph-specific/mentions.py aggregate computes the same weights offline from the
+// mention inputs and generates a loader for the weighted MENTIONS edges instead,
+// except for cancer, whose loader matches existing nodes (several linked ids can
+// match one Gene): run this script for the cancer graph. The LegalDocument mentions
+// of energy (energyType_fedlex.jsonl) are aggregated with mentions.py --domain fedlex.
 CALL apoc.periodic.iterate(
   "
   MATCH (a)-[r:HAS_IN_TEXT_MENTION]->(b)
@@ -1,85 +1,155 @@
-from neo4j import GraphDatabase
-import pandas as pd
-import sys
-import os
-from dotenv import load_dotenv
-from pathlib import Path
+"""
+Load the BCMO gene relationships (RELATED_TO edges between Gene nodes) from CSV.
 
-# Load environment variables from .env file in the same directory as this script
-env_path = Path(__file__).parent / ".env"
-load_dotenv(env_path)
+The ids of the existing Gene nodes are fetched once, the rows whose source or target
+gene is missing are found client-side with pandas and reported, and the remaining
+rows are created in UNWIND batches of --batch-size rows, one write transaction each.
 
-# Neo4j connection details
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+All loading functions take the driver as argument, so they can be run against any
+object with the session()/run()/execute_write() interface of the neo4j driver.
 
-if not all([NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD]):
-    raise ValueError("Missing required environment variables: NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD")
-
-# CSV file path
-CSV_FILE = "data/bcmo_edited.csv"
+Usage:
+  python3 load-bcmo-data.py [--csv data/bcmo_edited.csv] [--batch-size 5000]
+"""
 
-# Load CSV data
-df = pd.read_csv(CSV_FILE, index_col=0)
-
-# replace . with _ in column/property names
-df.columns = [col.replace(".", "_") for col in df.columns]
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
-# Initialize Neo4j driver
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+import pandas as pd
 
-def create_gene_relationship(tx, source, target, properties):
-    """
-    Creates Gene nodes and a RELATED_TO relationship with properties.
+CSV_FILE = "data/bcmo_edited.csv"
+BATCH_SIZE = 5000
+# Columns that are not stored as relationship properties
+EXCLUDED_COLUMNS = ["source_symbol", "target_symbol", "interaction", "name", "shared_interaction", "shared_name", "selected"]
+
+GENE_INDEX_QUERY = "CREATE INDEX gene_id_idx IF NOT EXISTS FOR (n:Gene) ON (n.id)"
+GENE_IDS_QUERY = """
+UNWIND $ids AS id
+MATCH (g:Gene {id: id})
+RETURN DISTINCT g.id AS id
+"""
+RELATIONSHIPS_QUERY = """
+UNWIND $rows AS row
+MATCH (src:Gene {id: row.source})
+MATCH (tgt:Gene {id: row.target})
+CREATE (src)-[r:RELATED_TO]->(tgt)
+SET r += row.properties
+"""
+
+
+def read_relationships(csv_path: str) -> pd.DataFrame:
+    """Read the BCMO CSV, with "." replaced by "_" in column names and gene symbols uppercased."""
+    df = pd.read_csv(csv_path, index_col=0)
+    df.columns = [col.replace(".", "_") for col in df.columns]
+    df["source_symbol"] = df["source_symbol"].astype(str).str.upper()
+    df["target_symbol"] = df["target_symbol"].astype(str).str.upper()
+    return df
+
+
+def fetch_gene_ids(session, symbols: List[str]) -> set:
+    """Return the subset of symbols that are ids of existing Gene nodes, in one query."""
+    return {record["id"] for record in session.run(GENE_IDS_QUERY, ids=symbols)}
+
+
+def split_missing(df: pd.DataFrame, gene_ids: set) -> Tuple[pd.DataFrame, pd.Series]:
     """
-    query = """
-    MATCH (src:Gene {id: $source})
-    MATCH (tgt:Gene {id: $target})
-    WHERE src IS NOT NULL AND tgt IS NOT NULL
-    CREATE (src)-[r:RELATED_TO]->(tgt)
-    SET r += $properties
+    Split the rows on the existence of their genes.
+
+    Returns:
+        tuple: (rows whose source and target genes exist, number of rows referencing
+        each missing gene symbol)
     """
-    
-    # First, try to create the relationship
-    result = tx.run(query, source=source, target=target, properties=properties)
-    
-    # If no rows are returned from the relationship creation, log the missing genes
-    if not result.peek():
-
-        # Log the query if either gene doesn't exist
-        log_query = """
-        MATCH (src:Gene {id: $source})
-        MATCH (tgt:Gene {id: $target})
-        WHERE src IS NULL OR tgt IS NULL
-        RETURN 'Gene(s) not found: ' + COALESCE(src.id, 'None') + ' and ' + COALESCE(tgt.id, 'None') AS missing_genes
-        """
-
-        missing_result = tx.run(log_query, source=source, target=target)
-        for record in missing_result:
-            print(record['missing_genes'])
-
-def import_data():
-    with driver.session() as session:
-        for _, row in df.iterrows():
+    source_found = df["source_symbol"].isin(gene_ids)
+    target_found = df["target_symbol"].isin(gene_ids)
+    missing = pd.concat([
+        df.loc[~source_found, "source_symbol"],
+        df.loc[~target_found, "target_symbol"],
+    ]).value_counts()
+    return df[source_found & target_found], missing
 
-            # Extract source and target symbols
-            source = row["source_symbol"].upper()
-            target = row["target_symbol"].upper()
 
-            # Extract properties (all other statistical measures + provenance)
-            properties = {col: row[col] for col in df.columns if col not in ["source_symbol", "target_symbol", "interaction", "name", "shared_interaction", "shared_name", "selected"]}
-            
-            # Convert properties to correct types (handle NaN)
-            properties = {k: (v if pd.notna(v) else None) for k, v in properties.items()}
+def relationship_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Query parameters of the rows: source, target and properties (NaN as None)."""
+    properties = df.drop(columns=EXCLUDED_COLUMNS, errors="ignore")
+    # object dtype turns numpy scalars into Python values the driver can send
+    properties = properties.astype(object).where(properties.notna(), None)
+    return [
+        {"source": source, "target": target, "properties": props}
+        for source, target, props in zip(df["source_symbol"], df["target_symbol"], properties.to_dict("records"))
+    ]
 
-            # Create relationship in Neo4j
-            session.write_transaction(create_gene_relationship, source, target, properties)
 
-# Run the import process
-import_data()
+def create_relationships(tx, rows: List[Dict[str, Any]]) -> None:
+    tx.run(RELATIONSHIPS_QUERY, rows=rows)
 
-# Close driver connection
-driver.close()
 
-print("Data successfully imported into Neo4j.")
+def load_relationships(driver, df: pd.DataFrame, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """
+    Create the RELATED_TO relationships of df whose genes exist, in batches.
+
+    Returns:
+        dict: counts of CSV rows, created relationships, skipped rows and missing genes
+    """
+    symbols = pd.unique(pd.concat([df["source_symbol"], df["target_symbol"]])).tolist()
+    with driver.session() as session:
+        session.run(GENE_INDEX_QUERY).consume()
+        gene_ids = fetch_gene_ids(session, symbols)
+        found, missing = split_missing(df, gene_ids)
+        for symbol, rows in missing.items():
+            print(f"Gene not found: {symbol} ({rows} rows)")
+        print(f"{len(gene_ids)} of {len(symbols)} genes found, "
+              f"skipping {len(df) - len(found)} rows referencing {len(missing)} missing genes")
+
+        rows = relationship_rows(found)
+        start = time.perf_counter()
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            session.execute_write(create_relationships, batch)
+            done = offset + len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"Created {done}/{len(rows)} relationships ({done / elapsed if elapsed else 0:.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Created {len(rows)} RELATED_TO relationships in {elapsed:.1f}s "
+          f"({len(rows) / elapsed if elapsed else 0:.0f} rows/s)")
+    return {"rows": len(df), "created": len(rows), "skipped": len(df) - len(found), "missing_genes": len(missing)}
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load the BCMO gene relationships into Neo4j.")
+    parser.add_argument("--csv", default=CSV_FILE, help="BCMO relationships CSV (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Relationships created per transaction (default: %(default)s)")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    if args.batch_size < 1:
+        raise ValueError("--batch-size must be positive")
+    # Imported here so the loading functions can be used without the driver installed
+    from dotenv import load_dotenv
+    from neo4j import GraphDatabase
+
+    # Load environment variables from .env file in the same directory as this script
+    load_dotenv(Path(__file__).parent / ".env")
+    uri = os.getenv("NEO4J_URI")
+    user = os.getenv("NEO4J_USER")
+    password = os.getenv("NEO4J_PASSWORD")
+    if not all([uri, user, password]):
+        raise ValueError("Missing required environment variables: NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD")
+
+    df = read_relationships(args.csv)
+    driver = GraphDatabase.driver(uri, auth=(user, password))
+    try:
+        load_relationships(driver, df, args.batch_size)
+    finally:
+        driver.close()
+    print("Data successfully imported into Neo4j.")
+
+
+if __name__ == "__main__":
+    main()
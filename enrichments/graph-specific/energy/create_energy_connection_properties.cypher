@@ -1,3 +1,8 @@
+// Sets has_energy_type / has_energy_storage on every Product from its MENTIONS edges.
+// The flags can instead be computed offline from the energy mention files, and set on
+// the flagged Products only (incrementally as new files are added):
+//   python3 mentions.py flags --domain energy --input energy.jsonl --output-dir flags/ --store-dir flag-store/
+// then run the generated flags/load-flags.cypher.
 
 CALL apoc.periodic.iterate(
   "
@@ -9,6 +9,9 @@
 // - Product (already exists, matched by local_identifier)
 // - GeographicEntity (new nodes created from entities array)
 //
+// Fields other than oaireid, section_title, section_label and entities can be stripped before loading:
+//   python3 common/projection/project_jsonl.py --projection geo --input geoareas.jsonl --output-dir projected/
+//
 // RELATIONSHIPS:
 // - Product -[HAS_GEO_ENTITY]-> GeographicEntity
 //   Properties: role, section_title, section_label, start, end, text
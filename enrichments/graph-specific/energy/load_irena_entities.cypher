@@ -1,3 +1,6 @@
+// Input irena.jsonl; keep only the loaded fields with
+//   python3 common/projection/project_jsonl.py --projection irena --input irena.jsonl --output-dir projected/
+
 CREATE INDEX irena_type_local_id FOR (t:IrenaType) ON (t.local_identifier);
 
 // Step 1: Create IrenaType nodes
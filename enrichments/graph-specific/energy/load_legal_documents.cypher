@@ -12,6 +12,8 @@
 //   {lang}_lawHtml, {lang}_lawText - not loaded (very large).
 //
 // Only lightweight fields are stored. Properties are set only when not null.
+// Strip the large fields before loading, so that apoc.load.json does not parse them:
+//   python3 common/projection/project_jsonl.py --projection legal --input fedlex-dataset-090425.jsonl --output-dir projected/
 // LegalDocument is not linked to Product.
 
 CREATE INDEX legaldocument_local_identifier_idx
@@ -0,0 +1,790 @@
+"""
+Offline processing of the graph-specific entity-mention inputs.
+
+The domain loaders (load_cancer_entities.cypher, load_neuro_entities.cypher, ...) link
+Products to entity nodes with HAS_IN_TEXT_MENTION relationships, transforming every
+row in Cypher and merging nodes with dynamic labels. The `preprocess` command does
+the same transforms offline and writes the distinct entity nodes and relationships
+to per-label files, loaded by a generated load-entities.cypher with static labels.
+
+common/text-mentions/create-mentions.cypher then counts the relationships per
+(Product, entity) pair in the database to create weighted MENTIONS edges. The `aggregate` command
+computes the same weights from the JSONL inputs of the domains whose loader creates
+the entity nodes (the matched nodes of cancer are only known in the database, where
+several linked ids can match one Gene, so cancer is left to create-mentions.cypher):
+
+  - the rows are transformed as in the loaders (Product id rebuilt from
+    remapped_id/oaireid, or the LegalDocument rsNr of the fedlex inputs, entities
+    and linking unwound, label picked per entity type);
+  - a mention counts once per distinct (text, model, section_label, section_title),
+    the MERGE key of the HAS_IN_TEXT_MENTION relationships; geographic mentions
+    are CREATEd by their loader, so every occurrence counts;
+  - mentions are hash-partitioned on (label, product, entity) to spill files and
+    each partition is aggregated on its own, so memory is bounded by the largest
+    partition rather than by the input;
+  - the weighted edges are written to one mentions_<Label>.jsonl.gz file per label
+    together with a generated load-mentions.cypher using static labels.
+
+The `flags` command computes Product flags such as has_energy_type from the same
+inputs, instead of checking every Product in the database.
+
+Usage:
+  python3 mentions.py flags --domain energy --input energy.jsonl --output-dir out/ --store-dir flags/
+  python3 mentions.py preprocess --domain neuro --input neuro.jsonl --output-dir out/
+  python3 mentions.py aggregate --domain neuro --input neuro.jsonl --output-dir out/
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Shared helpers of the SKG-IF parsers (hash64, Sink)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "skgif", "parsers"))
+from engine import Sink
+from utils import hash64
+
+OPENAIRE_RESULT_URL = "https://explore.openaire.eu/search/result?id="
+DEFAULT_SECTION = "title_or_abstract"
+DEFAULT_PARTITIONS = 64
+
+
+class Domain:
+    """Mention input of one pilot, as read by its Cypher loader.
+    - product_field: row field holding the OpenAIRE id ("50|<id>") of the Product,
+      or the local_identifier of the source node for other source labels
+    - source_label: label of the mentioning node (the "product_id" of the outputs)
+    - labels: entity type -> node label; types without a label are skipped unless
+      default_label is set
+    - match: label -> MATCH clause binding `n` from value.entity_id, for labels whose
+      nodes are not matched by local_identifier
+    - geo: entities are geographic areas (wikidata/osm ids, no linking)
+    - count_every_mention: every mention adds to the weight (relationships CREATEd
+      rather than MERGEd by the loader)
+    - creates_nodes: the loader creates the entity nodes (rather than matching
+      existing ones)
+    - flags: Product flag property -> entity label; the flag is true on the Products
+      mentioning an entity of that label
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: str,
+        product_field: str = "remapped_id",
+        source_label: str = "Product",
+        labels: Optional[Dict[str, str]] = None,
+        default_label: Optional[str] = None,
+        match: Optional[Dict[str, str]] = None,
+        geo: bool = False,
+        count_every_mention: bool = False,
+        creates_nodes: bool = True,
+        flags: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.loader = loader
+        self.product_field = product_field
+        self.source_label = source_label
+        self.labels = labels or {}
+        self.default_label = default_label
+        self.match = match or {}
+        self.geo = geo
+        self.count_every_mention = count_every_mention
+        self.creates_nodes = creates_nodes
+        self.flags = flags or {}
+
+    def source_id(self, value: Any) -> Any:
+        """Id of the mentioning node from the row's product_field value."""
+        if self.source_label == "Product":
+            return product_local_id(value)
+        return value
+
+    def label(self, entity_type: Any) -> Optional[str]:
+        return self.labels.get(entity_type, self.default_label)
+
+    def match_clause(self, label: str) -> str:
+        return self.match.get(label, f"MATCH (n:{label} {{local_identifier: value.entity_id}})")
+
+
+DOMAINS = {
+    "cancer": Domain(
+        "cancer",
+        loader="cancer/load_cancer_entities.cypher",
+        labels={"gene": "Gene", "disease": "Disease", "chemical": "Drug", "cellline": "Tissue"},
+        # Existing nodes are matched (genes by synonym): several linked ids can bind
+        # one node, so MENTIONS weights are left to create-mentions.cypher
+        match={
+            "Gene": (
+                "CALL { WITH value MATCH (n:Gene) WHERE value.entity_id IN coalesce(n.synonyms, []) "
+                "RETURN n LIMIT 1 }"
+            ),
+            "Disease": "MATCH (n:Disease {id: value.entity_id})",
+            "Drug": "MATCH (n:Drug {id: value.entity_id})",
+            "Tissue": "MATCH (n:Tissue {id: value.entity_id})",
+        },
+        creates_nodes=False,
+    ),
+    "neuro": Domain(
+        "neuro",
+        loader="neuro/load_neuro_entities.cypher",
+        labels={
+            "technique": "Technique",
+            "species": "Species",
+            "UBERONParcellation": "UBERONParcellation",
+            "biologicalSex": "BiologicalSex",
+            "preparationType": "PreparationType",
+        },
+        default_label="NeuroEntity",
+    ),
+    "energy": Domain(
+        "energy",
+        loader="energy/load_energy_entities.cypher",
+        labels={"energytype": "EnergyType", "energystorage": "EnergyStorage"},
+        default_label="EnergyEntity",
+        # Set by energy/create_energy_connection_properties.cypher in the database
+        flags={"has_energy_type": "EnergyType", "has_energy_storage": "EnergyStorage"},
+    ),
+    # LegalDocument mentions of energyType_fedlex.jsonl, keyed on rsNr
+    "fedlex": Domain(
+        "fedlex",
+        loader="energy/load_energy_entities.cypher (energyType_fedlex.jsonl)",
+        product_field="rsNr",
+        source_label="LegalDocument",
+        labels={"energytype": "EnergyType", "energystorage": "EnergyStorage"},
+        default_label="EnergyEntity",
+    ),
+    "maritime": Domain(
+        "maritime",
+        loader="transport-maritime/load_vessel_types.cypher",
+        labels={"vesseltype": "VesselType", "vesselType": "VesselType"},
+        default_label="Error",
+    ),
+    "ccam": Domain(
+        "ccam",
+        loader="transport-ccam/load_transport_ccam_entities.cypher",
+        labels={
+            "communicationtype": "CommunicationType",
+            "entityconnectiontype": "EntityConnectionType",
+            "levelofautomation": "LevelOfAutomation",
+            "scenariotype": "ScenarioType",
+            "sensortype": "SensorType",
+            "vehicletype": "VehicleType",
+            "vrutype": "VRUType",
+        },
+        default_label="CCAMEntity",
+    ),
+    "geo": Domain(
+        "geo",
+        loader="energy/load_geo_entities.cypher",
+        product_field="oaireid",
+        geo=True,
+        count_every_mention=True,
+    ),
+}
+
+
+def iter_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the JSON objects of a .jsonl or .jsonl.gz file."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Warning: failed to parse JSON on line {line_no} of {path}: {e}")
+
+
+def as_list(value: Any) -> list:
+    """UNWIND semantics: null -> no rows, a list -> its items, anything else -> one row."""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def product_local_id(openaire_id: Any) -> Optional[str]:
+    """"50|<id>" -> the Product local_identifier (the OpenAIRE explore URL of <id>)."""
+    if not isinstance(openaire_id, str):
+        return None
+    parts = openaire_id.split("|")
+    if len(parts) < 2:
+        return None
+    return OPENAIRE_RESULT_URL + parts[1]
+
+
+def geo_identifier(entity: Dict[str, Any]) -> Optional[str]:
+    """Stable GeographicEntity id: Wikidata preferred, else OSM (as in load_geo_entities.cypher)."""
+    if entity.get("wikidata") is not None:
+        return f"wikidata:{entity['wikidata']}"
+    osm = entity.get("osm") or {}
+    if isinstance(osm, dict) and osm.get("osm_id") is not None:
+        return f"osm:{osm['osm_id']}"
+    return None
+
+
+def iter_mentions(domain: Domain, path: str) -> Iterator[Tuple[str, str, Any, Dict[str, Any], Dict[str, Any]]]:
+    """
+    Transform the rows of a mention input as its Cypher loader does.
+
+    Yields:
+        (product_id, label, entity_id, entity, context): one item per mention, where
+        entity is the linking entry (or the geographic entity) and context the
+        properties of the HAS_IN_TEXT_MENTION relationship
+    """
+    for row in iter_rows(path):
+        product_id = domain.source_id(row.get(domain.product_field))
+        if product_id is None:
+            continue
+        section_label = row.get("section_label")
+        section_title = row.get("section_title")
+        if section_label is None:
+            section_label = DEFAULT_SECTION
+        if section_title is None:
+            section_title = DEFAULT_SECTION
+
+        for ent in as_list(row.get("entities")):
+            if not isinstance(ent, dict):
+                continue
+            if domain.geo:
+                entity_id = geo_identifier(ent)
+                if entity_id is None:
+                    continue
+                context = {
+                    "role": ent.get("role"),
+                    "section_title": section_title,
+                    "section_label": section_label,
+                    "start": ent.get("start"),
+                    "end": ent.get("end"),
+                    "text": ent.get("text"),
+                }
+                yield product_id, "GeographicEntity", entity_id, ent, context
+                continue
+
+            label = domain.label(ent.get("entity"))
+            if label is None:
+                continue
+            context = {
+                "text": ent.get("text"),
+                "model": ent.get("model"),
+                "section_label": section_label,
+                "section_title": section_title,
+            }
+            for link in as_list(ent.get("linking")):
+                if isinstance(link, dict) and link.get("id") is not None:
+                    yield product_id, label, link["id"], link, context
+
+
+def context_key(context: Dict[str, Any]) -> int:
+    """64-bit hash of the MERGE key of a HAS_IN_TEXT_MENTION relationship."""
+    return hash64(json.dumps([context["text"], context["model"], context["section_label"], context["section_title"]]))
+
+
+def label_filename(prefix: str, label: str) -> str:
+    return f"{prefix}_{label}.jsonl.gz"
+
+
+def node_properties(domain: Domain, entity_id: Any, entity: Dict[str, Any]) -> Dict[str, Any]:
+    """Properties of a new entity node, as set by the domain loader when it creates the node."""
+    if domain.geo:
+        osm = entity.get("osm")
+        if not isinstance(osm, dict):
+            osm = {}
+        props = {
+            "name": entity.get("text"),
+            "wikidata": entity.get("wikidata"),
+            "osm_id": osm.get("osm_id"),
+            "osm_type": osm.get("osm_type"),
+            "display_name": osm.get("display_name"),
+            "lat": osm.get("lat"),
+            "lon": osm.get("lon"),
+            "boundingbox": osm.get("boundingbox"),
+        }
+    else:
+        props = entity
+    node = {"local_identifier": entity_id}
+    node.update((key, value) for key, value in props.items() if value is not None and key != "local_identifier")
+    return node
+
+
+def partition_mentions(
+    domain: Domain,
+    input_paths: List[str],
+    spill_dir: str,
+    partitions: int,
+    nodes: Optional[Dict[str, Dict[Any, Dict[str, Any]]]] = None,
+) -> Tuple[List[str], int]:
+    """
+    Hash-partition the mentions of the inputs on (label, product, entity) into spill
+    files of [label, product_id, entity_id, context] lines.
+
+    With `nodes` (label -> entity id -> properties), the entity nodes are collected
+    as well; the first mention of an entity sets its properties, like ON CREATE SET.
+
+    Returns:
+        (spill_paths, mentions): the spill files and the number of mentions read
+    """
+    spills = [Sink(os.path.join(spill_dir, f"{i:04d}.jsonl"), compress=False) for i in range(partitions)]
+    mentions = 0
+    try:
+        for path in input_paths:
+            print(f"Processing file: {path}")
+            for product_id, label, entity_id, entity, context in iter_mentions(domain, path):
+                if nodes is not None:
+                    label_nodes = nodes.setdefault(label, {})
+                    if entity_id not in label_nodes:
+                        label_nodes[entity_id] = node_properties(domain, entity_id, entity)
+                pair = f"{label}\t{product_id}\t{entity_id}"
+                spills[hash64(pair) % partitions].write([label, product_id, entity_id, context])
+                mentions += 1
+    finally:
+        for spill in spills:
+            spill.close()
+    return [str(spill.path) for spill in spills], mentions
+
+
+def read_partition(path: str) -> Dict[Tuple[str, str, Any], List[Dict[str, Any]]]:
+    """Group the mention contexts of one spill file by (label, product, entity) and remove the file."""
+    groups: Dict[Tuple[str, str, Any], List[Dict[str, Any]]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            label, product_id, entity_id, context = json.loads(line)
+            groups.setdefault((label, product_id, entity_id), []).append(context)
+    os.remove(path)
+    return groups
+
+
+def distinct_contexts(contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The contexts with distinct MERGE keys, in first-seen order."""
+    seen = set()
+    distinct = []
+    for context in contexts:
+        key = context_key(context)
+        if key not in seen:
+            seen.add(key)
+            distinct.append(context)
+    return distinct
+
+
+class LabelSinks:
+    """One gzipped JSONL output file per label, opened on first use."""
+
+    def __init__(self, output_dir: str, prefix: str):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.sinks: Dict[str, Sink] = {}
+        self.counts: Dict[str, int] = {}
+
+    def write(self, label: str, record: Dict[str, Any]) -> None:
+        sink = self.sinks.get(label)
+        if sink is None:
+            path = os.path.join(self.output_dir, label_filename(self.prefix, label))
+            sink = self.sinks[label] = Sink(path, compress=True)
+            self.counts[label] = 0
+        sink.write(record)
+        self.counts[label] += 1
+
+    def close(self) -> Dict[str, int]:
+        for sink in self.sinks.values():
+            sink.close()
+        return self.counts
+
+
+def aggregate_mentions(
+    domain: Domain,
+    input_paths: List[str],
+    output_dir: str,
+    partitions: int = DEFAULT_PARTITIONS,
+) -> Dict[str, int]:
+    """
+    Compute the MENTIONS weights of a domain's inputs and write the per-label edge
+    files and load-mentions.cypher (see the module docstring).
+
+    Returns:
+        dict: mapping label -> number of weighted edges written
+    """
+    if not domain.creates_nodes:
+        raise ValueError(
+            f"domain {domain.name} matches existing nodes: its MENTIONS weights are counted per "
+            "matched node by common/text-mentions/create-mentions.cypher"
+        )
+    os.makedirs(output_dir, exist_ok=True)
+    spill_dir = os.path.join(output_dir, "_spill")
+    os.makedirs(spill_dir, exist_ok=True)
+
+    edges = LabelSinks(output_dir, "mentions")
+    try:
+        # 1. Hash-partition the mentions on (label, product, entity)
+        spill_paths, mentions = partition_mentions(domain, input_paths, spill_dir, partitions)
+
+        # 2. Aggregate each partition and write the weighted edges per label
+        for spill_path in spill_paths:
+            for (label, product_id, entity_id), contexts in read_partition(spill_path).items():
+                if domain.count_every_mention:
+                    weight = len(contexts)
+                else:
+                    weight = len({context_key(context) for context in contexts})
+                edges.write(label, {"product_id": product_id, "entity_id": entity_id, "weight": weight})
+    finally:
+        counts = edges.close()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    write_mentions_loader(domain, sorted(counts), output_dir)
+    print(f"Aggregated {mentions} mentions into {sum(counts.values())} weighted MENTIONS edges")
+    for label, count in sorted(counts.items()):
+        print(f"  {label}: {count}")
+    return counts
+
+
+def preprocess_mentions(
+    domain: Domain,
+    input_paths: List[str],
+    output_dir: str,
+    partitions: int = DEFAULT_PARTITIONS,
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Write the entity nodes and HAS_IN_TEXT_MENTION relationships of a domain's
+    inputs to per-label files, with a generated load-entities.cypher that replaces
+    the domain loader:
+
+      - nodes_<Label>.jsonl.gz: one line per distinct entity, with the properties
+        the loader sets on creation (not written for domains that only match
+        existing nodes, e.g. cancer);
+      - has_in_text_mention_<Label>.jsonl.gz: {product_id, entity_id, properties},
+        one line per distinct (Product, entity, MERGE key), MERGEd by the loader on
+        that key, or, for domains whose loader CREATEs the relationships, one line
+        per mention.
+
+    Unlike the loaders, entity nodes are written whether or not the mention's
+    Product is in the graph.
+
+    Returns:
+        (nodes, edges): mapping label -> number of nodes / relationships written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    spill_dir = os.path.join(output_dir, "_spill")
+    os.makedirs(spill_dir, exist_ok=True)
+
+    nodes: Optional[Dict[str, Dict[Any, Dict[str, Any]]]] = {} if domain.creates_nodes else None
+    edges = LabelSinks(output_dir, "has_in_text_mention")
+    try:
+        spill_paths, mentions = partition_mentions(domain, input_paths, spill_dir, partitions, nodes)
+
+        for spill_path in spill_paths:
+            for (label, product_id, entity_id), contexts in read_partition(spill_path).items():
+                if not domain.count_every_mention:
+                    contexts = distinct_contexts(contexts)
+                for context in contexts:
+                    edges.write(label, {"product_id": product_id, "entity_id": entity_id, "properties": context})
+    finally:
+        edge_counts = edges.close()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    node_counts: Dict[str, int] = {}
+    for label, label_nodes in (nodes or {}).items():
+        node_sink = Sink(os.path.join(output_dir, label_filename("nodes", label)), compress=True)
+        try:
+            for node in label_nodes.values():
+                node_sink.write(node)
+        finally:
+            node_sink.close()
+        node_counts[label] = len(label_nodes)
+
+    write_entities_loader(domain, sorted(node_counts), sorted(edge_counts), output_dir)
+    print(f"Preprocessed {mentions} mentions into {sum(node_counts.values())} entity nodes "
+          f"and {sum(edge_counts.values())} HAS_IN_TEXT_MENTION relationships")
+    for label in sorted(set(node_counts) | set(edge_counts)):
+        print(f"  {label}: {node_counts.get(label, 0)} nodes, {edge_counts.get(label, 0)} relationships")
+    return node_counts, edge_counts
+
+
+def iter_flag_store(path: str) -> Iterator[str]:
+    """Stream the sorted Product ids of a flag store file (none if it does not exist yet)."""
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def merge_flag_store(path: str, new_ids: List[str]) -> Tuple[int, List[str]]:
+    """
+    Merge sorted Product ids into a flag store file (sorted ids, one per line, gzipped),
+    replacing it.
+
+    Returns:
+        (total, added): the number of ids in the store and the new ids not already in it
+    """
+    tmp_path = path + ".tmp"
+    added = []
+    total = 0
+    stored = iter_flag_store(path)
+    current = next(stored, None)
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as out:
+        for product_id in new_ids:
+            while current is not None and current < product_id:
+                out.write(current + "\n")
+                total += 1
+                current = next(stored, None)
+            if current == product_id:
+                continue
+            out.write(product_id + "\n")
+            total += 1
+            added.append(product_id)
+        while current is not None:
+            out.write(current + "\n")
+            total += 1
+            current = next(stored, None)
+    os.replace(tmp_path, path)
+    return total, added
+
+
+def compute_flags(
+    domain: Domain,
+    input_paths: List[str],
+    output_dir: str,
+    store_dir: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Compute the Product flags of a domain (see Domain.flags) from its mention inputs.
+
+    The flagged Product ids are kept in store_dir (default: output_dir) as sorted
+    <flag>.ids.gz files; a run over new input files merges its ids into them. The ids
+    not flagged before are written to <flag>.jsonl.gz, and load-flags.cypher sets the
+    flags on those Products only, so a run over the complete inputs with an empty
+    store sets every flag and a later run only adds the new ones.
+
+    Returns:
+        dict: mapping flag -> number of newly flagged Products
+    """
+    store_dir = store_dir or output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(store_dir, exist_ok=True)
+
+    flag_of_label = {label: flag for flag, label in domain.flags.items()}
+    flagged: Dict[str, set] = {flag: set() for flag in domain.flags}
+    for path in input_paths:
+        print(f"Processing file: {path}")
+        for product_id, label, _, _, _ in iter_mentions(domain, path):
+            flag = flag_of_label.get(label)
+            if flag is not None:
+                flagged[flag].add(product_id)
+
+    counts: Dict[str, int] = {}
+    for flag, product_ids in flagged.items():
+        total, added = merge_flag_store(os.path.join(store_dir, f"{flag}.ids.gz"), sorted(product_ids))
+        sink = Sink(os.path.join(output_dir, f"{flag}.jsonl.gz"), compress=True)
+        try:
+            for product_id in added:
+                sink.write({"product_id": product_id})
+        finally:
+            sink.close()
+        counts[flag] = len(added)
+        print(f"{flag}: {len(product_ids)} Products in the input, {len(added)} newly flagged, {total} in total")
+
+    write_flags_loader(domain, sorted(counts), output_dir)
+    return counts
+
+
+MENTIONS_LOADER_BLOCK = """CALL apoc.periodic.iterate(
+  "
+  CALL apoc.load.json('file:///import/{filename}') YIELD value
+  RETURN value
+  ",
+  "
+  MATCH (p:{source_label} {{local_identifier: value.product_id}})
+  {match}
+  MERGE (p)-[m:MENTIONS]->(n)
+  SET m.weight = value.weight
+  ",
+  {{batchSize: 10000}}
+);
+"""
+
+
+def write_mentions_loader(domain: Domain, labels: List[str], output_dir: str) -> None:
+    """Write load-mentions.cypher: one static-label block per mentions_<Label>.jsonl.gz file."""
+    path = os.path.join(output_dir, "load-mentions.cypher")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f"// Generated by mentions.py aggregate --domain {domain.name}.\n"
+            f"// Weighted MENTIONS edges of the {domain.source_label} nodes, replacing\n"
+            f"// common/text-mentions/create-mentions.cypher for this input (run mentions.py\n"
+            f"// aggregate for every domain input, e.g. fedlex for the LegalDocuments of energy);\n"
+            f"// run after {domain.loader} has created the entity nodes.\n\n"
+        )
+        for label in labels:
+            match = domain.match_clause(label).replace('"', '\\"')
+            f.write(MENTIONS_LOADER_BLOCK.format(filename=label_filename("mentions", label), match=match,
+                                                 source_label=domain.source_label))
+            f.write("\n")
+    print(f"Wrote loader {path}")
+
+
+ENTITY_INDEX_BLOCK = """CREATE INDEX {index}_local_identifier_idx
+IF NOT EXISTS
+FOR (n:{label})
+ON (n.local_identifier);
+"""
+
+ENTITY_NODES_BLOCK = """CALL apoc.periodic.iterate(
+  "
+  CALL apoc.load.json('file:///import/{filename}') YIELD value
+  RETURN value
+  ",
+  "
+  MERGE (n:{label} {{local_identifier: value.local_identifier}})
+    ON CREATE SET n += value
+  ",
+  {{batchSize: 10000}}
+);
+"""
+
+IN_TEXT_MENTIONS_BLOCK = """CALL apoc.periodic.iterate(
+  "
+  CALL apoc.load.json('file:///import/{filename}') YIELD value
+  RETURN value
+  ",
+  "
+  MATCH (p:{source_label} {{local_identifier: value.product_id}})
+  {match}
+  {relationship}
+  ",
+  {{batchSize: 10000}}
+);
+"""
+# The MERGE key of the domain loaders: linked ids matching one node, and files loaded
+# twice, give one relationship
+MERGE_IN_TEXT_MENTION = """MERGE (p)-[r:HAS_IN_TEXT_MENTION {
+    text: value.properties.text,
+    model: value.properties.model,
+    section_label: value.properties.section_label,
+    section_title: value.properties.section_title
+  }]->(n)"""
+# Domains counting every mention (geo): CREATEd like their loader does
+CREATE_IN_TEXT_MENTION = """CREATE (p)-[r:HAS_IN_TEXT_MENTION]->(n)
+  SET r = value.properties"""
+
+
+def write_entities_loader(domain: Domain, node_labels: List[str], edge_labels: List[str], output_dir: str) -> None:
+    """
+    Write load-entities.cypher: static-label blocks that merge the distinct entity
+    nodes and the HAS_IN_TEXT_MENTION relationships on the loader's MERGE key (or
+    create them, for domains counting every mention).
+    """
+    path = os.path.join(output_dir, "load-entities.cypher")
+    if domain.count_every_mention:
+        relationship = CREATE_IN_TEXT_MENTION
+        note = "the relationships are CREATEd as\n// by the domain loader, so running it twice duplicates them"
+    else:
+        relationship = MERGE_IN_TEXT_MENTION
+        note = "the relationships are MERGEd on\n// the loader's key, so it can be re-run"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f"// Generated by mentions.py preprocess --domain {domain.name}.\n"
+            f"// Replaces {domain.loader}: {note}.\n\n"
+        )
+        for label in node_labels:
+            f.write(ENTITY_INDEX_BLOCK.format(index=label.lower(), label=label))
+            f.write("\n")
+        for label in node_labels:
+            f.write(ENTITY_NODES_BLOCK.format(filename=label_filename("nodes", label), label=label))
+            f.write("\n")
+        for label in edge_labels:
+            match = domain.match_clause(label).replace('"', '\\"')
+            f.write(IN_TEXT_MENTIONS_BLOCK.format(filename=label_filename("has_in_text_mention", label), match=match,
+                                                  source_label=domain.source_label, relationship=relationship))
+            f.write("\n")
+    print(f"Wrote loader {path}")
+
+
+FLAG_BLOCK = """CREATE INDEX product_{flag}_idx IF NOT EXISTS
+FOR (p:Product)
+ON (p.{flag});
+
+CALL apoc.periodic.iterate(
+  "
+  CALL apoc.load.json('file:///import/{flag}.jsonl.gz') YIELD value
+  RETURN value
+  ",
+  "
+  MATCH (p:Product {{local_identifier: value.product_id}})
+  SET p.{flag} = true
+  ",
+  {{batchSize: 10000, parallel: true}}
+);
+"""
+
+
+def write_flags_loader(domain: Domain, flags: List[str], output_dir: str) -> None:
+    """Write load-flags.cypher: one bulk SET per <flag>.jsonl.gz file."""
+    path = os.path.join(output_dir, "load-flags.cypher")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f"// Generated by mentions.py flags --domain {domain.name}.\n"
+            f"// Sets the flags on the newly flagged Products only; Products without a flag\n"
+            f"// keep no property, so test them with coalesce(p.<flag>, false).\n\n"
+        )
+        for flag in flags:
+            f.write(FLAG_BLOCK.format(flag=flag))
+            f.write("\n")
+    print(f"Wrote loader {path}")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline processing of the graph-specific entity-mention inputs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    aggregate = commands.add_parser(
+        "aggregate",
+        help="Compute weighted MENTIONS edges (replaces common/text-mentions/create-mentions.cypher)",
+    )
+    preprocess = commands.add_parser(
+        "preprocess",
+        help="Write deduplicated entity node and HAS_IN_TEXT_MENTION files (replaces the domain loader)",
+    )
+    flags = commands.add_parser(
+        "flags",
+        help="Compute Product flags, e.g. has_energy_type (replaces energy/create_energy_connection_properties.cypher)",
+    )
+    flags.add_argument(
+        "--store-dir",
+        help="Directory of the flagged Product ids, merged with each run's inputs (default: the output directory)",
+    )
+    for command in (aggregate, preprocess, flags):
+        command.add_argument("--domain", required=True, choices=sorted(DOMAINS), help="Pilot domain of the input")
+        command.add_argument(
+            "--input", "-i", dest="input_paths", required=True, nargs="+",
+            help="Mention JSONL (or JSONL.GZ) file(s) of the domain, e.g. neuro.jsonl",
+        )
+        command.add_argument("--output-dir", "-o", required=True, help="Directory of the output files and loader")
+    for command in (aggregate, preprocess):
+        command.add_argument(
+            "--partitions", type=int, default=DEFAULT_PARTITIONS,
+            help=f"Number of spill partitions; more partitions use less memory (default: {DEFAULT_PARTITIONS})",
+        )
+    return parser
+
+
+def main() -> None:
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.command == "aggregate":
+        if not DOMAINS[args.domain].creates_nodes:
+            parser.error(f"domain {args.domain} matches existing nodes: use common/text-mentions/create-mentions.cypher")
+        aggregate_mentions(DOMAINS[args.domain], args.input_paths, args.output_dir, args.partitions)
+    elif args.command == "preprocess":
+        preprocess_mentions(DOMAINS[args.domain], args.input_paths, args.output_dir, args.partitions)
+    elif args.command == "flags":
+        domain = DOMAINS[args.domain]
+        if not domain.flags:
+            parser.error(f"domain {domain.name} has no Product flags")
+        compute_flags(domain, args.input_paths, args.output_dir, args.store_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,12 +20,13 @@ driver = GraphDatabase.driver(URI, auth=AUTH)
 
 def get_products_with_same_doi(tx):
     """
-    Returns groups of products sharing the same DOI (case-insensitive).
+    Returns groups of products sharing the same normalised DOI (Pid.normalized_value).
     Only returns groups that contain at least one product with source = 'ebrains'.
     """
     query = """
-    MATCH (p:Product)-[:HAS_PID]->(pid:Pid {scheme:'doi'})
-    WITH toLower(pid.value) AS doi, collect(p) AS products
+    MATCH (p:Product)-[:HAS_PID]->(pid:Pid {normalized_scheme:'doi'})
+    WHERE pid.normalized_value IS NOT NULL
+    WITH pid.normalized_value AS doi, collect(p) AS products
     WHERE size(products) > 1
     AND ANY(p IN products WHERE p.source = 'ebrains')
     RETURN doi, products
@@ -17,6 +17,9 @@ CREATE INDEX datasource_id FOR (d:Datasource) ON (d.local_identifier);
 CREATE INDEX product_id FOR (p:Product) ON (p.local_identifier);
 CREATE INDEX manifestation_id FOR (m:Manifestation) ON (m.local_identifier);
 CREATE INDEX pid_id FOR (i:Pid) ON (i.local_identifier);
+// Pids matched by their normalised scheme and value (utils.normalize_pid), e.g.
+//   MATCH (pid:Pid {normalized_scheme: "doi", normalized_value: $doi})<-[:HAS_PID]-(p:Product)
+CREATE INDEX pid_normalized_scheme_value FOR (i:Pid) ON (i.normalized_scheme, i.normalized_value);
 
 // AGENTS
 CALL apoc.periodic.iterate(
@@ -45,137 +45,55 @@ CREATE INDEX agent_id FOR (e:Agent) ON (e.local_identifier);
 CREATE INDEX pid_id FOR (i:Pid) ON (i.local_identifier);
 """
 
-import gzip
-import json
-import os
-from pathlib import Path
-import sys
 try:
-    from .utils import clean_empty
-except ImportError:
-    from utils import clean_empty
-
-def process_files(base_dir):
-    # Define input directory
-    input_dir = Path(f"{base_dir}/dump/agent")
-    
-    # Define output directory
-    output_dir = Path(f"{base_dir}/to_load/agents")
-
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    entities_file = gzip.open(output_dir / "agents.jsonl.gz", "wt", encoding="utf-8")
-    rel_file = gzip.open(output_dir / "relationships.jsonl.gz", "wt", encoding="utf-8")
-    identifiers_file = gzip.open(output_dir / "identifiers.jsonl.gz", "wt", encoding="utf-8")
-    
-    entity_type_counts = {}
-    
+    from .engine import EntitySpec, pid_edges, run
+    from .utils import parse_args
+except ImportError:  # script execution (no package)
+    from engine import EntitySpec, pid_edges, run
+    from utils import parse_args
+
+
+def affiliation_edges(agent, agent_id):
+    """Emit agent -[AFFILIATED_WITH]-> organisation, with role and period."""
+    for aff in agent.get("affiliations") or []:
+        yield "relationships", {
+            "start": agent_id,
+            "end": aff.get("affiliation"),
+            "type": "AFFILIATED_WITH",
+            "role": aff.get("role"),
+            "period_start": aff.get("period", {}).get("start"),
+            "period_end": aff.get("period", {}).get("end"),
+        }
+
+
+SPEC = EntitySpec(
+    name="agents",
+    input_dir="agent",
     # Define all possible entity fields (removing identifiers)
-    entity_fields = [
+    fields=[
         "local_identifier",
-        "entity_type", 
-        "name", 
+        "entity_type",
+        "name",
         "given_name",
-        "family_name", 
+        "family_name",
         "short_name",
         "other_names",
-        "website", 
-        "country", 
+        "website",
+        "country",
         "types",
-    ]
-
-    print(f"\nProcessing directory: {input_dir}")
-    if not input_dir.exists():
-        print(f"Warning: Directory not found: {input_dir}")
-        return
-            
-    for file in input_dir.glob("*.txt.gz"):
-        # print(f"Processing file: {file}")
-        with gzip.open(file, 'rt', encoding='utf-8') as f:
-            for line_number, line in enumerate(f, start=1):
-                try:
-                    data = json.loads(line)
-
-                    # CAUTION: this is a workaround to handle the case where @graph is not a list - in EBRAINS dataset
-                    if not isinstance(data, dict):
-                        continue
-                    graph = data.get("@graph", [])
-                    if isinstance(graph, dict):
-                        graph = [graph]
-                    elif not isinstance(graph, list):
-                        continue
-
-                    for entity in graph:
-                        if not isinstance(entity, dict):
-                            continue
-                        # print(f"{file.name}:{line_number}: {entity}")
-                        etype = entity.get("entity_type")
-                        agent_id = entity.get("local_identifier")
-                        entity_type_counts[etype] = entity_type_counts.get(etype, 0) + 1
-                        
-                        # Build entity data with original data as string
-                        entity_data = {
-                            field: entity.get(field) for field in entity_fields
-                            if entity.get(field) is not None
-                        }
-                        # Clean and store the complete original entity as a JSON string
-                        entity_data["_data"] = json.dumps(clean_empty(entity))
-                        entity_data = clean_empty(entity_data)
-                        entities_file.write(json.dumps(entity_data) + "\n")
-
-                        # Handle identifiers
-                        if entity.get("identifiers"):
-                            for identifier in entity.get("identifiers"):
-                                identifier_data = {
-                                    "local_identifier": f"{identifier.get('scheme')}:{identifier.get('value')}",
-                                    "scheme": identifier.get("scheme"),
-                                    "value": identifier.get("value")
-                                }
-                                identifier_data = clean_empty(identifier_data)
-                                if identifier_data:
-                                    identifiers_file.write(json.dumps(identifier_data) + "\n")
-                                
-                                # Create relationship between entity and identifier
-                                rel = {
-                                    "start": agent_id,
-                                    "end": identifier_data["local_identifier"],
-                                    "type": "HAS_PID",
-                                }
-                                rel = clean_empty(rel)
-                                if rel:
-                                    rel_file.write(json.dumps(rel) + "\n")
+    ],
+    edges=[
+        pid_edges(scheme_on_edge=False),
+        affiliation_edges,
+    ],
+    report_by="entity_type",
+)
 
-                        # Handle affiliations relationships
-                        if entity.get("affiliations"):
-                            for aff in entity.get("affiliations"):
-                                rel = {k: v for k, v in {
-                                    "start": agent_id,
-                                    "end": aff.get("affiliation"),
-                                    "type": "AFFILIATED_WITH",
-                                    "role": aff.get("role"),
-                                    "period_start": aff.get("period", {}).get("start"),
-                                    "period_end": aff.get("period", {}).get("end")
-                                }.items() if v is not None}
-                                rel = clean_empty(rel)
-                                if rel:
-                                    rel_file.write(json.dumps(rel) + "\n")
 
-                except json.JSONDecodeError as e:
-                    print(f"Skipping invalid JSON in {file.name}: {e}")
+def process_files(base_dir, sample_rate=None):
+    run(SPEC, base_dir, sample_rate)
 
-    entities_file.close()
-    rel_file.close()
-    identifiers_file.close()
-    
-    # Print entity type report
-    print("\n=== Entity Type Report ===")
-    for etype, count in sorted(entity_type_counts.items()):
-        print(f"{etype or 'None'}: {count}")
-    print("=======================")
-    print("✅ Done. Output saved in:", output_dir)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python agents.py <base_dir>")
-    else:
-        process_files(sys.argv[1])
+    args = parse_args("Process SKG-IF agent dumps into Agent, Pid and relationship files.")
+    process_files(args.base_dir, sample_rate=args.sample)
@@ -69,29 +69,23 @@ CREATE INDEX grant_id FOR (g:Grant) ON (g.local_identifier);
 CREATE INDEX pid_id FOR (i:Pid) ON (i.local_identifier);
 """
 
-import gzip
-import json
-import os
-from pathlib import Path
-import sys
 try:
-    from .utils import add_multilingual_fields, clean_empty
+    from .engine import (
+        EntitySpec, contribution_edges, flatten_fields, pid_edges, reference_edge, reference_edges, run,
+    )
+    from .utils import parse_args
 except ImportError:  # script execution (no package)
-    from utils import add_multilingual_fields, clean_empty
+    from engine import (
+        EntitySpec, contribution_edges, flatten_fields, pid_edges, reference_edge, reference_edges, run,
+    )
+    from utils import parse_args
 
-def process_files(base_dir):
-    input_dir = Path(f"{base_dir}/dump/grants")
-    output_dir = Path(f"{base_dir}/to_load/grants")
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    grants_file = gzip.open(output_dir / "grants.jsonl.gz", "wt", encoding="utf-8")
-    rel_file = gzip.open(output_dir / "relationships.jsonl.gz", "wt", encoding="utf-8")
-    identifiers_file = gzip.open(output_dir / "identifiers.jsonl.gz", "wt", encoding="utf-8")
-    
-    grant_count = 0
-    
+SPEC = EntitySpec(
+    name="grants",
+    input_dir="grants",
     # Define grant fields (excluding relationship fields and adding duration fields)
-    grant_fields = [
+    fields=[
         "local_identifier",
         "grant_number",
         "entity_type",
@@ -100,117 +94,25 @@ def process_files(base_dir):
         "currency",
         "funded_amount",
         "keywords",
-        "website"
-    ]
+        "website",
+    ],
+    multilingual=[("titles", "title"), ("abstracts", "abstract")],
+    flatteners=[
+        flatten_fields("duration", {"start": "duration_start", "end": "duration_end"}),
+    ],
+    edges=[
+        reference_edge("funding_agency", "HAS_FUNDING_AGENCY"),
+        pid_edges(),
+        reference_edges("beneficiaries", "HAS_BENEFICIARY"),
+        contribution_edges("roles", "declared_affiliations"),
+    ],
+)
 
-    for file in input_dir.glob("*.txt.gz"):
-        with gzip.open(file, 'rt', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    for grant in data.get("@graph", []):
-                        grant_id = grant.get("local_identifier")
-                        grant_count += 1
-                        
-                        # Build grant data
-                        grant_data = {
-                            field: grant.get(field) for field in grant_fields
-                            if grant.get(field) is not None
-                        }
-                        
-                        # Handle multilingual titles
-                        titles = grant.get("titles") or {}
-                        add_multilingual_fields(grant_data, titles, "title")
 
-                        # Handle multilingual abstracts
-                        abstracts = grant.get("abstracts", {})
-                        add_multilingual_fields(grant_data, abstracts, "abstract")
+def process_files(base_dir, sample_rate=None):
+    run(SPEC, base_dir, sample_rate)
 
-                        # Handle duration fields separately
-                        if grant.get("duration"):
-                            duration = grant.get("duration")
-                            if duration.get("start"):
-                                grant_data["duration_start"] = duration["start"]
-                            if duration.get("end"):
-                                grant_data["duration_end"] = duration["end"]
-
-                        # Handle funding agency relationship
-                        if grant.get("funding_agency"):
-                            rel = {
-                                "start": grant_id,
-                                "end": grant["funding_agency"],
-                                "type": "HAS_FUNDING_AGENCY"
-                            }
-                            rel = clean_empty(rel)
-                            if rel:
-                                rel_file.write(json.dumps(rel) + "\n")
-                        
-                        # Store original data
-                        grant_data["_data"] = json.dumps(clean_empty(grant))
-                        grant_data = clean_empty(grant_data)
-                        grants_file.write(json.dumps(grant_data) + "\n")
-
-                        # Handle identifiers
-                        if grant.get("identifiers"):
-                            for identifier in grant.get("identifiers"):
-                                identifier_data = {
-                                    "local_identifier": f"{identifier.get('scheme')}:{identifier.get('value')}",
-                                    "scheme": identifier.get("scheme"),
-                                    "value": identifier.get("value")
-                                }
-                                identifier_data = clean_empty(identifier_data)
-                                if identifier_data:
-                                    identifiers_file.write(json.dumps(identifier_data) + "\n")
-                                
-                                # Create HAS_PID relationship
-                                rel = {
-                                    "start": grant_id,
-                                    "end": identifier_data["local_identifier"],
-                                    "type": "HAS_PID",
-                                    "scheme": identifier.get("scheme")
-                                }
-                                rel = clean_empty(rel)
-                                if rel:
-                                    rel_file.write(json.dumps(rel) + "\n")
-
-                        # Handle beneficiaries
-                        for beneficiary in grant.get("beneficiaries") or []:
-                            rel = {
-                                "start": grant_id,
-                                "end": beneficiary,
-                                "type": "HAS_BENEFICIARY"
-                            }
-                            rel = clean_empty(rel)
-                            if rel:
-                                rel_file.write(json.dumps(rel) + "\n")
-
-                        # Handle contributions
-                        for contribution in grant.get("contributions") or []:
-                            rel = {
-                                "start": contribution.get("by"),
-                                "end": grant_id,
-                                "type": "HAS_CONTRIBUTED_TO",
-                                "properties": {
-                                    "roles": contribution.get("roles"),
-                                    "declared_affiliations": contribution.get("declared_affiliations")
-                                }
-                            }
-                            rel = clean_empty(rel)
-                            if rel:
-                                rel_file.write(json.dumps(rel) + "\n")
-
-                except json.JSONDecodeError as e:
-                    print(f"Skipping invalid JSON in {file.name}: {e}")
-
-    grants_file.close()
-    rel_file.close()
-    identifiers_file.close()
-    
-    print(f"\n=== Processed {grant_count} grants ===")
-    print("✅ Done. Output saved in:", output_dir)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python grants.py <base_dir>")
-    else:
-        process_files(sys.argv[1])
+    args = parse_args("Process SKG-IF grant dumps into Grant, Pid and relationship files.")
+    process_files(args.base_dir, sample_rate=args.sample)
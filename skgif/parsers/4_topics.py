@@ -32,90 +32,32 @@ CREATE INDEX topic_id FOR (t:Topic) ON (t.local_identifier);
 CREATE INDEX pid_id FOR (i:Pid) ON (i.local_identifier);
 """
 
-import gzip
-import json
-import os
-from pathlib import Path
-import sys
 try:
-    from .utils import add_multilingual_fields, clean_empty
+    from .engine import EntitySpec, pid_edges, run
+    from .utils import parse_args
 except ImportError:  # script execution (no package)
-    from utils import add_multilingual_fields, clean_empty
+    from engine import EntitySpec, pid_edges, run
+    from utils import parse_args
 
-def process_files(base_dir):
-    input_dir = Path(f"{base_dir}/dump/topic")
-    output_dir = Path(f"{base_dir}/to_load/topics")
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    topics_file = gzip.open(output_dir / "topics.jsonl.gz", "wt", encoding="utf-8")
-    rel_file = gzip.open(output_dir / "relationships.jsonl.gz", "wt", encoding="utf-8")
-    identifiers_file = gzip.open(output_dir / "identifiers.jsonl.gz", "wt", encoding="utf-8")
-    
-    topic_count = 0
-    
-    # Define topic fields
-    topic_fields = [
+SPEC = EntitySpec(
+    name="topics",
+    input_dir="topic",
+    fields=[
         "local_identifier",
-        "entity_type"
-    ]
+        "entity_type",
+    ],
+    multilingual=[("labels", "label")],
+    edges=[
+        pid_edges(),
+    ],
+)
 
-    for file in input_dir.glob("*.txt.gz"):
-        with gzip.open(file, 'rt', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    for topic in data.get("@graph", []):
-                        topic_id = topic.get("local_identifier")
-                        topic_count += 1
-                        
-                        # Build topic data
-                        topic_data = {
-                            field: topic.get(field) for field in topic_fields
-                            if topic.get(field) is not None
-                        }
-                        
-                        labels = topic.get("labels", {})
-                        add_multilingual_fields(topic_data, labels, "label")
-                        
-                        # Store original data
-                        topic_data["_data"] = json.dumps(clean_empty(topic))
-                        topic_data = clean_empty(topic_data)
-                        topics_file.write(json.dumps(topic_data) + "\n")
 
-                        # Handle identifiers
-                        if topic.get("identifiers"):
-                            for identifier in topic.get("identifiers"):
-                                identifier_data = {
-                                    "local_identifier": f"{identifier.get('scheme')}:{identifier.get('value')}",
-                                    "scheme": identifier.get("scheme"),
-                                    "value": identifier.get("value")
-                                }
-                                identifier_data = clean_empty(identifier_data)
-                                if identifier_data:
-                                    identifiers_file.write(json.dumps(identifier_data) + "\n")
-                                
-                                rel = {
-                                    "start": topic_id,
-                                    "end": identifier_data["local_identifier"],
-                                    "type": "HAS_PID",
-                                    "scheme": identifier.get("scheme")
-                                }
-                                rel = clean_empty(rel)
-                                if rel:
-                                    rel_file.write(json.dumps(rel) + "\n")
+def process_files(base_dir, sample_rate=None):
+    run(SPEC, base_dir, sample_rate)
 
-                except json.JSONDecodeError as e:
-                    print(f"Skipping invalid JSON in {file.name}: {e}")
-
-    topics_file.close()
-    rel_file.close()
-    identifiers_file.close()
-    
-    print(f"\n=== Processed {topic_count} topics ===")
-    print("✅ Done. Output saved in:", output_dir)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python topics.py <base_dir>")
-    else:
-        process_files(sys.argv[1])
+    args = parse_args("Process SKG-IF topic dumps into Topic, Pid and relationship files.")
+    process_files(args.base_dir, sample_rate=args.sample)
@@ -32,99 +32,39 @@ CREATE INDEX datasource_id FOR (d:Datasource) ON (d.local_identifier);
 CREATE INDEX pid_id FOR (i:Pid) ON (i.local_identifier);
 """
 
-import gzip
-import json
-import os
-from pathlib import Path
-import sys
 try:
-    from .utils import clean_empty
-except ImportError:
-    from utils import clean_empty
+    from .engine import EntitySpec, json_fields, pid_edges, run
+    from .utils import parse_args
+except ImportError:  # script execution (no package)
+    from engine import EntitySpec, json_fields, pid_edges, run
+    from utils import parse_args
 
-def process_files(base_dir):
-    input_dir = Path(f"{base_dir}/dump/datasource")
-    output_dir = Path(f"{base_dir}/to_load/datasources")
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    datasources_file = gzip.open(output_dir / "datasources.jsonl.gz", "wt", encoding="utf-8")
-    rel_file = gzip.open(output_dir / "relationships.jsonl.gz", "wt", encoding="utf-8")
-    identifiers_file = gzip.open(output_dir / "identifiers.jsonl.gz", "wt", encoding="utf-8")
-    
-    datasource_count = 0
-    
-    # Define datasource fields
-    datasource_fields = [
+SPEC = EntitySpec(
+    name="datasources",
+    input_dir="datasource",
+    fields=[
         "local_identifier",
         "entity_type",
         "name",
         "data_source_classification",
         "research_product_types",
-        "disciplines"
-    ]
+        "disciplines",
+    ],
+    # Policies and other nested fields are stored as JSON strings
+    flatteners=[
+        json_fields("policies", "persistent_identity_systems", "audience"),
+    ],
+    edges=[
+        pid_edges(),
+    ],
+)
 
-    for file in input_dir.glob("*.txt.gz"):
-        with gzip.open(file, 'rt', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    for ds in data.get("@graph", []):
-                        ds_id = ds.get("local_identifier")
-                        datasource_count += 1
-                        
-                        # Build datasource data
-                        datasource_data = {
-                            field: ds.get(field) for field in datasource_fields
-                            if ds.get(field) is not None
-                        }
 
-                        # Handle policy/policies and nested fields (store as JSON string)
-                        if ds.get("policies"):
-                            datasource_data["policies"] = json.dumps(ds["policies"])
-                        if ds.get("persistent_identity_systems"):
-                            datasource_data["persistent_identity_systems"] = json.dumps(ds["persistent_identity_systems"])
-                        if ds.get("audience"):
-                            datasource_data["audience"] = json.dumps(ds["audience"])
+def process_files(base_dir, sample_rate=None):
+    run(SPEC, base_dir, sample_rate)
 
-                        # Store original data
-                        datasource_data["_data"] = json.dumps(clean_empty(ds))
-                        datasource_data = clean_empty(datasource_data)
-                        datasources_file.write(json.dumps(datasource_data) + "\n")
-
-                        # Handle identifiers
-                        if ds.get("identifiers"):
-                            for identifier in ds.get("identifiers"):
-                                identifier_data = {
-                                    "local_identifier": f"{identifier.get('scheme')}:{identifier.get('value')}",
-                                    "scheme": identifier.get("scheme"),
-                                    "value": identifier.get("value")
-                                }
-                                identifier_data = clean_empty(identifier_data)
-                                if identifier_data:
-                                    identifiers_file.write(json.dumps(identifier_data) + "\n")
-                                
-                                rel = {
-                                    "start": ds_id,
-                                    "end": identifier_data["local_identifier"],
-                                    "type": "HAS_PID",
-                                    "scheme": identifier.get("scheme")
-                                }
-                                rel = clean_empty(rel)
-                                if rel:
-                                    rel_file.write(json.dumps(rel) + "\n")
-
-                except json.JSONDecodeError as e:
-                    print(f"Skipping invalid JSON in {file.name}: {e}")
-
-    datasources_file.close()
-    rel_file.close()
-    identifiers_file.close()
-    
-    print(f"\n=== Processed {datasource_count} datasources ===")
-    print("✅ Done. Output saved in:", output_dir)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python 5_datasources.py <base_dir>")
-    else:
-        process_files(sys.argv[1]) 
\ No newline at end of file
+    args = parse_args("Process SKG-IF datasource dumps into Datasource, Pid and relationship files.")
+    process_files(args.base_dir, sample_rate=args.sample)
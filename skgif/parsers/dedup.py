@@ -0,0 +1,472 @@
+"""
+Offline deduplication of Products that share a persistent identifier.
+
+The same work can reach a graph through several dumps (e.g. an EBRAINS dataset
+and its OpenAIRE record) or several records of one dump. Instead of merging the
+loaded Products in the database (enrichments/graph-specific/neuro/ebrains), this
+stage rewrites the products outputs of one or more domains in <base_dir>/to_load
+so that duplicates are never loaded:
+
+  1. The Pids of the products' HAS_PID relationships are normalised (scheme case,
+     DOI case and doi.org prefixes, PMCID "PMC" prefix) and products sharing a Pid
+     of the selected schemes are grouped with a union-find. Manifestation Pids are
+     not used.
+  2. Each group keeps one survivor, chosen as pick_survivor in ebrains-merge.py
+     does: the product without `source` with the smallest local_identifier. Groups
+     without such a product cannot be merged and are skipped, as are groups of more
+     than --max-group-size products (a Pid wrongly shared by many records would
+     chain unrelated products together); both are listed in the skipped report.
+     With --source, only the products of the --source domains are merged into the
+     survivor, as ebrains-merge.py only merges the products with source 'ebrains';
+     without --source, every other product of the group is merged (duplicates
+     within the given domains), which ebrains-merge.py does not do.
+  3. Duplicates are dropped from products.jsonl. Their HAS_PID relationships are
+     moved to the survivor only for schemes it does not have yet (duplicates taken
+     in local_identifier order), their manifestations are dropped, and their other
+     relationships are moved to the survivor, removing the copies this creates.
+     Pids only linked by dropped relationships are dropped too. Survivors without a
+     source take the source of their duplicates, as merge-ebrains.cy tags them.
+
+ebrains-merge.py groups products by DOI only: use --schemes doi for the same groups.
+Products of a dump given with --source NAME=BASE_DIR get `source: NAME`. Moved
+relationships keep living in the duplicate's domain, so load the --source domains
+after the domains holding their survivors.
+
+The parser outputs are moved to to_load/products/_pre_dedup/ on the first run and
+read from there by later runs, until the parser writes new outputs. Every merged
+product is listed in the report (survivor, duplicate, duplicate source, shared
+Pids). Rebuild the lookup and DOI indexes (index.py) after deduplicating.
+
+Usage:
+  python3 parsers/dedup.py /data/tmp/skgif_dumps/neuroscience --source ebrains=/data/tmp/skgif_dumps/ebrains
+  python3 parsers/dedup.py <base_dir> [<base_dir> ...] [--schemes doi pmid pmcid] [--report merge_report.tsv]
+                          [--max-group-size 50] [--skipped-report skipped_groups.tsv]
+"""
+
+import argparse
+import gzip
+import json
+import os
+from pathlib import Path
+try:
+    from .index import MANIFESTATION_ID, PRODUCTS_DIR, space_dir
+    from .utils import hash64, normalize_pid, shared_key_groups
+except ImportError:  # script execution (no package)
+    from index import MANIFESTATION_ID, PRODUCTS_DIR, space_dir
+    from utils import hash64, normalize_pid, shared_key_groups
+
+DEFAULT_SCHEMES = ("doi", "pmid", "pmcid")
+# Groups of more products are not merged
+DEFAULT_MAX_GROUP_SIZE = 50
+# Products listed per skipped group in the skipped report
+MAX_LISTED = 20
+PRODUCT_FILES = ("products", "identifiers", "manifestations", "relationships")
+BACKUP_DIR = "_pre_dedup"
+# Backup directories of the stages rewriting parser outputs, in pipeline order
+# (dedup.py, resolve_agents.py), and the record of the files each one wrote
+STAGE_BACKUPS = (BACKUP_DIR, "_pre_resolve")
+STAGE_STATE = "outputs.json"
+PAIR_FORMAT = "<QQ"  # Pid hash, product hash
+
+
+def pid_of(rel: dict):
+    """Return the normalised (scheme, value) of a product HAS_PID relationship, or None."""
+    if rel.get("type") != "HAS_PID":
+        return None
+    start, end = rel.get("start"), rel.get("end")
+    if not isinstance(start, str) or not isinstance(end, str) or MANIFESTATION_ID.search(start):
+        return None
+    # Pid local identifiers are "<scheme>:<value>"
+    prefix, _, value = end.partition(":")
+    return normalize_pid(rel.get("scheme") or prefix, value)
+
+
+def pid_key(pid: tuple) -> int:
+    return hash64(f"{pid[0]}:{pid[1]}")
+
+
+def iter_rows(path: Path):
+    """Yield (raw line, decoded record) for every JSON object line of a parser output."""
+    opener = gzip.open if path.name.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping invalid JSON in {path}: {e}")
+                continue
+            if isinstance(record, dict):
+                yield line, record
+
+
+class StagedOutputs:
+    """
+    The parser outputs of one to_load/ directory, rewritten in place by a stage.
+
+    stage() moves the current files to the stage's backup subdirectory; the stage then
+    reads input(stem) and writes open_output(stem), keeping the compression
+    (<stem>.jsonl or <stem>.jsonl.gz). A file written by this stage or a later one
+    (STAGE_BACKUPS order) is not moved: the stage reads the file it saved before,
+    so stages can be re-run until the parser (or an earlier stage) writes new files.
+
+    Outputs are written to <name>.tmp and moved into place by finish(), after their
+    mtime and size are recorded in the backup's STAGE_STATE: a file is recognised as
+    a stage output by these only, so a file written by the parser after an
+    interrupted run is backed up like any new parser output.
+    """
+
+    def __init__(self, directory, stems, backup: str, source=None):
+        self.dir = Path(directory)
+        self.stems = tuple(stems)
+        self.backup = self.dir / backup
+        self.later = [self.dir / name for name in STAGE_BACKUPS[STAGE_BACKUPS.index(backup) + 1:]]
+        self.source = source
+        self.names = {}
+        # Outputs of an earlier run of this stage that are still in place
+        self.kept = {}
+
+    def _name(self, stem: str) -> str:
+        for name in (f"{stem}.jsonl", f"{stem}.jsonl.gz"):
+            if (self.dir / name).exists() or (self.backup / name).exists():
+                return name
+        raise FileNotFoundError(f"{self.dir / stem}.jsonl(.gz) not found: run the parser first")
+
+    @staticmethod
+    def _written(backup: Path) -> dict:
+        """Outputs recorded by a stage: {"complete": bool, "outputs": {name: [mtime_ns, size]}}."""
+        path = backup / STAGE_STATE
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, complete: bool, outputs: dict) -> None:
+        with open(self.backup / STAGE_STATE, "w", encoding="utf-8") as f:
+            json.dump({"complete": complete, "outputs": outputs}, f)
+
+    def stage(self) -> None:
+        self.backup.mkdir(parents=True, exist_ok=True)
+        own = self._written(self.backup)
+        later = [state for state in map(self._written, self.later) if state is not None]
+        self.kept = {}
+        for stem in self.stems:
+            name = self.names[stem] = self._name(stem)
+            current, saved = self.dir / name, self.backup / name
+            if not current.exists():
+                continue
+            if saved.exists():
+                stat = [current.stat().st_mtime_ns, current.stat().st_size]
+                # Written by this stage or a later one (complete or interrupted run)
+                if own is not None and own["outputs"].get(name) == stat:
+                    self.kept[name] = stat
+                    continue
+                if any(state["outputs"].get(name) == stat for state in later):
+                    continue
+            os.replace(current, saved)
+        self._save_state(False, self.kept)
+
+    def input(self, stem: str) -> Path:
+        return self.backup / self.names[stem]
+
+    def _tmp(self, name: str) -> Path:
+        return self.dir / f"{name}.tmp"
+
+    def open_output(self, stem: str):
+        path = self._tmp(self.names[stem])
+        if self.names[stem].endswith(".gz"):
+            return gzip.open(path, "wt", encoding="utf-8")
+        return open(path, "w", encoding="utf-8")
+
+    def finish(self) -> None:
+        written = [name for name in self.names.values() if self._tmp(name).exists()]
+        outputs = dict(self.kept)
+        for name in written:
+            stat = self._tmp(name).stat()
+            outputs[name] = [stat.st_mtime_ns, stat.st_size]
+        # Recorded first: the moves keep mtime and size, so an interruption between
+        # them leaves files the next stage() recognises
+        self._save_state(False, outputs)
+        for name in written:
+            os.replace(self._tmp(name), self.dir / name)
+        self._save_state(True, outputs)
+
+
+def product_outputs(base_dir, source=None) -> StagedOutputs:
+    return StagedOutputs(Path(base_dir) / "to_load" / PRODUCTS_DIR, PRODUCT_FILES, BACKUP_DIR, source)
+
+
+def owner_of(local_identifier: str) -> str:
+    """Product local_identifier of a manifestation id, or the id itself."""
+    match = MANIFESTATION_ID.search(local_identifier)
+    return local_identifier[:match.start()] if match else local_identifier
+
+
+def group_products(outputs: list, schemes: set):
+    """
+    Union-find over the products sharing a normalised Pid.
+
+    Returns:
+        tuple: (groups, shared) where groups lists the sets of product hashes of two or
+        more products and shared holds the hashes of the Pids joining them (see
+        utils.shared_key_groups)
+    """
+    def pairs():
+        for out in outputs:
+            for _, rel in iter_rows(out.input("relationships")):
+                pid = pid_of(rel)
+                if pid is not None and pid[0] in schemes:
+                    yield pid_key(pid), hash64(rel["start"])
+
+    return shared_key_groups(pairs(), PAIR_FORMAT)
+
+
+def collect_members(outputs: list, member_hashes: set, shared: set):
+    """
+    Read the ids, sources, HAS_PID relationships and shared Pids of the grouped products.
+
+    Returns:
+        tuple: (ids, sources, pids, shared_pids, member_pids): ids maps product hashes
+        to local_identifiers, sources, pids (the (scheme, Pid id) of every HAS_PID
+        relationship, in file order) and shared_pids are keyed by product hash, and
+        member_pids holds the Pid ids linked to the grouped products or their
+        manifestations
+    """
+    ids, sources, pids, shared_pids, member_pids = {}, {}, {}, {}, set()
+    for out in outputs:
+        for _, product in iter_rows(out.input("products")):
+            product_id = product.get("local_identifier")
+            if not isinstance(product_id, str):
+                continue
+            key = hash64(product_id)
+            if key in member_hashes:
+                ids[key] = product_id
+                source = product.get("source") or out.source
+                if source is not None:
+                    sources.setdefault(key, source)
+        for _, rel in iter_rows(out.input("relationships")):
+            if rel.get("type") != "HAS_PID" or not isinstance(rel.get("start"), str):
+                continue
+            key = hash64(rel["start"])
+            if hash64(owner_of(rel["start"])) in member_hashes:
+                member_pids.add(rel.get("end"))
+            if key not in member_hashes:
+                continue
+            pid = pid_of(rel)
+            if pid is None:
+                continue
+            ids.setdefault(key, rel["start"])
+            pids.setdefault(key, []).append((pid[0], rel["end"]))
+            if pid_key(pid) in shared:
+                shared_pids.setdefault(key, set()).add(f"{pid[0]}:{pid[1]}")
+    return ids, sources, pids, shared_pids, member_pids
+
+
+def plan_merges(groups: list, ids: dict, sources: dict, pids: dict, merge_sources=None,
+                max_group_size: int = DEFAULT_MAX_GROUP_SIZE):
+    """
+    Pick the survivor of every group and the HAS_PID relationships it takes over.
+
+    Args:
+        merge_sources: Sources whose products are merged into the survivor (None:
+            every other product of the group)
+        max_group_size: Groups of more products are skipped
+
+    Returns:
+        tuple: (survivor_of, moved_pids, tags, skipped): duplicate id -> survivor id,
+        the set of (duplicate id, Pid id) relationships moved to the survivor,
+        survivor id -> source taken from its duplicates, and the (reason, group) of
+        the groups left unmerged
+    """
+    survivor_of, moved_pids, tags, skipped = {}, set(), {}, []
+    for group in groups:
+        if len(group) > max_group_size:
+            skipped.append(("too_large", group))
+            continue
+        # pick_survivor: the product without source with the smallest local_identifier
+        no_source = [key for key in group if key not in sources]
+        if not no_source:
+            skipped.append(("no_product_without_source", group))
+            continue
+        survivor = min(no_source, key=ids.get)
+        schemes = {scheme for scheme, _ in pids.get(survivor, [])}
+        duplicates = group - {survivor}
+        if merge_sources is not None:
+            duplicates = {key for key in duplicates if sources.get(key) in merge_sources}
+        for duplicate in sorted(duplicates, key=ids.get):
+            survivor_of[ids[duplicate]] = ids[survivor]
+            # Only schemes the survivor does not have (yet)
+            added = {(scheme, end) for scheme, end in pids.get(duplicate, []) if scheme not in schemes}
+            moved_pids.update((ids[duplicate], end) for _, end in added)
+            schemes.update(scheme for scheme, _ in added)
+            if duplicate in sources:
+                tags.setdefault(ids[survivor], sources[duplicate])
+    return survivor_of, moved_pids, tags, skipped
+
+
+def write_skipped(skipped: list, ids: dict, path: str) -> None:
+    """TSV of the skipped groups: reason, size and the MAX_LISTED smallest local_identifiers."""
+    with open(path, "w", encoding="utf-8") as f:
+        for reason, group in skipped:
+            members = sorted(ids[key] for key in group if key in ids)
+            f.write(f"{reason}\t{len(group)}\t{' '.join(members[:MAX_LISTED])}\n")
+
+
+def rewrite_outputs(out: StagedOutputs, survivor_of: dict, moved_pids: set, tags: dict, member_pids: set,
+                    seen_edges: set) -> dict:
+    """
+    Write the deduplicated products outputs of one domain.
+
+    Only the Pids in member_pids can lose their relationships. seen_edges holds the
+    hashes of the relationships already written that touch a survivor, shared by the
+    domains so that moved relationships are written once.
+
+    Returns:
+        dict: counts of dropped products, manifestations, relationships and Pids and
+        of moved relationships
+    """
+    counts = {"products": 0, "manifestations": 0, "relationships": 0, "moved": 0, "identifiers": 0}
+    survivors = set(survivor_of.values())
+
+    with out.open_output("products") as f:
+        for line, product in iter_rows(out.input("products")):
+            product_id = product.get("local_identifier")
+            if product_id in survivor_of:
+                counts["products"] += 1
+                continue
+            source = product.get("source") or out.source or tags.get(product_id)
+            if source is not None and product.get("source") != source:
+                product["source"] = source
+                line = json.dumps(product) + "\n"
+            f.write(line)
+
+    with out.open_output("manifestations") as f:
+        for line, manifestation in iter_rows(out.input("manifestations")):
+            if owner_of(str(manifestation.get("local_identifier"))) in survivor_of:
+                counts["manifestations"] += 1
+                continue
+            f.write(line)
+
+    # Pids linked by a dropped relationship, kept only if another relationship uses them
+    dropped_pids, used_pids = set(), set()
+    with out.open_output("relationships") as f:
+        for line, rel in iter_rows(out.input("relationships")):
+            start, end = rel.get("start"), rel.get("end")
+            if not isinstance(start, str) or not isinstance(end, str):
+                f.write(line)
+                continue
+            owner = owner_of(start)
+            if owner in survivor_of and (owner != start or rel.get("type") == "HAS_MANIFESTATION"
+                                         or (rel.get("type") == "HAS_PID" and (start, end) not in moved_pids)):
+                # Manifestation edges, and the duplicate's HAS_PID for schemes the survivor has
+                counts["relationships"] += 1
+                if rel.get("type") == "HAS_PID":
+                    dropped_pids.add(end)
+                continue
+
+            new_start, new_end = survivor_of.get(start, start), survivor_of.get(end, end)
+            moved = new_start != start or new_end != end
+            if new_start in survivors or new_end in survivors:
+                if rel.get("rel_type") == "RELATED_PRODUCT" and new_start == new_end:
+                    counts["relationships"] += 1
+                    continue
+                edge_key = hash64(f"{new_start}\t{new_end}\t{rel.get('type')}\t{rel.get('rel_type')}")
+                if edge_key in seen_edges:
+                    counts["relationships"] += 1
+                    if rel.get("type") == "HAS_PID":
+                        dropped_pids.add(end)
+                    continue
+                seen_edges.add(edge_key)
+            if rel.get("type") == "HAS_PID" and end in member_pids:
+                used_pids.add(end)
+            if moved:
+                rel["start"], rel["end"] = new_start, new_end
+                line = json.dumps(rel) + "\n"
+                counts["moved"] += 1
+            f.write(line)
+
+    dropped_pids -= used_pids
+    with out.open_output("identifiers") as f:
+        for line, pid in iter_rows(out.input("identifiers")):
+            if pid.get("local_identifier") in dropped_pids:
+                counts["identifiers"] += 1
+                continue
+            f.write(line)
+    out.finish()
+    return counts
+
+
+def deduplicate(base_dirs: list, source_dirs: list = (), schemes=DEFAULT_SCHEMES, report_path="merge_report.tsv",
+                max_group_size: int = DEFAULT_MAX_GROUP_SIZE, skipped_path="skipped_groups.tsv") -> dict:
+    """
+    Deduplicate the products outputs of base_dirs and of the (source, base_dir) pairs.
+    With source_dirs, only the products of these sources are merged.
+
+    Returns:
+        dict: mapping duplicate local_identifier -> survivor local_identifier
+    """
+    outputs = [product_outputs(base_dir) for base_dir in base_dirs]
+    outputs += [product_outputs(base_dir, source) for source, base_dir in source_dirs]
+    for out in outputs:
+        out.stage()
+
+    groups, shared = group_products(outputs, set(schemes))
+    member_hashes = set().union(*groups) if groups else set()
+    ids, sources, pids, shared_pids, member_pids = collect_members(outputs, member_hashes, shared)
+    merge_sources = {source for source, _ in source_dirs} or None
+    survivor_of, moved_pids, tags, skipped = plan_merges(groups, ids, sources, pids, merge_sources, max_group_size)
+    print(f"Found {len(groups)} groups of products sharing a Pid ({', '.join(schemes)}): "
+          f"{len(survivor_of)} duplicates to merge")
+    write_skipped(skipped, ids, skipped_path)
+    for reason in ("too_large", "no_product_without_source"):
+        count = sum(1 for skipped_reason, _ in skipped if skipped_reason == reason)
+        if count:
+            print(f"Skipped {count} groups ({reason}, see {skipped_path})")
+
+    seen_edges = set()
+    for out in outputs:
+        counts = rewrite_outputs(out, survivor_of, moved_pids, tags, member_pids, seen_edges)
+        print(f"{out.dir}: dropped {counts['products']} products, {counts['manifestations']} manifestations, "
+              f"{counts['relationships']} relationships and {counts['identifiers']} Pids; "
+              f"moved {counts['moved']} relationships to survivors")
+
+    key_of = {product_id: key for key, product_id in ids.items()}
+    with open(report_path, "w", encoding="utf-8") as f:
+        for duplicate, survivor in sorted(survivor_of.items(), key=lambda item: (item[1], item[0])):
+            key = key_of[duplicate]
+            f.write(f"{survivor}\t{duplicate}\t{sources.get(key) or ''}\t{' '.join(sorted(shared_pids.get(key, ())))}\n")
+    print(f"Merge report written to {report_path}")
+    return survivor_of
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Merge the SKG-IF products sharing a Pid before loading them.")
+    parser.add_argument("base_dirs", nargs="*", metavar="base_dir",
+                        help="Domain directory whose to_load/products outputs are deduplicated")
+    parser.add_argument("--source", dest="source_dirs", action="append", default=[], type=space_dir,
+                        metavar="NAME=BASE_DIR",
+                        help="Domain directory whose products get source NAME (e.g. ebrains=/data/tmp/skgif_dumps/ebrains)")
+    parser.add_argument("--schemes", nargs="+", default=list(DEFAULT_SCHEMES),
+                        help="Pid schemes that identify a product (default: %(default)s)")
+    parser.add_argument("--report", default="merge_report.tsv",
+                        help="TSV of the merged products: survivor, duplicate, duplicate source, shared Pids")
+    parser.add_argument("--max-group-size", type=int, default=DEFAULT_MAX_GROUP_SIZE,
+                        help="Do not merge groups of more products than this (default: %(default)s)")
+    parser.add_argument("--skipped-report", default="skipped_groups.tsv",
+                        help="TSV of the groups left unmerged (too large, or without a product without source): "
+                             "reason, size, local_identifiers")
+    return parser
+
+
+def main() -> None:
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if not args.base_dirs and not args.source_dirs:
+        parser.error("give at least one base_dir or --source")
+    deduplicate(args.base_dirs, args.source_dirs, [scheme.lower() for scheme in args.schemes], args.report,
+                args.max_group_size, args.skipped_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Spec-driven engine shared by the SKG-IF parsers.
+
+Each parser describes its entity type with an EntitySpec: the node fields to
+copy, multilingual fields, flatteners for nested fields and edge emitters.
+compile_spec() turns a spec into one specialized function that converts a dump
+entity into node, Pid and relationship rows, and run() streams the dump files
+through it into buffered output sinks.
+
+Flatteners are called as flatten(entity, row) and add properties to the node row.
+Edge emitters are called as emit(entity, entity_id) and yield (sink, row) pairs,
+where sink is "relationships", "identifiers" or one of the spec's extra sinks.
+"""
+
+import gzip
+import json
+from pathlib import Path
+try:
+    from .utils import add_multilingual_fields, clean_empty, iter_graph, normalize_pid, Sampler
+except ImportError:  # script execution (no package)
+    from utils import add_multilingual_fields, clean_empty, iter_graph, normalize_pid, Sampler
+
+
+class EntitySpec:
+    """Declarative description of one entity type.
+    - name: output directory, node file and sampling entity set (e.g. "grants")
+    - input_dir: dump directory under <base_dir>/dump (e.g. "grants")
+    - fields: entity fields copied as-is onto the node
+    - multilingual: (source field, base key) pairs passed to add_multilingual_fields
+    - flatteners: functions adding derived properties (other than fields) to the node row
+    - prepare: functions normalising the entity in place before it is stored as _data
+    - edges: edge emitters, run in order after the node is written
+    - extra_sinks: additional node files written by the emitters (e.g. "manifestations")
+    - compress: write .jsonl.gz (True) or plain .jsonl (False) files
+    - sample_seed: this parser decides the sample (see utils.Sampler)
+    - report_by: entity field to break the final count down by
+    """
+
+    def __init__(
+        self,
+        name,
+        input_dir,
+        fields,
+        multilingual=(),
+        flatteners=(),
+        prepare=(),
+        edges=(),
+        extra_sinks=(),
+        compress=True,
+        sample_seed=False,
+        report_by=None,
+    ):
+        self.name = name
+        self.input_dir = input_dir
+        self.fields = tuple(fields)
+        self.multilingual = tuple(multilingual)
+        self.flatteners = tuple(flatteners)
+        self.prepare = tuple(prepare)
+        self.edges = tuple(edges)
+        self.extra_sinks = tuple(extra_sinks)
+        self.compress = compress
+        self.sample_seed = sample_seed
+        self.report_by = report_by
+
+
+class Sink:
+    """JSONL writer that serializes rows into a buffer and writes it in blocks."""
+
+    def __init__(self, path: Path, compress: bool, buffer_size: int = 1000, dumps=json.dumps):
+        self.path = path
+        self._dumps = dumps
+        if compress:
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+        self._buffer = []
+        self._buffer_size = buffer_size
+
+    def write(self, row: dict) -> None:
+        self._buffer.append(self._dumps(row))
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+def compile_spec(spec: EntitySpec, sinks: dict, sampler: Sampler):
+    """Build convert(entity) for a spec; it writes the entity's rows and returns whether it was kept."""
+    name = spec.name
+    fields = spec.fields
+    multilingual = spec.multilingual
+    flatteners = spec.flatteners
+    prepare = spec.prepare
+    edges = spec.edges
+    write_node = sinks[name].write
+    writers = {sink_name: sink.write for sink_name, sink in sinks.items()}
+    write_rel = writers["relationships"]
+    keep_entity = sampler.keep_entity
+    keep_edge = sampler.keep_edge
+    dumps = json.dumps
+
+    def convert(entity: dict) -> bool:
+        entity_id = entity.get("local_identifier")
+        if not keep_entity(name, entity_id):
+            return False
+
+        # Derived properties are built from the raw entity, then cleaned on their own
+        derived = {}
+        for source, base_key in multilingual:
+            add_multilingual_fields(derived, entity.get(source) or {}, base_key)
+        for flatten in flatteners:
+            flatten(entity, derived)
+        for normalise in prepare:
+            normalise(entity)
+
+        # The entity is cleaned once: whitelisted fields are taken from the cleaned
+        # copy, which also becomes _data, instead of re-cleaning the node row. The
+        # cleaned subtrees are cached for the edge rows, which only walk what they add.
+        cache = {}
+        cleaned = clean_empty(entity, cache)
+        row = {field: cleaned[field] for field in fields if field in cleaned}
+        row.update(clean_empty(derived))
+        # Store the complete original entity as a JSON string
+        row["_data"] = dumps(cleaned)
+        write_node(row)
+
+        for emit in edges:
+            for sink_name, edge_row in emit(entity, entity_id):
+                edge_row = clean_empty(edge_row, cache)
+                if not edge_row:
+                    continue
+                if sink_name == "relationships":
+                    if keep_edge(edge_row):
+                        write_rel(edge_row)
+                else:
+                    writers[sink_name](edge_row)
+        return True
+
+    return convert
+
+
+def run(spec: EntitySpec, base_dir, sample_rate=None) -> None:
+    """Stream <base_dir>/dump/<input_dir>/*.txt.gz through the compiled spec."""
+    input_dir = Path(base_dir) / "dump" / spec.input_dir
+    sampler = Sampler(base_dir, sample_rate, seed=spec.sample_seed)
+    output_dir = sampler.root / spec.name
+
+    print(f"\nProcessing directory: {input_dir}")
+    if not input_dir.exists():
+        print(f"Warning: Directory not found: {input_dir}")
+        return
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    suffix = ".jsonl.gz" if spec.compress else ".jsonl"
+    sink_names = (spec.name, "identifiers", "relationships") + spec.extra_sinks
+    sinks = {sink_name: Sink(output_dir / f"{sink_name}{suffix}", spec.compress) for sink_name in sink_names}
+    convert = compile_spec(spec, sinks, sampler)
+
+    counts = {}
+    report_by = spec.report_by
+    try:
+        for file in input_dir.glob("*.txt.gz"):
+            with gzip.open(file, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        for entity in iter_graph(line):
+                            if not isinstance(entity, dict) or not convert(entity):
+                                continue
+                            key = entity.get(report_by) if report_by else spec.name
+                            counts[key] = counts.get(key, 0) + 1
+                    except json.JSONDecodeError as e:
+                        print(f"Skipping invalid JSON in {file.name}: {e}")
+    finally:
+        for sink in sinks.values():
+            sink.close()
+    sampler.save()
+
+    if report_by:
+        print("\n=== Entity Type Report ===")
+        for key, count in sorted(counts.items(), key=lambda item: str(item[0])):
+            print(f"{key or 'None'}: {count}")
+        print("=======================")
+    else:
+        print(f"\n=== Processed {counts.get(spec.name, 0)} {spec.name} ===")
+    print("✅ Done. Output saved in:", output_dir)
+
+
+# ---------------------------------------------------------------------------
+# Reusable flatteners and edge emitters
+# ---------------------------------------------------------------------------
+
+def flatten_fields(field: str, mapping: dict):
+    """Copy truthy values of a nested object onto the node, e.g. duration.start -> duration_start."""
+    def flatten(entity, row):
+        nested = entity.get(field)
+        if nested:
+            for key, target in mapping.items():
+                if nested.get(key):
+                    row[target] = nested[key]
+    return flatten
+
+
+def json_fields(*names: str):
+    """Store nested fields on the node as JSON strings."""
+    def flatten(entity, row):
+        for field in names:
+            if entity.get(field):
+                row[field] = json.dumps(entity[field])
+    return flatten
+
+
+def pid_rows(owner_id, identifiers, scheme_on_edge: bool = True):
+    """Yield the Pid node and HAS_PID edge rows for a list of identifiers.
+
+    Pid nodes carry the normalised scheme and value (utils.normalize_pid) as
+    normalized_scheme and normalized_value, matched with the (normalized_scheme,
+    normalized_value) index of load-all.cypher.
+    """
+    for identifier in identifiers or []:
+        pid_id = f"{identifier.get('scheme')}:{identifier.get('value')}"
+        normalized = normalize_pid(identifier.get("scheme"), identifier.get("value"))
+        yield "identifiers", {
+            "local_identifier": pid_id,
+            "scheme": identifier.get("scheme"),
+            "value": identifier.get("value"),
+            "normalized_scheme": normalized[0] if normalized else None,
+            "normalized_value": normalized[1] if normalized else None,
+        }
+        rel = {
+            "start": owner_id,
+            "end": pid_id,
+            "type": "HAS_PID",
+        }
+        if scheme_on_edge:
+            rel["scheme"] = identifier.get("scheme")
+        yield "relationships", rel
+
+
+def pid_edges(scheme_on_edge: bool = True):
+    """Emit Pid nodes and HAS_PID edges for the entity's identifiers."""
+    def emit(entity, entity_id):
+        return pid_rows(entity_id, entity.get("identifiers"), scheme_on_edge)
+    return emit
+
+
+def reference_edge(field: str, rel_type: str):
+    """Emit entity -[rel_type]-> value for a single id-valued field."""
+    def emit(entity, entity_id):
+        if entity.get(field):
+            yield "relationships", {"start": entity_id, "end": entity[field], "type": rel_type}
+    return emit
+
+
+def reference_edges(field: str, rel_type: str):
+    """Emit entity -[rel_type]-> target for every id in a list field."""
+    def emit(entity, entity_id):
+        for target in entity.get(field) or []:
+            yield "relationships", {"start": entity_id, "end": target, "type": rel_type}
+    return emit
+
+
+def contribution_edges(*properties: str):
+    """Emit agent -[HAS_CONTRIBUTED_TO]-> entity for every contribution, keeping the given properties."""
+    def emit(entity, entity_id):
+        for contribution in entity.get("contributions") or []:
+            yield "relationships", {
+                "start": contribution.get("by"),
+                "end": entity_id,
+                "type": "HAS_CONTRIBUTED_TO",
+                "properties": {prop: contribution.get(prop) for prop in properties},
+            }
+    return emit
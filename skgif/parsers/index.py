@@ -0,0 +1,419 @@
+"""
+Lookup index over the parser outputs in <base_dir>/to_load.
+
+`build` writes, into <base_dir>/to_load/_index, two sorted tables of fixed-width
+records (key hash, file id, byte offset, length):
+  - nodes.idx: entity, manifestation and Pid records keyed by local_identifier
+  - edges.idx: relationship records keyed by both their start and their end
+plus files.json, which maps file ids to output files. The tables are
+memory-mapped and binary-searched, so a lookup costs a few dozen record reads
+instead of a scan of multi-GB JSONL files.
+
+`build-doi` writes doi.idx (and doi_files.json): the products' HAS_PID
+relationships to DOI Pids, keyed by the normalised DOI. DoiIndex resolves a DOI
+to Product local_identifiers, so that enrichment inputs keyed by DOI can be
+turned into Product ids offline instead of matching Pid nodes in the loaders.
+
+Compressed outputs (*.jsonl.gz) are decompressed next to the original, as the
+loader expects, so that records can be addressed by byte offset.
+
+Usage:
+  python3 parsers/index.py build <base_dir>
+  python3 parsers/index.py get <base_dir> <local_identifier>
+  python3 parsers/index.py edges <base_dir> <local_identifier>
+  python3 parsers/index.py build-doi <base_dir>
+  python3 parsers/index.py doi <base_dir> <doi>
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import re
+import shutil
+import struct
+from functools import lru_cache
+from pathlib import Path
+try:
+    from .utils import external_sort, hash64, normalize_pid
+except ImportError:  # script execution (no package)
+    from utils import external_sort, hash64, normalize_pid
+
+RECORD_FORMAT = "<QIQI"  # key hash, file id, byte offset, length
+RECORD = struct.Struct(RECORD_FORMAT)
+KEY_HASH = struct.Struct("<Q")
+
+NODE_FILES = {
+    "agents", "grants", "venues", "topics", "datasources",
+    "products", "manifestations", "identifiers",
+}
+RELATIONSHIP_FILE = "relationships"
+PRODUCTS_DIR = "products"
+# Manifestations carry their own HAS_PID edges, but only Products resolve DOIs
+MANIFESTATION_ID = re.compile(r":manifestation:\d+$")
+
+
+def index_dir(base_dir) -> Path:
+    return Path(base_dir) / "to_load" / "_index"
+
+
+def normalize_doi(doi) -> str:
+    """DOI key of the index: the Pid.normalized_value of a DOI (utils.normalize_pid)."""
+    normalized = normalize_pid("doi", doi)
+    return normalized[1] if normalized else ""
+
+
+def collect_output_files(to_load: Path, dirs=None) -> list:
+    """Return the plain JSONL outputs to index, decompressing *.jsonl.gz files when needed."""
+    plain_files = set()
+    for path in sorted(to_load.glob("*/*.jsonl*")):
+        if path.parent.name.startswith("_"):
+            continue
+        if dirs is not None and path.parent.name not in dirs:
+            continue
+        if path.name.endswith(".jsonl.gz"):
+            plain = path.with_suffix("")
+            if not plain.exists() or plain.stat().st_mtime < path.stat().st_mtime:
+                print(f"Decompressing {path}")
+                with gzip.open(path, "rb") as src, open(plain, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 16 * 1024 * 1024)
+            path = plain
+        elif not path.name.endswith(".jsonl"):
+            continue
+        stem = path.name[:-len(".jsonl")]
+        if stem in NODE_FILES or stem == RELATIONSHIP_FILE:
+            plain_files.add(path)
+    return sorted(plain_files)
+
+
+def iter_records(path: Path):
+    """Yield (byte offset, length, decoded record) for every line of a JSONL file."""
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            length = len(line)
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping invalid JSON in {path.name} at byte {offset}: {e}")
+                record = None
+            if isinstance(record, dict):
+                yield offset, length, record
+            offset += length
+
+
+def iter_node_entries(files: list):
+    for file_id, path in files:
+        for offset, length, record in iter_records(path):
+            key = record.get("local_identifier")
+            if key is not None:
+                yield hash64(str(key)), file_id, offset, length
+
+
+def iter_edge_entries(files: list):
+    for file_id, path in files:
+        for offset, length, record in iter_records(path):
+            start, end = record.get("start"), record.get("end")
+            if start is not None:
+                yield hash64(str(start)), file_id, offset, length
+            if end is not None and end != start:
+                yield hash64(str(end)), file_id, offset, length
+
+
+def doi_pid_value(record: dict):
+    """Return the DOI of a product HAS_PID record, or None for any other record."""
+    if record.get("type") != "HAS_PID" or str(record.get("scheme", "")).strip().lower() != "doi":
+        return None
+    start, end = record.get("start"), record.get("end")
+    if not isinstance(start, str) or not isinstance(end, str) or MANIFESTATION_ID.search(start):
+        return None
+    # Pid local identifiers are "<scheme>:<value>"
+    value = end.split(":", 1)[1] if ":" in end else ""
+    if value in ("", "None"):
+        return None
+    return value
+
+
+def iter_doi_entries(files: list):
+    for file_id, path in files:
+        for offset, length, record in iter_records(path):
+            value = doi_pid_value(record)
+            if value is not None:
+                yield hash64(normalize_doi(value)), file_id, offset, length
+
+
+def write_table(entries, path: Path) -> int:
+    count = 0
+    buffer = []
+    with open(path, "wb") as f:
+        for entry in external_sort(entries, RECORD_FORMAT):
+            buffer.append(RECORD.pack(*entry))
+            count += 1
+            if len(buffer) >= 65536:
+                f.write(b"".join(buffer))
+                buffer = []
+        f.write(b"".join(buffer))
+    return count
+
+
+def build_index(base_dir) -> None:
+    to_load = Path(base_dir) / "to_load"
+    out_dir = index_dir(base_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    files = collect_output_files(to_load)
+    node_files = [(i, p) for i, p in enumerate(files) if p.name != f"{RELATIONSHIP_FILE}.jsonl"]
+    edge_files = [(i, p) for i, p in enumerate(files) if p.name == f"{RELATIONSHIP_FILE}.jsonl"]
+
+    with open(out_dir / "files.json", "w", encoding="utf-8") as f:
+        json.dump([str(p.relative_to(to_load)) for p in files], f, indent=2)
+
+    node_count = write_table(iter_node_entries(node_files), out_dir / "nodes.idx")
+    print(f"Indexed {node_count} node records from {len(node_files)} files")
+    edge_count = write_table(iter_edge_entries(edge_files), out_dir / "edges.idx")
+    print(f"Indexed {edge_count} edge endpoints from {len(edge_files)} files")
+    print("✅ Done. Index saved in:", out_dir)
+
+
+def build_doi_index(base_dir) -> None:
+    to_load = Path(base_dir) / "to_load"
+    out_dir = index_dir(base_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    files = [p for p in collect_output_files(to_load, dirs={PRODUCTS_DIR}) if p.name == f"{RELATIONSHIP_FILE}.jsonl"]
+    if not files:
+        print(f"Warning: no {PRODUCTS_DIR}/{RELATIONSHIP_FILE}.jsonl found in {to_load}")
+
+    with open(out_dir / "doi_files.json", "w", encoding="utf-8") as f:
+        json.dump([str(p.relative_to(to_load)) for p in files], f, indent=2)
+
+    doi_count = write_table(iter_doi_entries(list(enumerate(files))), out_dir / "doi.idx")
+    print(f"Indexed {doi_count} product DOIs")
+    print("✅ Done. Index saved in:", out_dir)
+
+
+class LookupIndex:
+    """Read-only view over an index built by build_index().
+
+    Example:
+        with LookupIndex("/data/tmp/skgif_dumps/neuroscience") as index:
+            index.get(product_id)     # node records with this local_identifier
+            index.edges(product_id)   # relationships starting or ending at it
+    """
+
+    def __init__(self, base_dir):
+        self.to_load = Path(base_dir) / "to_load"
+        in_dir = index_dir(base_dir)
+        with open(in_dir / "files.json", encoding="utf-8") as f:
+            self.files = [self.to_load / p for p in json.load(f)]
+        self._handles = []
+        self._nodes = self._map(in_dir / "nodes.idx")
+        self._edges = self._map(in_dir / "edges.idx")
+        self._data = {}
+
+    def _map(self, path: Path):
+        f = open(path, "rb")
+        self._handles.append(f)
+        if path.stat().st_size == 0:
+            return None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._handles.append(mapped)
+        return mapped
+
+    def _find(self, table, key: str):
+        """Yield (file id, offset, length) of the records whose key hashes like `key`."""
+        if table is None:
+            return
+        key_hash = hash64(key)
+        lo, hi = 0, len(table) // RECORD.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY_HASH.unpack_from(table, mid * RECORD.size)[0] < key_hash:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo * RECORD.size < len(table):
+            entry_hash, file_id, offset, length = RECORD.unpack_from(table, lo * RECORD.size)
+            if entry_hash != key_hash:
+                return
+            yield file_id, offset, length
+            lo += 1
+
+    def _read(self, file_id: int, offset: int, length: int) -> dict:
+        data = self._data.get(file_id)
+        if data is None:
+            data = self._map(self.files[file_id])
+            self._data[file_id] = data
+        return json.loads(data[offset:offset + length])
+
+    def get(self, local_identifier: str) -> list:
+        """Return every node record (entity, manifestation or Pid) with this local_identifier."""
+        records = []
+        for file_id, offset, length in self._find(self._nodes, local_identifier):
+            record = self._read(file_id, offset, length)
+            # Hash collisions are resolved against the record itself
+            if record.get("local_identifier") == local_identifier:
+                records.append(record)
+        return records
+
+    def edges(self, local_identifier: str) -> list:
+        """Return every relationship record that starts or ends at this local_identifier."""
+        records = []
+        for file_id, offset, length in self._find(self._edges, local_identifier):
+            record = self._read(file_id, offset, length)
+            if local_identifier in (record.get("start"), record.get("end")):
+                records.append(record)
+        return records
+
+    def close(self) -> None:
+        for handle in reversed(self._handles):
+            handle.close()
+        self._handles = []
+        self._data = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DoiIndex(LookupIndex):
+    """Read-only DOI -> Product local_identifier view over an index built by build_doi_index().
+
+    Example:
+        with DoiIndex("/data/tmp/skgif_dumps/neuroscience") as index:
+            index.resolve("10.1000/xyz")   # local_identifiers of the Products with this DOI
+    """
+
+    def __init__(self, base_dir, cache_size: int = 1 << 20):
+        self.to_load = Path(base_dir) / "to_load"
+        in_dir = index_dir(base_dir)
+        with open(in_dir / "doi_files.json", encoding="utf-8") as f:
+            self.files = [self.to_load / p for p in json.load(f)]
+        self._handles = []
+        self._nodes = None
+        self._edges = None
+        self._dois = self._map(in_dir / "doi.idx")
+        self._data = {}
+        # Citation inputs repeat the same cited DOIs many times
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, doi: str) -> tuple:
+        key = normalize_doi(doi)
+        product_ids = []
+        for file_id, offset, length in self._find(self._dois, key):
+            record = self._read(file_id, offset, length)
+            value = doi_pid_value(record)
+            if value is not None and normalize_doi(value) == key and record["start"] not in product_ids:
+                product_ids.append(record["start"])
+        return tuple(product_ids)
+
+
+class DoiResolver:
+    """Resolves DOIs per space (pilot graph), counting rows and collecting unresolved DOIs.
+
+    space_dirs maps a space name to the base_dir of its pilot graph; spaces without
+    an entry are not resolved (covers() is False) and keep their DOI-only output.
+    """
+
+    def __init__(self, space_dirs: dict):
+        self.indexes = {space: DoiIndex(base_dir) for space, base_dir in space_dirs.items()}
+        self.resolved = {space: 0 for space in space_dirs}
+        self.unresolved = {space: {} for space in space_dirs}
+
+    def covers(self, space) -> bool:
+        return space in self.indexes
+
+    def resolve(self, space, doi) -> tuple:
+        product_ids = self.indexes[space].resolve(doi)
+        if product_ids:
+            self.resolved[space] += 1
+        else:
+            missing = self.unresolved[space]
+            missing[doi] = missing.get(doi, 0) + 1
+        return product_ids
+
+    def merge(self, resolved: dict, unresolved: dict) -> None:
+        """Add the counts of another resolver, e.g. one used by a worker process."""
+        for space, count in resolved.items():
+            self.resolved[space] += count
+        for space, missing in unresolved.items():
+            merged = self.unresolved[space]
+            for doi, count in missing.items():
+                merged[doi] = merged.get(doi, 0) + count
+
+    def write_report(self, output_dir) -> None:
+        """Write <space>_unresolved_dois.tsv (DOI, number of lookups) and print a summary per space."""
+        for space, missing in self.unresolved.items():
+            safe_space = re.sub(r"[/\\\s]+", "_", str(space))
+            path = Path(output_dir) / f"{safe_space}_unresolved_dois.tsv"
+            with open(path, "w", encoding="utf-8") as f:
+                for doi, count in sorted(missing.items(), key=lambda item: (-item[1], str(item[0]))):
+                    f.write(f"{doi}\t{count}\n")
+            lookups = sum(missing.values())
+            print(f"{space}: {self.resolved[space]} DOI lookups resolved, {lookups} unresolved "
+                  f"({len(missing)} distinct DOIs, see {path})")
+
+    def close(self) -> None:
+        for index in self.indexes.values():
+            index.close()
+
+
+def space_dir(value: str) -> tuple:
+    """argparse type for SPACE=BASE_DIR values; returns (space, base_dir)."""
+    space, sep, base_dir = value.partition("=")
+    if not sep or not space or not base_dir:
+        raise argparse.ArgumentTypeError(f"expected SPACE=BASE_DIR, got {value!r}")
+    return space, base_dir
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Build or query the lookup index over SKG-IF parser outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Index the outputs in <base_dir>/to_load")
+    build.add_argument("base_dir")
+
+    get = subparsers.add_parser("get", help="Print the node records with this local_identifier")
+    get.add_argument("base_dir")
+    get.add_argument("local_identifier")
+
+    edges = subparsers.add_parser("edges", help="Print the relationships starting or ending at this local_identifier")
+    edges.add_argument("base_dir")
+    edges.add_argument("local_identifier")
+
+    build_doi = subparsers.add_parser("build-doi", help="Index the products' DOIs in <base_dir>/to_load")
+    build_doi.add_argument("base_dir")
+
+    doi = subparsers.add_parser("doi", help="Print the Product local_identifiers with this DOI")
+    doi.add_argument("base_dir")
+    doi.add_argument("doi")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    if args.command == "build":
+        build_index(args.base_dir)
+        return
+    if args.command == "build-doi":
+        build_doi_index(args.base_dir)
+        return
+    if args.command == "doi":
+        with DoiIndex(args.base_dir) as index:
+            for product_id in index.resolve(args.doi):
+                print(product_id)
+        return
+
+    with LookupIndex(args.base_dir) as index:
+        if args.command == "get":
+            records = index.get(args.local_identifier)
+        else:
+            records = index.edges(args.local_identifier)
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
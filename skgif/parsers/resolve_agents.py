@@ -0,0 +1,248 @@
+"""
+Offline resolution of the Agents that share a persistent identifier.
+
+The same researcher or organisation reaches a graph as several Agent records,
+from several dumps or sources, each with its own local_identifier but sharing
+ORCID, ROR or other identifiers. This stage rewrites the parser outputs of one or
+more domains in <base_dir>/to_load so that each of them is loaded as one Agent:
+
+  1. The Pids of the agents' HAS_PID relationships are normalised (scheme case,
+     orcid.org/ror.org prefixes, case) and agents sharing a Pid of the selected
+     schemes are grouped with a union-find over integer-encoded (hashed) ids. The
+     (Pid, agent) pairs are sorted on disk, so only the agents sharing a Pid are
+     held in memory.
+  2. Each group keeps the agent with the smallest local_identifier as canonical
+     agent; the others become its aliases. Groups of more than --max-group-size
+     agents are skipped (a Pid wrongly shared by many records would chain
+     unrelated agents together) and listed in the skipped report.
+  3. Aliases are dropped from agents.jsonl and every reference to them in the
+     relationships of all parsers (HAS_PID, AFFILIATED_WITH, HAS_CONTRIBUTED_TO and
+     its declared_affiliations, IS_RELEVANT_TO, HAS_BENEFICIARY,
+     HAS_FUNDING_AGENCY) is moved to the canonical agent, removing the copies this
+     creates.
+
+The alias mapping (alias, canonical agent, shared Pids) is written to
+agent_aliases.tsv. The parser outputs are kept in <dir>/_pre_resolve/ and read
+from there by later runs, until the parser or dedup.py writes new outputs. Run the stage after
+dedup.py, and rebuild the lookup indexes (index.py) afterwards.
+
+Usage:
+  python3 parsers/resolve_agents.py <base_dir> [<base_dir> ...] [--schemes orcid ror] [--aliases agent_aliases.tsv]
+                                    [--max-group-size 50] [--skipped-report skipped_agent_groups.tsv]
+"""
+
+import argparse
+import json
+from pathlib import Path
+try:
+    from .dedup import DEFAULT_MAX_GROUP_SIZE, STAGE_BACKUPS, StagedOutputs, iter_rows, write_skipped
+    from .utils import RELATIONSHIP_TARGETS, hash64, normalize_pid, shared_key_groups
+except ImportError:  # script execution (no package)
+    from dedup import DEFAULT_MAX_GROUP_SIZE, STAGE_BACKUPS, StagedOutputs, iter_rows, write_skipped
+    from utils import RELATIONSHIP_TARGETS, hash64, normalize_pid, shared_key_groups
+
+DEFAULT_SCHEMES = ("orcid", "ror", "isni", "grid", "wikidata")
+AGENTS_DIR = "agents"
+ENTITY_DIRS = ("agents", "grants", "venues", "topics", "datasources", "products")
+BACKUP_DIR = STAGE_BACKUPS[1]
+PAIR_FORMAT = "<QQ"  # Pid hash, agent hash
+
+# Endpoints holding an agent id, per relationship type (HAS_PID only in agents/)
+AGENT_ENDPOINTS = {
+    rel_type: (endpoint,) for rel_type, (endpoint, entity_set) in RELATIONSHIP_TARGETS.items()
+    if entity_set == "agents"
+}
+AGENT_ENDPOINTS["AFFILIATED_WITH"] = ("start", "end")
+
+
+def agent_pid(rel: dict):
+    """Return the normalised (scheme, value) of an agent HAS_PID relationship, or None."""
+    if rel.get("type") != "HAS_PID" or not isinstance(rel.get("start"), str) or not isinstance(rel.get("end"), str):
+        return None
+    # Pid local identifiers are "<scheme>:<value>" (agent relationships carry no scheme)
+    prefix, _, value = rel["end"].partition(":")
+    return normalize_pid(rel.get("scheme") or prefix, value)
+
+
+def stage_outputs(base_dirs: list) -> tuple:
+    """Stage the agents outputs and the relationships of every entity directory of base_dirs."""
+    agents, relationships = [], []
+    for base_dir in base_dirs:
+        to_load = Path(base_dir) / "to_load"
+        if not (to_load / AGENTS_DIR).is_dir():
+            print(f"{to_load / AGENTS_DIR} not found: only the agent references of {to_load} are resolved")
+        for name in ENTITY_DIRS:
+            if not (to_load / name).is_dir():
+                continue
+            stems = ("agents", "relationships") if name == AGENTS_DIR else ("relationships",)
+            out = StagedOutputs(to_load / name, stems, BACKUP_DIR)
+            out.stage()
+            relationships.append(out)
+            if name == AGENTS_DIR:
+                agents.append(out)
+    return agents, relationships
+
+
+def group_agents(agents: list, schemes: set):
+    """Union-find over the agents sharing a normalised Pid (see utils.shared_key_groups)."""
+    def pairs():
+        for out in agents:
+            for _, rel in iter_rows(out.input("relationships")):
+                pid = agent_pid(rel)
+                if pid is not None and pid[0] in schemes:
+                    yield hash64(f"{pid[0]}:{pid[1]}"), hash64(rel["start"])
+
+    return shared_key_groups(pairs(), PAIR_FORMAT)
+
+
+def plan_aliases(agents: list, groups: list, shared: set, max_group_size: int = DEFAULT_MAX_GROUP_SIZE):
+    """
+    Pick the canonical agent of every group of at most max_group_size agents.
+
+    Returns:
+        tuple: (canonical_of, shared_pids, ids, skipped): alias id -> canonical agent
+        id, alias id -> the shared Pids linking it to its group, agent hash -> id,
+        and the skipped (reason, group) pairs as dedup.plan_merges returns them
+    """
+    member_hashes = set().union(*groups) if groups else set()
+    ids, pids = {}, {}
+    for out in agents:
+        for _, rel in iter_rows(out.input("relationships")):
+            pid = agent_pid(rel)
+            if pid is None:
+                continue
+            key = hash64(rel["start"])
+            if key not in member_hashes:
+                continue
+            ids[key] = rel["start"]
+            if hash64(f"{pid[0]}:{pid[1]}") in shared:
+                pids.setdefault(key, set()).add(f"{pid[0]}:{pid[1]}")
+
+    canonical_of, shared_pids, skipped = {}, {}, []
+    for group in groups:
+        if len(group) > max_group_size:
+            skipped.append(("too_large", group))
+            continue
+        canonical = min(group, key=ids.get)
+        for alias in group - {canonical}:
+            canonical_of[ids[alias]] = ids[canonical]
+            shared_pids[ids[alias]] = sorted(pids.get(alias, ()))
+    return canonical_of, shared_pids, ids, skipped
+
+
+def rewrite_relationships(out: StagedOutputs, canonical_of: dict, seen_edges: set) -> dict:
+    """
+    Write the relationships of one entity directory with aliases replaced by their
+    canonical agent. seen_edges holds the hashes of the relationships already written
+    that touch a canonical agent, shared by all directories.
+
+    Returns:
+        dict: counts of moved and dropped (duplicate) relationships
+    """
+    counts = {"moved": 0, "dropped": 0}
+    canonicals = set(canonical_of.values())
+    agents_dir = out.dir.name == AGENTS_DIR
+    with out.open_output("relationships") as f:
+        for line, rel in iter_rows(out.input("relationships")):
+            rel_type = rel.get("type")
+            endpoints = AGENT_ENDPOINTS.get(rel_type, ())
+            if agents_dir and rel_type == "HAS_PID":
+                endpoints = ("start",)
+            moved = False
+            for endpoint in endpoints:
+                canonical = canonical_of.get(rel.get(endpoint))
+                if canonical is not None:
+                    rel[endpoint] = canonical
+                    moved = True
+            affiliations = (rel.get("properties") or {}).get("declared_affiliations")
+            if isinstance(affiliations, list) and any(agent in canonical_of for agent in affiliations):
+                resolved = []
+                for agent in affiliations:
+                    agent = canonical_of.get(agent, agent)
+                    if agent not in resolved:
+                        resolved.append(agent)
+                rel["properties"]["declared_affiliations"] = resolved
+                moved = True
+
+            if any(rel.get(endpoint) in canonicals for endpoint in endpoints):
+                if rel_type == "AFFILIATED_WITH" and rel.get("start") == rel.get("end"):
+                    counts["dropped"] += 1
+                    continue
+                edge_key = hash64(f"{rel.get('start')}\t{rel.get('end')}\t{rel_type}")
+                if edge_key in seen_edges:
+                    counts["dropped"] += 1
+                    continue
+                seen_edges.add(edge_key)
+            if moved:
+                line = json.dumps(rel) + "\n"
+                counts["moved"] += 1
+            f.write(line)
+    return counts
+
+
+def resolve_agents(base_dirs: list, schemes=DEFAULT_SCHEMES, aliases_path="agent_aliases.tsv",
+                   max_group_size: int = DEFAULT_MAX_GROUP_SIZE, skipped_path="skipped_agent_groups.tsv") -> dict:
+    """
+    Resolve the agents of base_dirs sharing a Pid and rewrite their references.
+
+    Returns:
+        dict: mapping alias local_identifier -> canonical agent local_identifier
+    """
+    agents, relationships = stage_outputs(base_dirs)
+    if not agents:
+        raise FileNotFoundError("No to_load/agents directory found: run 1_agents.py first")
+    groups, shared = group_agents(agents, set(schemes))
+    canonical_of, shared_pids, ids, skipped = plan_aliases(agents, groups, shared, max_group_size)
+    print(f"Found {len(groups)} groups of agents sharing a Pid ({', '.join(schemes)}): "
+          f"{len(canonical_of)} aliases to resolve")
+    write_skipped(skipped, ids, skipped_path)
+    if skipped:
+        print(f"Skipped {len(skipped)} groups (too_large, see {skipped_path})")
+
+    for out in agents:
+        dropped = 0
+        with out.open_output("agents") as f:
+            for line, agent in iter_rows(out.input("agents")):
+                if agent.get("local_identifier") in canonical_of:
+                    dropped += 1
+                    continue
+                f.write(line)
+        print(f"{out.dir}: dropped {dropped} aliased agents")
+
+    seen_edges = set()
+    for out in relationships:
+        counts = rewrite_relationships(out, canonical_of, seen_edges)
+        print(f"{out.dir}: moved {counts['moved']} relationships to canonical agents, "
+              f"dropped {counts['dropped']} duplicates")
+        out.finish()
+
+    with open(aliases_path, "w", encoding="utf-8") as f:
+        for alias, canonical in sorted(canonical_of.items(), key=lambda item: (item[1], item[0])):
+            f.write(f"{alias}\t{canonical}\t{' '.join(shared_pids[alias])}\n")
+    print(f"Alias mapping written to {aliases_path}")
+    return canonical_of
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Resolve the SKG-IF agents sharing a Pid before loading them.")
+    parser.add_argument("base_dirs", nargs="+", metavar="base_dir",
+                        help="Domain directory whose to_load outputs are rewritten")
+    parser.add_argument("--schemes", nargs="+", default=list(DEFAULT_SCHEMES),
+                        help="Pid schemes that identify an agent (default: %(default)s)")
+    parser.add_argument("--aliases", default="agent_aliases.tsv",
+                        help="TSV of the alias mapping: alias, canonical agent, shared Pids")
+    parser.add_argument("--max-group-size", type=int, default=DEFAULT_MAX_GROUP_SIZE,
+                        help="Do not resolve groups of more agents than this (default: %(default)s)")
+    parser.add_argument("--skipped-report", default="skipped_agent_groups.tsv",
+                        help="TSV of the groups left unresolved: reason, size, local_identifiers")
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    resolve_agents(args.base_dirs, [scheme.lower() for scheme in args.schemes], args.aliases,
+                   args.max_group_size, args.skipped_report)
+
+
+if __name__ == "__main__":
+    main()
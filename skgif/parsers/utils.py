@@ -1,3 +1,43 @@
+import argparse
+import hashlib
+import heapq
+import json
+import re
+import struct
+import tempfile
+from pathlib import Path
+
+# Dump lines longer than this many characters are scanned incrementally by
+# iter_graph() instead of being decoded with a single json.loads() call.
+GRAPH_STREAM_THRESHOLD = 8 * 1024 * 1024
+
+# Entity set referenced by each relationship type, as (endpoint, entity set).
+# Sampling mode keeps an edge only when this endpoint was sampled too.
+RELATIONSHIP_TARGETS = {
+    "AFFILIATED_WITH": ("end", "agents"),
+    "HAS_BENEFICIARY": ("end", "agents"),
+    "HAS_FUNDING_AGENCY": ("end", "agents"),
+    "HAS_CONTRIBUTED_TO": ("start", "agents"),
+    "IS_RELEVANT_TO": ("end", "agents"),
+    "FUNDED_BY": ("end", "grants"),
+    "HAS_TOPIC": ("end", "topics"),
+    "HOSTED_BY": ("end", "datasources"),
+    "PUBLISHED_IN": ("end", "venues"),
+}
+SAMPLED_SETS = ("agents", "grants", "venues", "topics", "datasources")
+
+# Resolver prefixes stripped from Pid values, per scheme
+PID_PREFIXES = {
+    "doi": ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/", "doi:"),
+    "orcid": ("https://orcid.org/", "http://orcid.org/", "orcid:"),
+    "ror": ("https://ror.org/", "http://ror.org/", "ror:"),
+    "pmid": ("pmid:",),
+}
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
 def add_multilingual_fields(target: dict, source: dict, base_key: str) -> None:
     """Populate target with multilingual values from source.
     - If source contains key 'none', set target[base_key] to the first element if list, else the value.
@@ -22,33 +62,388 @@ def add_multilingual_fields(target: dict, source: dict, base_key: str) -> None:
             target[f"{base_key}_{lang}"] = vals
 
 
-def clean_empty(value):
+def clean_empty(value, cache=None):
     """Recursively remove null/empty values from dicts and lists.
     Rules:
     - Drop keys with value None, "", empty list [], or empty dict {}.
     - For lists, clean each element and drop elements that become empty; drop list if ends empty.
     - Keep falsy but meaningful values like 0 or False.
+    Scalars are checked in place; only nested dicts and lists are recursed into, so
+    flat records (Pid and relationship rows) are cleaned in a single loop.
+
+    cache is an optional dict shared by the calls cleaning the rows of one record:
+    the dicts and lists cleaned through it are reused instead of walked again when
+    they reappear in a later row (e.g. the edge rows built from an entity's subtrees).
     """
+    if cache is not None:
+        return _clean_cached(value, cache)
     if isinstance(value, dict):
         cleaned = {}
         for k, v in value.items():
-            cv = clean_empty(v)
-            if cv is None:
-                continue
-            if cv == "":
-                continue
-            if isinstance(cv, (list, dict)) and not cv:
+            if v is None or v == "":
                 continue
-            cleaned[k] = cv
+            if isinstance(v, (dict, list)):
+                v = clean_empty(v)
+                if not v:
+                    continue
+            cleaned[k] = v
         return cleaned
     if isinstance(value, list):
         cleaned_list = []
         for item in value:
-            ci = clean_empty(item)
-            if ci is None or ci == "":
+            if item is None or item == "":
                 continue
-            if isinstance(ci, (list, dict)) and not ci:
-                continue
-            cleaned_list.append(ci)
+            if isinstance(item, (dict, list)):
+                item = clean_empty(item)
+                if not item:
+                    continue
+            cleaned_list.append(item)
         return cleaned_list
     return value
+
+
+def _clean_cached(value, cache: dict):
+    """clean_empty() memoised by object id. The entries keep a reference to the
+    cleaned object, so its id cannot be reused by another object while the cache lives."""
+    if not isinstance(value, (dict, list)):
+        return value
+    entry = cache.get(id(value))
+    if entry is not None and entry[0] is value:
+        return entry[1]
+    if isinstance(value, dict):
+        cleaned = {}
+        for k, v in value.items():
+            if v is None or v == "":
+                continue
+            if isinstance(v, (dict, list)):
+                v = _clean_cached(v, cache)
+                if not v:
+                    continue
+            cleaned[k] = v
+    else:
+        cleaned = []
+        for item in value:
+            if item is None or item == "":
+                continue
+            if isinstance(item, (dict, list)):
+                item = _clean_cached(item, cache)
+                if not item:
+                    continue
+            cleaned.append(item)
+    cache[id(value)] = (value, cleaned)
+    return cleaned
+
+
+def iter_graph(line: str, threshold: int = GRAPH_STREAM_THRESHOLD):
+    """Yield the items of the "@graph" array of a single dump line.
+    - Lines shorter than `threshold` are decoded with json.loads().
+    - Longer lines are scanned incrementally: the "@graph" items are decoded and
+      yielded one at a time, so the whole array is never held in memory.
+    - A "@graph" holding a single object (seen in the EBRAINS dumps) yields that
+      object; lines that are not objects or whose "@graph" is neither a list nor
+      an object yield nothing.
+    Malformed JSON raises json.JSONDecodeError, in streaming mode only once the
+    scanner reaches it (items before that point have already been yielded).
+    """
+    if len(line) < threshold:
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            return
+        graph = data.get("@graph", [])
+        if isinstance(graph, dict):
+            graph = [graph]
+        elif not isinstance(graph, list):
+            return
+        yield from graph
+        return
+
+    pos = _WHITESPACE.match(line, 0).end()
+    if not line.startswith("{", pos):
+        return
+    pos = _WHITESPACE.match(line, pos + 1).end()
+    if line.startswith("}", pos):
+        return
+
+    while True:
+        key, pos = _decoder.raw_decode(line, pos)
+        pos = _WHITESPACE.match(line, pos).end()
+        if not line.startswith(":", pos):
+            raise json.JSONDecodeError("Expecting ':' delimiter", line, pos)
+        pos = _WHITESPACE.match(line, pos + 1).end()
+
+        if key == "@graph":
+            if line.startswith("[", pos):
+                yield from _iter_array(line, pos)
+            elif line.startswith("{", pos):
+                graph, _ = _decoder.raw_decode(line, pos)
+                yield graph
+            return
+
+        # Not the graph: decode the value only to step over it
+        _, pos = _decoder.raw_decode(line, pos)
+        pos = _WHITESPACE.match(line, pos).end()
+        if line.startswith(",", pos):
+            pos = _WHITESPACE.match(line, pos + 1).end()
+        elif line.startswith("}", pos):
+            return
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", line, pos)
+
+
+def _iter_array(line: str, pos: int):
+    """Decode and yield the elements of the JSON array starting at line[pos]."""
+    pos = _WHITESPACE.match(line, pos + 1).end()
+    if line.startswith("]", pos):
+        return
+    while True:
+        item, pos = _decoder.raw_decode(line, pos)
+        yield item
+        pos = _WHITESPACE.match(line, pos).end()
+        if line.startswith(",", pos):
+            pos = _WHITESPACE.match(line, pos + 1).end()
+        elif line.startswith("]", pos):
+            return
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", line, pos)
+
+
+def normalize_pid(scheme, value):
+    """Normalised (scheme, value) of a Pid, or None for an empty Pid.
+    - Pids are compared by this key (Pid.normalized_scheme and Pid.normalized_value
+      in the graph): schemes and
+      values are lowercased and resolver prefixes (https://doi.org/, orcid.org, ...)
+      removed; PMCIDs are uppercased with their "PMC" prefix.
+    """
+    if scheme is None or value is None:
+        return None
+    scheme = str(scheme).strip().lower()
+    value = str(value).strip()
+    if not scheme or value in ("", "None"):
+        return None
+    if scheme == "pmcid":
+        value = value.upper()
+        if not value.startswith("PMC"):
+            value = "PMC" + value
+        return scheme, value
+    # DOIs and the other Pids are compared case-insensitively
+    value = value.lower()
+    for prefix in PID_PREFIXES.get(scheme, ()):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+            break
+    return (scheme, value) if value else None
+
+
+def hash64(value: str) -> int:
+    """Stable 64-bit hash of a string, used as a fixed-width sort and lookup key."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def external_sort(records, record_format: str, chunk_size: int = 1_000_000):
+    """Sort an iterable of fixed-width tuples in bounded memory.
+    - Records are buffered up to `chunk_size`, sorted and spilled to temporary run
+      files packed with `record_format` (struct syntax, e.g. "<QIQI").
+    - The runs are merged lazily and the sorted tuples are yielded.
+    """
+    packer = struct.Struct(record_format)
+    runs = []
+    chunk = []
+    try:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                runs.append(_spill_run(chunk, packer))
+                chunk = []
+        if not runs:
+            chunk.sort()
+            yield from chunk
+            return
+        if chunk:
+            runs.append(_spill_run(chunk, packer))
+            chunk = []
+        yield from heapq.merge(*(_read_run(run, packer) for run in runs))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _spill_run(chunk: list, packer: struct.Struct):
+    chunk.sort()
+    run = tempfile.TemporaryFile()
+    for start in range(0, len(chunk), 65536):
+        run.write(b"".join(packer.pack(*record) for record in chunk[start:start + 65536]))
+    run.seek(0)
+    return run
+
+
+def _read_run(run, packer: struct.Struct):
+    block_size = packer.size * 65536
+    while True:
+        block = run.read(block_size)
+        if not block:
+            return
+        yield from packer.iter_unpack(block)
+
+
+class UnionFind:
+    """Disjoint sets over the integers 0..n-1 (union by size, path halving)."""
+
+    def __init__(self, size: int = 0):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def add(self) -> int:
+        """Add a singleton set and return its element."""
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        """Merge the sets of a and b and return the root of the merged set."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+
+def shared_key_groups(pairs, record_format: str = "<QQ"):
+    """Group the members sharing a key, with a union-find over integer-encoded ids.
+    - `pairs` yields (key, member) integer tuples (e.g. Pid and entity hashes); they
+      are sorted with external_sort, so only the members sharing a key are held in
+      memory.
+    - Returns (groups, shared): the sets of members connected by shared keys (two or
+      more members each) and the set of keys shared by several members.
+    """
+    union = UnionFind()
+    elements = {}  # member -> union-find element
+    shared = set()
+    run_key, run_members = None, set()
+
+    def close_run():
+        if len(run_members) < 2:
+            return
+        shared.add(run_key)
+        members = sorted(run_members)
+        for member in members:
+            if member not in elements:
+                elements[member] = union.add()
+            union.union(elements[members[0]], elements[member])
+
+    for key, member in external_sort(pairs, record_format):
+        if key != run_key:
+            close_run()
+            run_key, run_members = key, set()
+        run_members.add(member)
+    close_run()
+
+    groups = {}
+    for member, element in elements.items():
+        groups.setdefault(union.find(element), set()).add(member)
+    return list(groups.values()), shared
+
+
+def is_sampled(local_identifier: str, rate: float) -> bool:
+    """Deterministically select `rate` of all identifiers by their 64-bit hash."""
+    return hash64(local_identifier) < rate * 2 ** 64
+
+
+class Sampler:
+    """Referentially consistent sampling of the parser outputs (`--sample RATE`).
+    - 6_products.py runs first and keeps the products whose local_identifier is
+      sampled. It records the agents, grants, venues, topics and datasources its
+      kept products point to and saves them in <root>/sample_ids.json.
+    - The other parsers load that file and keep only those entities, and only the
+      edges whose endpoints (see RELATIONSHIP_TARGETS) were kept.
+    The sample only reaches one hop from the kept products: an entity that only a
+    kept grant or agent points to is not recorded, so those edges are dropped (the
+    HAS_BENEFICIARY and HAS_FUNDING_AGENCY agents of a grant, the organisation an
+    agent is AFFILIATED_WITH), unless a kept product references that agent too.
+    With rate=None sampling is disabled: everything is kept and outputs go to
+    <base_dir>/to_load as usual; sampled outputs go to <base_dir>/to_load_sample.
+    """
+
+    def __init__(self, base_dir, rate=None, seed=False):
+        self.rate = rate
+        self.seed = seed
+        self.root = Path(base_dir) / ("to_load" if rate is None else "to_load_sample")
+        self.ids = {name: set() for name in SAMPLED_SETS}
+        if rate is None or seed:
+            return
+
+        ids_path = self.root / "sample_ids.json"
+        if not ids_path.exists():
+            raise FileNotFoundError(f"{ids_path} not found: run 6_products.py with --sample {rate} first")
+        with open(ids_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved["rate"] != rate:
+            raise ValueError(f"{ids_path} was built with --sample {saved['rate']}, not {rate}")
+        self.ids = {name: set(saved[name]) for name in SAMPLED_SETS}
+
+    def keep_entity(self, entity_set: str, local_identifier) -> bool:
+        if self.rate is None:
+            return True
+        if entity_set == "products":
+            return local_identifier is not None and is_sampled(local_identifier, self.rate)
+        return local_identifier in self.ids[entity_set]
+
+    def keep_edge(self, rel: dict) -> bool:
+        if self.rate is None:
+            return True
+        if rel.get("rel_type") == "RELATED_PRODUCT":
+            endpoint, entity_set = "end", "products"
+        elif rel.get("type") in RELATIONSHIP_TARGETS:
+            endpoint, entity_set = RELATIONSHIP_TARGETS[rel["type"]]
+        else:
+            return True
+
+        target = rel.get(endpoint)
+        if target is None:
+            return True
+        if entity_set == "products":
+            return is_sampled(target, self.rate)
+        if self.seed:
+            self.ids[entity_set].add(target)
+            return True
+        return target in self.ids[entity_set]
+
+    def save(self) -> None:
+        """Write the entity ids referenced by the sampled products (seed parser only)."""
+        if self.rate is None or not self.seed:
+            return
+        saved = {"rate": self.rate}
+        saved.update({name: sorted(self.ids[name]) for name in SAMPLED_SETS})
+        with open(self.root / "sample_ids.json", "w", encoding="utf-8") as f:
+            json.dump(saved, f)
+        print("Sampled entity references: " + ", ".join(
+            f"{name}={len(self.ids[name])}" for name in SAMPLED_SETS
+        ))
+
+
+def parse_args(description: str) -> argparse.Namespace:
+    """Command line shared by the parsers: <base_dir> [--sample RATE]."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("base_dir", help="Domain directory holding dump/ (e.g. /data/tmp/skgif_dumps/cancer-research)")
+    parser.add_argument(
+        "--sample",
+        type=float,
+        metavar="RATE",
+        help=(
+            "Keep only products whose local_identifier hashes below RATE (0 < RATE <= 1) and the "
+            "entities and edges they reach; 6_products.py must run first. Outputs go to to_load_sample/"
+        ),
+    )
+    args = parser.parse_args()
+    if args.sample is not None and not 0 < args.sample <= 1:
+        parser.error("--sample must be in (0, 1]")
+    return args
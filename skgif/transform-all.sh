@@ -1,12 +1,42 @@
 #!/bin/bash
+# Set SAMPLE=<rate> (e.g. SAMPLE=0.01 ./transform-all.sh) to write a referentially
+# consistent sample to to_load_sample/ instead of the full outputs.
+
+SAMPLE_ARGS=()
+if [ -n "$SAMPLE" ]; then
+    SAMPLE_ARGS=(--sample "$SAMPLE")
+fi
 
 for folder in energy-planning cancer-research ccam maritime neuroscience ebrains; do
     BASE_DIR="/data/tmp/skgif_dumps/${folder}"
-    python3 parsers/1_agents.py "$BASE_DIR"
-    python3 parsers/2_grants.py "$BASE_DIR"
-    python3 parsers/3_venues.py "$BASE_DIR"
-    python3 parsers/4_topics.py "$BASE_DIR"
-    python3 parsers/5_datasources.py "$BASE_DIR"
-    python3 parsers/6_products.py "$BASE_DIR"
+    # In sampling mode products run first: they decide which other entities are kept
+    if [ -n "$SAMPLE" ]; then
+        python3 parsers/6_products.py "$BASE_DIR" "${SAMPLE_ARGS[@]}"
+    fi
+    python3 parsers/1_agents.py "$BASE_DIR" "${SAMPLE_ARGS[@]}"
+    python3 parsers/2_grants.py "$BASE_DIR" "${SAMPLE_ARGS[@]}"
+    python3 parsers/3_venues.py "$BASE_DIR" "${SAMPLE_ARGS[@]}"
+    python3 parsers/4_topics.py "$BASE_DIR" "${SAMPLE_ARGS[@]}"
+    python3 parsers/5_datasources.py "$BASE_DIR" "${SAMPLE_ARGS[@]}"
+    if [ -z "$SAMPLE" ]; then
+        python3 parsers/6_products.py "$BASE_DIR"
+    fi
     echo "Processed $folder"
 done
+
+# Merge EBRAINS products into the neuroscience products sharing their Pids
+if [ -z "$SAMPLE" ]; then
+    python3 parsers/dedup.py /data/tmp/skgif_dumps/neuroscience --source ebrains=/data/tmp/skgif_dumps/ebrains \
+        --report /data/tmp/skgif_dumps/neuroscience/merge_report.tsv
+fi
+
+# Resolve the agents sharing identifiers (after the product deduplication)
+if [ -z "$SAMPLE" ]; then
+    for folder in energy-planning cancer-research ccam maritime; do
+        BASE_DIR="/data/tmp/skgif_dumps/${folder}"
+        python3 parsers/resolve_agents.py "$BASE_DIR" --aliases "$BASE_DIR/agent_aliases.tsv"
+    done
+    # EBRAINS is loaded with neuroscience
+    python3 parsers/resolve_agents.py /data/tmp/skgif_dumps/neuroscience /data/tmp/skgif_dumps/ebrains \
+        --aliases /data/tmp/skgif_dumps/neuroscience/agent_aliases.tsv
+fi
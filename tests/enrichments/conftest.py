@@ -0,0 +1,89 @@
+"""Fixtures of the enrichment tests: generated citance parquet files and a DOI index."""
+
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_DIR / "enrichments" / "common" / "citances"))
+sys.path.insert(0, str(REPO_DIR / "enrichments" / "common" / "artifacts"))
+
+SCORES = pa.struct([(name, pa.list_(pa.float64())) for name in ("semantics", "intent", "polarity")])
+METADATA = pa.struct([
+    ("semantics", pa.string()), ("intent", pa.string()), ("polarity", pa.string()), ("scores", SCORES),
+])
+CITANCE_SCHEMA = pa.schema([
+    ("citationid", pa.int64()),
+    ("source_doi", pa.string()),
+    ("dest_doi", pa.string()),
+    ("spaces", pa.string()),
+    ("results", pa.list_(pa.map_(pa.string(), METADATA))),
+])
+# DOIs of the fixture graph (PRODUCT_DOIS) and DOIs outside it; casing and resolver
+# prefixes vary as in the citance dumps
+PRODUCT_DOIS = [f"10.1000/abc{i}" for i in range(20)]
+DOIS = [f"10.1000/ABC{i}" for i in range(20)] + ["https://doi.org/10.1000/abc3"] + [f"10.9/x{i}" for i in range(5)] + [None]
+SPACES = ["cancer", "energy", "neuro", None]
+
+
+def random_citance_rows(rng: random.Random, count: int, first_id: int = 0) -> list:
+    """Random citance rows; ids mostly increase, with duplicates within and across files."""
+    rows = []
+    citation_id = first_id
+    for _ in range(count):
+        citation_id += rng.choice([0, 1, 1, 2]) if rng.random() > 0.05 else -rng.randint(0, 30)
+        results = [[
+            (str(position), {
+                "semantics": rng.choice(["Supporting", "Comparison", "Neutral", None]),
+                "intent": rng.choice(["Comparison", "Method", None]),
+                "polarity": rng.choice(["Supporting", "Neutral", "Refuting", None]),
+                "scores": {"semantics": [rng.random()], "intent": [rng.random()], "polarity": [rng.random()]},
+            })
+            for position in range(rng.randint(0, 2))
+        ]]
+        rows.append({
+            "citationid": max(citation_id, 0),
+            "source_doi": rng.choice(DOIS),
+            "dest_doi": rng.choice(DOIS),
+            "spaces": rng.choice(SPACES),
+            "results": results,
+        })
+    return rows
+
+
+@pytest.fixture
+def citance_rows():
+    return random_citance_rows
+
+
+@pytest.fixture
+def write_citances():
+    """Write rows to <directory>/<name>.snappy.parquet, with small row groups."""
+    def write(directory: Path, name: str, rows: list) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{name}.snappy.parquet"
+        pq.write_table(pa.Table.from_pylist(rows, schema=CITANCE_SCHEMA), path, compression="snappy", row_group_size=100)
+        return path
+    return write
+
+
+@pytest.fixture(scope="session")
+def doi_graph(tmp_path_factory) -> Path:
+    """Pilot graph base_dir whose products hold PRODUCT_DOIS, with its DOI index."""
+    base_dir = tmp_path_factory.mktemp("graph")
+    products = base_dir / "to_load" / "products"
+    products.mkdir(parents=True)
+    with open(products / "relationships.jsonl", "w", encoding="utf-8") as f:
+        for i, doi in enumerate(PRODUCT_DOIS):
+            f.write(json.dumps({"start": f"product_{i}", "end": f"doi:{doi}", "type": "HAS_PID", "scheme": "doi"}) + "\n")
+        # A second Product sharing a DOI
+        f.write(json.dumps({"start": "product_3b", "end": "doi:10.1000/ABC3", "type": "HAS_PID", "scheme": "doi"}) + "\n")
+    subprocess.run([sys.executable, str(REPO_DIR / "skgif" / "parsers" / "index.py"), "build-doi", str(base_dir)],
+                   check=True, stdout=subprocess.DEVNULL)
+    return base_dir
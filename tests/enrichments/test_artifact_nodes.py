@@ -0,0 +1,99 @@
+"""
+artifacts.py --split-nodes: the nodes are written per space, once (also for papers
+repeated across input files), next to the usages that reference them, with the same
+output for any number of workers; canonicalize.py keeps the canonical nodes per space.
+"""
+
+import gzip
+import json
+import random
+
+import pytest
+
+from artifacts import process_research_artifacts
+from canonicalize import canonicalize
+
+SPACES = ["cancer", "energy", "neuro"]
+LABELS = ["PyTorch", "pytorch", "ImageNet", "scikit-learn", "BraTS", "UK Biobank"]
+# Paper of every input file; only its record in the last file has licenses
+REPEATED_PAPER = 999
+
+
+def write_records(path, records: list) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def random_records(rng: random.Random, first_paper: int, count: int) -> list:
+    records = []
+    for paper in range(first_paper, first_paper + count):
+        artifacts = [{
+            "Research Artifact": rng.choice(LABELS),
+            "Type": rng.choice(["dataset", "software"]),
+            "URLs": rng.choice(["", "https://github.com/pytorch/pytorch (80%)", "https://www.image-net.org/"]),
+            "Research Artifact Score": rng.random(),
+        } for _ in range(rng.randint(1, 4))]
+        record = {"doi": f"10.1000/p{paper}", "paper_id": paper, "spaces": rng.choice(SPACES),
+                  "research_artifacts": artifacts}
+        records.append(record)
+        # Papers listed in a second space, or repeated in the same space
+        if rng.random() < 0.2:
+            records.append(dict(record, spaces=rng.choice(SPACES)))
+    rng.shuffle(records)
+    return records
+
+
+def read_lines(path) -> list:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture(scope="module")
+def input_dir(tmp_path_factory):
+    rng = random.Random(5)
+    directory = tmp_path_factory.mktemp("artifacts")
+    for i in range(3):
+        artifact = {"Research Artifact": "Cellpose", "Type": "software", "Licenses": ["BSD"] if i == 2 else None}
+        repeated = {"doi": "10.1000/repeated", "paper_id": REPEATED_PAPER, "spaces": "cancer",
+                    "research_artifacts": [artifact]}
+        write_records(directory / f"part-{i}.json.gz", random_records(rng, i * 100, 100) + [repeated])
+    return directory
+
+
+def run(input_dir, output_dir, workers: int) -> dict:
+    process_research_artifacts(str(input_dir), str(output_dir), workers=workers, split_nodes=True)
+    return {path.name: read_lines(path) for path in sorted(output_dir.glob("*.jsonl.gz"))}
+
+
+def test_nodes_per_space(tmp_path, input_dir):
+    outputs = run(input_dir, tmp_path / "out", workers=1)
+    assert sorted(outputs) == sorted(
+        f"{space}_research_artifact_{kind}.jsonl.gz" for space in SPACES for kind in ("nodes", "usages"))
+    for space in SPACES:
+        node_ids = [node["local_identifier"] for node in outputs[f"{space}_research_artifact_nodes.jsonl.gz"]]
+        usage_ids = {usage["artifact_id"] for usage in outputs[f"{space}_research_artifact_usages.jsonl.gz"]}
+        assert len(node_ids) == len(set(node_ids))
+        assert set(node_ids) == usage_ids
+    repeated = [node for node in outputs["cancer_research_artifact_nodes.jsonl.gz"]
+                if node["local_identifier"].startswith(f"{REPEATED_PAPER}:")]
+    # Later records fill in the properties, like the loader's ON MATCH SET coalesce
+    assert [node["licenses"] for node in repeated] == [["BSD"]]
+
+
+def test_same_output_with_workers(tmp_path, input_dir):
+    assert run(input_dir, tmp_path / "w1", workers=1) == run(input_dir, tmp_path / "w2", workers=2)
+    assert not (tmp_path / "w2" / "_shards").exists()
+
+
+def test_canonical_nodes_per_space(tmp_path, input_dir):
+    run(input_dir, tmp_path / "out", workers=1)
+    canonicalize(str(tmp_path / "out"), str(tmp_path / "canonical"))
+    nodes = {}
+    for space in SPACES:
+        space_nodes = read_lines(tmp_path / "canonical" / f"{space}_canonical_research_artifact_nodes.jsonl.gz")
+        usages = read_lines(tmp_path / "canonical" / f"{space}_canonical_research_artifact_usages.jsonl.gz")
+        assert {node["local_identifier"] for node in space_nodes} == {usage["artifact_id"] for usage in usages}
+        for node in space_nodes:
+            # Clusters are global: a canonical node is the same in every space
+            assert nodes.setdefault(node["local_identifier"], node) == node
@@ -0,0 +1,108 @@
+"""
+load-bcmo-data.py against a stub driver: the gene ids are fetched in one query, rows
+with missing genes are reported per gene, and the relationships are created in UNWIND
+batches of --batch-size rows, one write transaction each.
+"""
+
+import importlib.util
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SCRIPT = Path(__file__).resolve().parents[2] / "enrichments" / "graph-specific" / "cancer" / "bcmo" / "load-bcmo-data.py"
+GENES = [f"gene{i}" for i in range(10)]
+
+
+@pytest.fixture(scope="module")
+def bcmo():
+    # The file name is not a module name
+    spec = importlib.util.spec_from_file_location("load_bcmo_data", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Result(list):
+    def consume(self):
+        return None
+
+
+class StubSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.driver.queries.append((query, params))
+        if "$ids" in query:
+            return Result({"id": gene_id} for gene_id in params["ids"] if gene_id in self.driver.gene_ids)
+        return Result()
+
+    def execute_write(self, work, *args):
+        self.driver.transactions += 1
+        # The session stands in for the transaction: both have run()
+        return work(self, *args)
+
+
+class StubDriver:
+    def __init__(self, gene_ids):
+        self.gene_ids = set(gene_ids)
+        self.queries = []
+        self.transactions = 0
+
+    def session(self):
+        return StubSession(self)
+
+
+def write_csv(path, sources, targets) -> None:
+    rng = np.random.default_rng(3)
+    count = len(sources)
+    pd.DataFrame({
+        "source.symbol": sources,
+        "target.symbol": targets,
+        "interaction": "pp",
+        "name": "edge",
+        "p.value": np.where(rng.random(count) < 0.1, np.nan, rng.random(count)),
+        "sample.count": rng.integers(0, 9, count),
+    }).to_csv(path)
+
+
+def test_batches_and_missing_genes(tmp_path, bcmo):
+    rng = np.random.default_rng(1)
+    sources = list(rng.choice(GENES, 2500)) + ["x1", "x1", "x1", "gene0", "gene1", "x1"]
+    targets = list(rng.choice(GENES, 2500)) + ["gene2", "gene3", "gene4", "x2", "x2", "x2"]
+    write_csv(tmp_path / "bcmo.csv", sources, targets)
+    driver = StubDriver(gene.upper() for gene in GENES)
+
+    counts = bcmo.load_relationships(driver, bcmo.read_relationships(tmp_path / "bcmo.csv"), batch_size=1000)
+
+    gene_queries = [params for query, params in driver.queries if query == bcmo.GENE_IDS_QUERY]
+    assert len(gene_queries) == 1
+    assert sorted(gene_queries[0]["ids"]) == sorted([gene.upper() for gene in GENES] + ["X1", "X2"])
+
+    batches = [params["rows"] for query, params in driver.queries if query == bcmo.RELATIONSHIPS_QUERY]
+    assert [len(rows) for rows in batches] == [1000, 1000, 500]
+    assert driver.transactions == 3
+    assert counts == {"rows": 2506, "created": 2500, "skipped": 6, "missing_genes": 2}
+
+    rows = [row for rows in batches for row in rows]
+    assert {row["source"] for row in rows} | {row["target"] for row in rows} <= driver.gene_ids
+    assert set(rows[0]["properties"]) == {"p_value", "sample_count"}
+    assert any(row["properties"]["p_value"] is None for row in rows)
+    assert type(rows[0]["properties"]["sample_count"]) is int
+    json.dumps(rows)
+
+
+def test_split_missing(bcmo):
+    df = pd.DataFrame({"source_symbol": ["A", "X1", "X1", "A"], "target_symbol": ["B", "B", "X2", "X1"]})
+    found, missing = bcmo.split_missing(df, {"A", "B"})
+    assert found.index.tolist() == [0]
+    assert missing.to_dict() == {"X1": 3, "X2": 1}
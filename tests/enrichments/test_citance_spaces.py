@@ -0,0 +1,39 @@
+"""
+citances.py --spaces: a run restricted to some spaces writes exactly the files of
+these spaces of a full run, including the removal of ids seen first in other spaces.
+"""
+
+import gzip
+import random
+
+import pytest
+
+from citances import process_parquet_files
+
+
+def read_lines(path) -> list:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("spaces", [["cancer"], ["None"], ["neuro", "energy"]])
+def test_spaces_subset_of_full_run(tmp_path, citance_rows, write_citances, doi_graph, workers, spaces):
+    rng = random.Random(11)
+    input_dir = tmp_path / "input"
+    first = citance_rows(rng, 800)
+    write_citances(input_dir, "part-00000", first)
+    write_citances(input_dir, "part-00001", citance_rows(rng, 800, first_id=first[-1]["citationid"] - 40))
+    doi_indexes = {"cancer": str(doi_graph)}
+
+    full_dir, selected_dir = tmp_path / "full", tmp_path / "selected"
+    process_parquet_files(str(input_dir), output_dir=str(full_dir), doi_indexes=doi_indexes, workers=workers)
+    process_parquet_files(str(input_dir), output_dir=str(selected_dir), doi_indexes=doi_indexes,
+                          workers=workers, spaces=spaces)
+
+    written = sorted(path.name for path in selected_dir.glob("*.jsonl.gz"))
+    expected = sorted(path.name for path in full_dir.glob("*.jsonl.gz")
+                      if path.name.split(".")[0].split("_indicators")[0] in spaces)
+    assert written == expected and written
+    for name in written:
+        assert read_lines(selected_dir / name) == read_lines(full_dir / name), name
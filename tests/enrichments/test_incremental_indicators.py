@@ -0,0 +1,57 @@
+"""
+Incremental replication-degree indicators (citances.py --counter-store --incremental):
+applying the input as two deltas gives the counters and indicators of one full run.
+"""
+
+import gzip
+import json
+import random
+import shutil
+
+import pyarrow.parquet as pq
+import pytest
+
+from citances import process_parquet_files
+
+
+def read_indicators(output_dir) -> dict:
+    indicators = {}
+    for path in sorted(output_dir.glob("*_indicators.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                indicators[(path.name, record.pop("local_identifier"))] = record
+    return indicators
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_two_deltas_match_full_run(tmp_path, citance_rows, write_citances, doi_graph, workers):
+    rng = random.Random(7)
+    first = citance_rows(rng, 600)
+    # The second delta repeats some citation ids of the first one
+    second = citance_rows(rng, 600, first_id=first[-1]["citationid"] - 40)
+    full_dir, delta_dirs = tmp_path / "full", [tmp_path / "delta1", tmp_path / "delta2"]
+    for i, rows in enumerate([first, second]):
+        path = write_citances(delta_dirs[i], f"part-{i:05d}", rows)
+        full_dir.mkdir(exist_ok=True)
+        shutil.copy(path, full_dir)
+    doi_indexes = {"cancer": str(doi_graph), "neuro": str(doi_graph)}
+
+    process_parquet_files(
+        str(full_dir), output_dir=str(tmp_path / "out_full"), doi_indexes=doi_indexes,
+        workers=workers, counter_store=str(tmp_path / "store_full"),
+    )
+    indicators = {}
+    for i, delta_dir in enumerate(delta_dirs):
+        process_parquet_files(
+            str(delta_dir), output_dir=str(tmp_path / f"out_delta{i}"), doi_indexes=doi_indexes,
+            workers=workers, counter_store=str(tmp_path / "store_delta"), incremental=True,
+        )
+        # A delta rewrites the indicators of the destinations it cites
+        indicators.update(read_indicators(tmp_path / f"out_delta{i}"))
+
+    expected = read_indicators(tmp_path / "out_full")
+    assert {name for name, _ in expected} == {"cancer_indicators.jsonl.gz", "neuro_indicators.jsonl.gz"}
+    assert indicators == expected
+    assert pq.read_table(tmp_path / "store_delta" / "counters.parquet").equals(
+        pq.read_table(tmp_path / "store_full" / "counters.parquet"))
@@ -0,0 +1,74 @@
+"""
+mentions.py: MENTIONS weights computed offline, and the generated loaders.
+"""
+
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "enrichments" / "graph-specific"))
+from mentions import DOMAINS, aggregate_mentions, preprocess_mentions
+
+PRODUCT = "https://explore.openaire.eu/search/result?id=abc"
+
+
+def write_rows(path: Path, rows: list) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows)
+    return str(path)
+
+
+def read_lines(path: Path) -> list:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def mention(text: str, entity: str, *link_ids: str, section_label=None) -> dict:
+    return {
+        "remapped_id": "50|abc",
+        "section_label": section_label,
+        "entities": [{"entity": entity, "text": text, "model": "m", "linking": [{"id": i} for i in link_ids]}],
+    }
+
+
+def test_weights_count_distinct_merge_keys(tmp_path):
+    input_path = write_rows(tmp_path / "neuro.jsonl", [
+        mention("mouse", "species", "NCBITaxon:10090"),
+        mention("mouse", "species", "NCBITaxon:10090"),
+        mention("mice", "species", "NCBITaxon:10090", section_label="methods"),
+    ])
+    aggregate_mentions(DOMAINS["neuro"], [input_path], str(tmp_path / "out"))
+    assert read_lines(tmp_path / "out" / "mentions_Species.jsonl.gz") == [
+        {"product_id": PRODUCT, "entity_id": "NCBITaxon:10090", "weight": 2},
+    ]
+
+
+def test_match_only_domain_refused(tmp_path):
+    # Both ids may match one Gene by synonym: only the database knows the weight
+    input_path = write_rows(tmp_path / "cancer.jsonl", [mention("myc", "gene", "NCBI:1", "NCBI:2")])
+    with pytest.raises(ValueError):
+        aggregate_mentions(DOMAINS["cancer"], [input_path], str(tmp_path / "out"))
+
+
+def test_fedlex_legal_documents(tmp_path):
+    row = mention("hydropower", "energytype", "energy:hydro")
+    del row["remapped_id"]
+    input_path = write_rows(tmp_path / "energyType_fedlex.jsonl", [dict(row, rsNr="730.0"), row])
+    aggregate_mentions(DOMAINS["fedlex"], [input_path], str(tmp_path / "out"))
+    assert read_lines(tmp_path / "out" / "mentions_EnergyType.jsonl.gz") == [
+        {"product_id": "730.0", "entity_id": "energy:hydro", "weight": 1},
+    ]
+    loader = (tmp_path / "out" / "load-mentions.cypher").read_text(encoding="utf-8")
+    assert "MATCH (p:LegalDocument {local_identifier: value.product_id})" in loader
+
+
+def test_preprocess_merges_relationships(tmp_path):
+    input_path = write_rows(tmp_path / "cancer.jsonl", [mention("myc", "gene", "NCBI:1", "NCBI:2")])
+    preprocess_mentions(DOMAINS["cancer"], [input_path], str(tmp_path / "out"))
+    loader = (tmp_path / "out" / "load-entities.cypher").read_text(encoding="utf-8")
+    # One relationship per matched Gene and MERGE key, as in load_cancer_entities.cypher
+    assert "MERGE (p)-[r:HAS_IN_TEXT_MENTION {" in loader and "CREATE (p)" not in loader
+    assert len(read_lines(tmp_path / "out" / "has_in_text_mention_Gene.jsonl.gz")) == 2
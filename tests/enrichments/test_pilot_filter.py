@@ -0,0 +1,52 @@
+"""
+pilot_filter.py filter: rows are kept when their Products are in the pilot, for
+JSON lines and for techs.json files holding one JSON array.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "enrichments" / "common" / "pilot-filter"))
+from pilot_filter import build_filter, filter_files
+
+TECHS = [
+    {"id": "product_1", "techs": ["Python"]},
+    {"id": "product_9", "techs": ["R"]},
+    {"id": "product_2", "techs": ["Neo4j", "Docker"]},
+]
+
+
+@pytest.fixture
+def pilot(tmp_path) -> Path:
+    products = tmp_path / "pilot" / "to_load" / "products"
+    products.mkdir(parents=True)
+    with open(products / "products.jsonl", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps({"local_identifier": f"product_{i}"}) + "\n" for i in range(3))
+    build_filter(tmp_path / "pilot")
+    return tmp_path / "pilot"
+
+
+@pytest.mark.parametrize("layout", ["lines", "array"])
+def test_techs(tmp_path, pilot, layout):
+    path = tmp_path / "techs.json"
+    if layout == "array":
+        path.write_text(json.dumps(TECHS, indent=2), encoding="utf-8")
+    else:
+        path.write_text("".join(json.dumps(row) + "\n" for row in TECHS), encoding="utf-8")
+    counts = filter_files(pilot, "techs", [str(path)], str(tmp_path / "out"))[str(path)]
+    assert (counts["kept"], counts["dropped"], counts["invalid"]) == (2, 1, 0)
+
+    written = (tmp_path / "out" / "techs.json").read_text(encoding="utf-8")
+    rows = json.loads(written) if layout == "array" else [json.loads(line) for line in written.splitlines()]
+    assert rows == [TECHS[0], TECHS[2]]
+
+
+def test_rows_not_objects(tmp_path, pilot):
+    # An indented array read as JSON lines
+    path = tmp_path / "mentions.jsonl"
+    path.write_text(json.dumps([{"remapped_id": "50|x"}], indent=2), encoding="utf-8")
+    with pytest.raises(ValueError, match="JSON object"):
+        filter_files(pilot, "mentions", [str(path)], str(tmp_path / "out"))
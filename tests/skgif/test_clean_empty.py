@@ -0,0 +1,88 @@
+"""
+Property tests of utils.clean_empty against the recursive implementation it
+replaced, on seeded random nested records.
+"""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "skgif" / "parsers"))
+from utils import clean_empty
+
+SCALARS = [None, "", " ", "a", 0, 0.0, -1.5, 1, False, True, [], {}]
+
+
+def reference_clean_empty(value):
+    """clean_empty() before the single-pass rewrite."""
+    if isinstance(value, dict):
+        cleaned = {}
+        for k, v in value.items():
+            cv = reference_clean_empty(v)
+            if cv is None:
+                continue
+            if cv == "":
+                continue
+            if isinstance(cv, (list, dict)) and not cv:
+                continue
+            cleaned[k] = cv
+        return cleaned
+    if isinstance(value, list):
+        cleaned_list = []
+        for item in value:
+            ci = reference_clean_empty(item)
+            if ci is None or ci == "":
+                continue
+            if isinstance(ci, (list, dict)) and not ci:
+                continue
+            cleaned_list.append(ci)
+        return cleaned_list
+    return value
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    roll = rng.random()
+    if depth > 4 or roll < 0.5:
+        return rng.choice(SCALARS)
+    if roll < 0.75:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+def same(a, b) -> bool:
+    # json.dumps tells 0 from False and 0 from 0.0, which == does not
+    return type(a) is type(b) and json.dumps(a) == json.dumps(b)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference(seed):
+    rng = random.Random(seed)
+    for _ in range(20000):
+        value = random_value(rng)
+        assert same(clean_empty(value), reference_clean_empty(value)), value
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_flat_rows_match_reference(seed):
+    rng = random.Random(seed)
+    for _ in range(20000):
+        row = {key: rng.choice(SCALARS) for key in ("start", "end", "type", "scheme", "role")}
+        assert same(clean_empty(row), reference_clean_empty(row)), row
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cache_reuses_subtrees(seed):
+    """Rows built from subtrees of a record clean as without the cache."""
+    rng = random.Random(seed)
+    for _ in range(2000):
+        record = {f"k{i}": random_value(rng) for i in range(rng.randint(1, 6))}
+        cache = {}
+        assert same(clean_empty(record, cache), reference_clean_empty(record))
+        subtrees = [value for value in record.values() if isinstance(value, (dict, list))]
+        for _ in range(3):
+            # New (short-lived) row dicts mixing scalars and already cleaned subtrees
+            row = {"start": rng.choice(SCALARS), "properties": {"value": rng.choice(subtrees or [None])}}
+            assert same(clean_empty(row, cache), reference_clean_empty(row)), row
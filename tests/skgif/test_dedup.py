@@ -0,0 +1,63 @@
+"""
+dedup.py: survivors and merged products follow pick_survivor and ebrains-merge.py
+(only --source products are merged, groups without a product without source are
+skipped), and groups larger than --max-group-size are skipped.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "skgif" / "parsers"))
+from dedup import deduplicate
+
+
+def write_domain(base_dir: Path, products: dict) -> None:
+    """products: local_identifier -> DOIs of the product."""
+    directory = base_dir / "to_load" / "products"
+    directory.mkdir(parents=True)
+    pids = sorted({doi for dois in products.values() for doi in dois})
+    rows = {
+        "products": [{"local_identifier": product_id} for product_id in products],
+        "identifiers": [{"local_identifier": f"doi:{doi}", "scheme": "doi", "value": doi} for doi in pids],
+        "manifestations": [],
+        "relationships": [{"start": product_id, "end": f"doi:{doi}", "type": "HAS_PID", "scheme": "doi"}
+                          for product_id, dois in products.items() for doi in dois],
+    }
+    for stem, stem_rows in rows.items():
+        with open(directory / f"{stem}.jsonl", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in stem_rows)
+
+
+def read_skipped(path: Path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return sorted(tuple(line.rstrip("\n").split("\t")) for line in f)
+
+
+def test_source_merge(tmp_path):
+    write_domain(tmp_path / "neuro", {
+        "a": ["10.1/one"], "b": ["10.1/one"],
+        "c1": ["10.1/many"], "c2": ["10.1/many"], "c3": ["10.1/many"],
+    })
+    write_domain(tmp_path / "ebrains", {
+        "e1": ["10.1/ONE"], "e2": ["10.1/two"], "e3": ["10.1/two"], "e4": ["10.1/many"],
+    })
+    skipped_path = tmp_path / "skipped.tsv"
+    survivor_of = deduplicate([str(tmp_path / "neuro")], [("ebrains", str(tmp_path / "ebrains"))],
+                              report_path=str(tmp_path / "report.tsv"), max_group_size=3,
+                              skipped_path=str(skipped_path))
+    # b has no source: like ebrains-merge.py, only the ebrains duplicate is merged
+    assert survivor_of == {"e1": "a"}
+    assert read_skipped(skipped_path) == [
+        ("no_product_without_source", "2", "e2 e3"),
+        ("too_large", "4", "c1 c2 c3 e4"),
+    ]
+
+
+def test_merge_without_source(tmp_path):
+    write_domain(tmp_path / "neuro", {"b": ["10.1/one"], "a": ["https://doi.org/10.1/one"], "c": ["10.1/two"]})
+    survivor_of = deduplicate([str(tmp_path / "neuro")], report_path=str(tmp_path / "report.tsv"),
+                              skipped_path=str(tmp_path / "skipped.tsv"))
+    assert survivor_of == {"b": "a"}
+    with open(tmp_path / "neuro" / "to_load" / "products" / "products.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["local_identifier"] for line in f] == ["a", "c"]
@@ -0,0 +1,48 @@
+"""
+resolve_agents.py: agents sharing a Pid are resolved to the smallest local_identifier,
+and groups larger than --max-group-size are skipped and reported.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "skgif" / "parsers"))
+from resolve_agents import resolve_agents
+
+
+def write_agents(base_dir: Path, agents: dict) -> None:
+    """agents: local_identifier -> ORCIDs of the agent."""
+    directory = base_dir / "to_load" / "agents"
+    directory.mkdir(parents=True)
+    rows = {
+        "agents": [{"local_identifier": agent_id} for agent_id in agents],
+        # Agent HAS_PID relationships carry no scheme
+        "relationships": [{"start": agent_id, "end": f"orcid:{orcid}", "type": "HAS_PID"}
+                          for agent_id, orcids in agents.items() for orcid in orcids],
+    }
+    for stem, stem_rows in rows.items():
+        with open(directory / f"{stem}.jsonl", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in stem_rows)
+
+
+def test_max_group_size(tmp_path):
+    write_agents(tmp_path / "neuro", {
+        "b": ["0000-0001"], "a": ["https://orcid.org/0000-0001"],
+        "c1": ["0000-0002"], "c2": ["0000-0002", "0000-0003"], "c3": ["0000-0003"],
+        "d": ["0000-0004"],
+    })
+    skipped_path = tmp_path / "skipped.tsv"
+    canonical_of = resolve_agents([str(tmp_path / "neuro")], aliases_path=str(tmp_path / "aliases.tsv"),
+                                  max_group_size=2, skipped_path=str(skipped_path))
+    assert canonical_of == {"b": "a"}
+    with open(skipped_path, encoding="utf-8") as f:
+        assert f.read() == "too_large\t3\tc1 c2 c3\n"
+
+    directory = tmp_path / "neuro" / "to_load" / "agents"
+    with open(directory / "agents.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["local_identifier"] for line in f] == ["a", "c1", "c2", "c3", "d"]
+    with open(directory / "relationships.jsonl", encoding="utf-8") as f:
+        starts = [json.loads(line)["start"] for line in f]
+    # b's Pid moved to a; the skipped group keeps its agents
+    assert starts == ["a", "a", "c1", "c2", "c2", "c3", "d"]
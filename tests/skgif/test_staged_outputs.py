@@ -0,0 +1,95 @@
+"""
+dedup.StagedOutputs: stages can be re-run, and parser outputs written after an
+interrupted run of a stage (or of a later one) are used, not the old backups.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "skgif" / "parsers"))
+from dedup import StagedOutputs, deduplicate, product_outputs
+
+
+def write_parser_outputs(base_dir: Path, products: dict) -> Path:
+    """Parser outputs of products (local_identifier -> DOI); returns the products directory."""
+    directory = base_dir / "to_load" / "products"
+    directory.mkdir(parents=True, exist_ok=True)
+    rows = {
+        "products": [{"local_identifier": product_id} for product_id in products],
+        "identifiers": [{"local_identifier": f"doi:{doi}", "scheme": "doi", "value": doi}
+                        for doi in sorted(set(products.values()))],
+        "manifestations": [],
+        "relationships": [{"start": product_id, "end": f"doi:{doi}", "type": "HAS_PID", "scheme": "doi"}
+                          for product_id, doi in products.items()],
+    }
+    for stem, stem_rows in rows.items():
+        with open(directory / f"{stem}.jsonl", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in stem_rows)
+    return directory
+
+
+def product_ids(directory: Path) -> list:
+    with open(directory / "products.jsonl", encoding="utf-8") as f:
+        return [json.loads(line)["local_identifier"] for line in f]
+
+
+def run_dedup(tmp_path: Path) -> dict:
+    return deduplicate([str(tmp_path / "neuro")], report_path=str(tmp_path / "report.tsv"),
+                       skipped_path=str(tmp_path / "skipped.tsv"))
+
+
+def interrupted(out: StagedOutputs) -> None:
+    """A run of a stage stopped while writing its outputs."""
+    out.stage()
+    with out.open_output("relationships") as f:
+        f.write("{}\n")
+
+
+def test_rerun(tmp_path):
+    directory = write_parser_outputs(tmp_path / "neuro", {"a": "10.1/one", "b": "10.1/one"})
+    assert run_dedup(tmp_path) == {"b": "a"}
+    assert run_dedup(tmp_path) == {"b": "a"}
+    assert product_ids(directory) == ["a"]
+    assert product_ids(directory / "_pre_dedup") == ["a", "b"]
+
+
+@pytest.mark.parametrize("backup", ["_pre_dedup", "_pre_resolve"])
+def test_parser_output_after_interrupted_stage(tmp_path, backup):
+    directory = write_parser_outputs(tmp_path / "neuro", {"a": "10.1/one", "b": "10.1/one"})
+    run_dedup(tmp_path)
+    stems = ("products", "identifiers", "manifestations", "relationships") if backup == "_pre_dedup" else ("relationships",)
+    interrupted(StagedOutputs(directory, stems, backup))
+
+    write_parser_outputs(tmp_path / "neuro", {"c": "10.1/two", "d": "10.1/two", "e": "10.1/three"})
+    assert run_dedup(tmp_path) == {"d": "c"}
+    assert product_ids(directory) == ["c", "e"]
+    assert product_ids(directory / "_pre_dedup") == ["c", "d", "e"]
+
+
+def test_interrupted_between_moves(tmp_path, monkeypatch):
+    directory = write_parser_outputs(tmp_path / "neuro", {"a": "10.1/one", "b": "10.1/one"})
+    moved = []
+
+    def replace(src, dst):
+        # Stop after the first output is moved into place
+        if str(src).endswith(".tmp"):
+            if moved:
+                raise KeyboardInterrupt
+            moved.append(src)
+        os.rename(src, dst)
+
+    monkeypatch.setattr("dedup.os.replace", replace)
+    with pytest.raises(KeyboardInterrupt):
+        run_dedup(tmp_path)
+    monkeypatch.undo()
+
+    # The output moved into place is recognised, the parser outputs stay backed up
+    assert run_dedup(tmp_path) == {"b": "a"}
+    assert product_ids(directory) == ["a"]
+    assert product_ids(directory / "_pre_dedup") == ["a", "b"]
+    assert not list(directory.glob("*.tmp"))
+    assert product_outputs(tmp_path / "neuro")._written(directory / "_pre_dedup")["complete"]